@@ -1,17 +1,24 @@
-from .analyzer import AudioAnalyzer
-from .backends import get_backend, AudioBackend, LibrosaBackend
+from .analyzer import AudioAnalyzer, ANALYSIS_FEATURES
+from .backends import get_backend, AudioBackend, LibrosaBackend, NumpyBackend
 from .voice import VoiceAnalyzer
+from .speech import get_recognizer, SpeechRecognizer, GoogleSpeechRecognizer, OfflineSpeechRecognizer
 from .downloader import AudioDownloader
 from .features import FeatureExtractor
 from .mood import MoodAnalyzer
 
 __all__ = [
     'AudioAnalyzer',
+    'ANALYSIS_FEATURES',
     'AudioBackend',
     'LibrosaBackend',
+    'NumpyBackend',
     # 'AudioFluxBackend',
     'get_backend',
     'VoiceAnalyzer',
+    'SpeechRecognizer',
+    'GoogleSpeechRecognizer',
+    'OfflineSpeechRecognizer',
+    'get_recognizer',
     'AudioDownloader',
     'FeatureExtractor',
     'MoodAnalyzer'
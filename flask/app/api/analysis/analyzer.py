@@ -1,32 +1,108 @@
 import os
+import copy
 import json
+import hashlib
+import tempfile
+import contextlib
+import multiprocessing
 import numpy as np
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import BinaryIO, Dict, Any, Callable, Iterable, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
 import soundfile as sf
 from .backends import get_backend
+from .budget import AnalysisBudget
+from .cache import FeatureCache, PCMCache
 from .voice import VoiceAnalyzer
-from .features import FeatureExtractor
+from .speech import get_recognizer
+from .features import FeatureExtractor, FEATURE_NAMES
 from .mood import MoodAnalyzer
+from .audio import hash_samples, resample, rewind, AudioSource, BlockReader, FFmpegDecoder, PrefetchBuffer
 import boto3
 import io
 from botocore.config import Config
 
+# Analysis stages that can be requested alongside the extracted features
+ANALYSIS_STAGES = ('voice', 'mood', 'detailed')
+ANALYSIS_FEATURES = FEATURE_NAMES + ANALYSIS_STAGES
+# Stages of a full analysis; the detailed analysis only runs when requested
+DEFAULT_STAGES = ('voice', 'mood')
+DEFAULT_FEATURES = FEATURE_NAMES + DEFAULT_STAGES
+# Parts of the analysis document produced by the 'detailed' stage
+DETAILED_ANALYSIS_KEYS = ('track', 'bars', 'beats', 'sections', 'segments', 'tatums')
+
 class AudioAnalyzer:
     """Main class that orchestrates the audio analysis process"""
     
     def __init__(self, 
                  downloads_dir: str = 'downloads',
                  analysis_dir: str = 'analysis',
-                 backend: str = 'librosa'):
-        """Initialize the audio analyzer with all its components"""
+                 backend: str = 'librosa',
+                 sample_rate: Optional[int] = None,
+                 streaming_min_duration: Optional[float] = None,
+                 analysis_threads: int = 1,
+                 speech_recognizer: str = 'google',
+                 max_speech_seconds: float = 30.0,
+                 speech_timeout: float = 10.0,
+                 defer_transcription: bool = False,
+                 offline_transcript: Optional[str] = None,
+                 time_budget: Optional[float] = None,
+                 spool_max_bytes: int = 64 * 1024 * 1024,
+                 overlap_download: bool = False,
+                 decoder: str = 'soundfile',
+                 cache_max_bytes: Optional[int] = None,
+                 pcm_cache_max_bytes: Optional[int] = None):
+        """Initialize the audio analyzer with all its components
+
+        offline_transcript is what the 'offline' speech recognizer returns.
+        time_budget caps the seconds spent analyzing one track; outputs that
+        do not fit are skipped or coarsened and listed under 'degraded'.
+        Downloaded audio stays in memory up to spool_max_bytes before spilling
+        to downloads_dir; overlap_download decodes while downloading instead.
+        decoder is 'soundfile', or 'ffmpeg' to decode any container through
+        an ffmpeg pipe that downmixes and resamples on the fly. With
+        cache_max_bytes, extracted features are cached under analysis_dir by
+        the decoded audio's hash, so re-analyzing the same audio reuses them.
+        With pcm_cache_max_bytes, decoded tracks are kept as .npy files under
+        downloads_dir that retries and later stages memory-map instead of
+        downloading and decoding the audio again.
+        """
         self.downloads_dir = downloads_dir
         self.analysis_dir = analysis_dir
+        self.sample_rate = sample_rate
+        self.backend_name = backend
+        self.time_budget = time_budget
+        self.spool_max_bytes = spool_max_bytes
+        self.overlap_download = overlap_download
+        
+        decoders = {'soundfile': None, 'ffmpeg': FFmpegDecoder}
+        if decoder not in decoders:
+            raise ValueError(f"Unknown audio decoder: {decoder}. Available decoders: {list(decoders.keys())}")
+        self.audio_decoder = decoders[decoder]() if decoders[decoder] else None
+        if self.audio_decoder is not None and not self.audio_decoder.available():
+            print(f"Audio decoder {decoder} is not installed, decoding with soundfile instead")
+            self.audio_decoder = None
+            decoder = 'soundfile'
+        self.decoder_name = decoder
+        
+        # Tracks at least this long (in seconds) are analyzed block by block
+        self.streaming_min_duration = streaming_min_duration
+        self.streaming_block_size = 65536
+        self.streaming_voice_excerpt = 60.0
+        
+        # Length of the excerpt analyzed for a provisional preview
+        self.preview_seconds = 30.0
         
         # Create component instances
         self.backend = get_backend(backend)
-        self.voice_analyzer = VoiceAnalyzer()
-        self.feature_extractor = FeatureExtractor(self.backend)
+        self.voice_options = (speech_recognizer, max_speech_seconds, speech_timeout, defer_transcription,
+                              offline_transcript)
+        self.voice_analyzer = _create_voice_analyzer(*self.voice_options)
+        self.cache_options = (os.path.join(analysis_dir, 'feature_cache'), cache_max_bytes) if cache_max_bytes else None
+        self.feature_extractor = FeatureExtractor(self.backend, max_workers=analysis_threads,
+                                                  cache=_create_feature_cache(self.cache_options))
+        self.pcm_cache = PCMCache(os.path.join(downloads_dir, 'pcm_cache'), pcm_cache_max_bytes) if pcm_cache_max_bytes else None
         self.mood_analyzer = MoodAnalyzer()
         
         # Initialize S3 client
@@ -41,140 +117,696 @@ class AudioAnalyzer:
         os.makedirs(downloads_dir, exist_ok=True)
         os.makedirs(analysis_dir, exist_ok=True)
 
-    def analyze_track(self, track_id: int, bucket_name: str) -> Dict[str, Any]:
-        """Complete analysis pipeline for a track from S3"""
+    def reset(self) -> None:
+        """Drop per-task state (the progress callback) so the analyzer can serve another task"""
+        self.feature_extractor.set_progress_callback(None)
+
+    def feature_names(self) -> List[str]:
+        """Names of every feature and analysis stage that can be requested"""
+        return self.feature_extractor.feature_names() + list(ANALYSIS_STAGES)
+
+    def default_feature_names(self) -> List[str]:
+        """Names of the features and stages a full analysis holds"""
+        return self.feature_extractor.feature_names() + list(DEFAULT_STAGES)
+
+    def analyze_track(self, track_id: int, bucket_name: str,
+                      on_preview: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      features: Optional[Iterable[str]] = None,
+                      find_duplicate: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+        """Complete analysis pipeline for a track from S3
+
+        With on_preview, a provisional analysis of a short excerpt is handed
+        to the callback before the full-track analysis starts. With features,
+        only those features (and the 'voice', 'mood' and 'detailed' stages, if listed) are
+        computed, otherwise every feature and the 'voice' and 'mood' stages; features already present in the track's stored analysis are
+        kept rather than recomputed. find_duplicate looks up a completed
+        analysis by the MD5 of the decoded samples; when it returns one that
+        holds the requested features, its results are reused instead.
+        """
         try:
+            budget = AnalysisBudget(self.time_budget)
+            
             # First check if the analysis JSON exists and is processed
             try:
-                json_key = f"analyses/{track_id}.json"
-                json_obj = self.s3.get_object(
-                    Bucket=bucket_name,
-                    Key=json_key
-                )
-                analysis_data = json.loads(json_obj['Body'].read().decode('utf-8'))
-                
-                if not analysis_data.get('audio_processed'):
-                    raise Exception("Audio file not yet processed")
-                    
-                # Get the audio path from the JSON
-                audio_path = analysis_data.get('audio_path')
-                if not audio_path:
-                    raise Exception("Audio path not found in analysis data")
-                    
+                json_key, analysis_data = self._load_analysis_data(track_id, bucket_name)
             except Exception as e:
                 print(f"Error checking analysis status: {str(e)}")
                 return {'error': 'Analysis not ready for processing'}
-
-            # Get the audio file from S3
-            print(f"Getting audio for track ID: {track_id}")
-            temp_path = os.path.join(self.downloads_dir, f"temp_{track_id}.mp3")
             
-            try:
-                # Download file from S3 using the path from JSON
-                print(f"Downloading from S3: {audio_path}")
-                self.s3.download_file(
-                    bucket_name,
-                    audio_path,
-                    temp_path
-                )
-                
-                if not os.path.exists(temp_path):
-                    error_msg = f'Failed to download audio from S3 for track ID: {track_id}'
+            # Work out which of the requested features still have to be computed
+            previous = analysis_data.get('analysis_results') if features is not None else None
+            missing = self._missing_features(features, previous)
+            if missing is not None and not missing:
+                print(f"Requested features already analyzed for track ID: {track_id}")
+                return previous
+            targets, stages = self._plan_features(missing, previous)
+            if previous is not None:
+                # A top-up of a completed analysis has nothing provisional to show
+                on_preview = None
+
+            # An earlier attempt or stage may have left the decoded audio behind
+            pcm_key = self._pcm_key(bucket_name, analysis_data['audio_path'], targets)
+            pcm = self.pcm_cache.load(pcm_key) if pcm_key is not None else None
+            if pcm is not None:
+                print(f"Using cached decoded audio for track ID: {track_id}")
+                audio = contextlib.nullcontext()
+            else:
+                # Get the audio file from S3
+                print(f"Getting audio for track ID: {track_id}")
+                try:
+                    audio = self._open_audio(bucket_name, analysis_data['audio_path'])
+                except Exception as e:
+                    error_msg = f'Failed to download audio from S3 for track ID: {track_id}: {str(e)}'
                     print(error_msg)
                     return {'error': error_msg}
-                
+            
+            with audio:
                 # Load and analyze the audio
-                print(f"Loading and analyzing audio from: {temp_path}")
-                y, sr = sf.read(temp_path)
-                
-                # Ensure mono audio
-                if len(y.shape) > 1:
-                    y = np.mean(y, axis=1)
-                
-                # Convert to float32
-                y = np.asarray(y, dtype=np.float32)
-                
-                # Extract features
-                technical_features = self.feature_extractor.extract_features(y, sr)
-             
-                # Analyze voice characteristics
-                voice_features = self.voice_analyzer.analyze(y, sr)
-                
-                # Analyze mood
-                if technical_features.get('energy') is not None and technical_features.get('valence') is not None:
-                    mood_scores = self.mood_analyzer.analyze(technical_features)
+                if pcm is None and self._use_streaming(audio):
+                    if on_preview is not None:
+                        y, sr = self._centered_excerpt(audio, targets)
+                        self._publish_preview(track_id, y, sr, self._audio_info(audio)[1], on_preview,
+                                              targets, stages)
+                    print(f"Streaming and analyzing audio for track ID: {track_id}")
+                    # The detailed analysis needs the whole signal at once
+                    stages = tuple(stage for stage in stages if stage != 'detailed')
+                    detailed_analysis = None
+                    technical_features, voice_features, duration, content_hash = self._analyze_streaming(
+                        audio, targets, 'voice' in stages, budget
+                    )
                 else:
-                    mood_scores = self.mood_analyzer._get_default_mood_scores()
-                
-                # Combine all results
-                analysis = {
-                    'track_id': track_id,
-                    'timestamp': datetime.now().isoformat(),
-                    'analysis': {
-                        'duration': float(len(y) / sr) if y is not None else None,
-                        'technical_features': technical_features,
-                        'voice_features': voice_features,
-                        'mood_scores': mood_scores
-                    }
-                }
-                
-                # Update the analysis JSON with results
-                analysis_data.update({
-                    'analysis_completed': True,
-                    'analysis_completed_at': datetime.now().isoformat(),
-                    'analysis_results': analysis
-                })
-                
-                # Save updated analysis back to S3
-                self.s3.put_object(
-                    Bucket=bucket_name,
-                    Key=json_key,
-                    Body=json.dumps(analysis_data, indent=2),
-                    ContentType='application/json'
-                )
+                    print(f"Loading and analyzing audio for track ID: {track_id}")
+                    y, sr = pcm if pcm is not None else self._store_pcm(pcm_key, *self._decode(audio, targets))
+                    duration = float(len(y) / sr)
+                    content_hash = hash_samples(y)
+                    
+                    # The same recording may already have been analyzed under another track
+                    if find_duplicate is not None and previous is None:
+                        duplicate = self._reuse_duplicate(track_id, content_hash, find_duplicate(content_hash), features)
+                        if duplicate is not None:
+                            print(f"Reusing analysis of identical audio for track ID: {track_id}")
+                            self._save_analysis(bucket_name, json_key, analysis_data, duplicate)
+                            return duplicate
+                    
+                    if on_preview is not None:
+                        start, end = self._loudest_window(y, sr)
+                        self._publish_preview(track_id, y[start:end], sr, duration, on_preview,
+                                              targets, stages)
+                    
+                    technical_features, voice_features, detailed_analysis = self._extract_features_and_voice(
+                        y, sr, targets, 'voice' in stages, budget, content_hash, 'detailed' in stages
+                    )
                 
+                analysis = self._compose_analysis(track_id, duration, technical_features, voice_features,
+                                                  stages=stages, previous=previous, degraded=budget.degraded,
+                                                  sample_md5=content_hash, detailed_analysis=detailed_analysis)
+                self._save_analysis(bucket_name, json_key, analysis_data, analysis)
                 return analysis
-                
-            finally:
-                # Clean up temp file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
                     
         except Exception as e:
             print(f"Error analyzing track {track_id}: {str(e)}")
             return {'error': str(e)}
 
-    def _load_existing_analysis(self, track_id: str) -> Optional[Dict[str, Any]]:
-        """Load existing analysis if available"""
+    def analyze_tracks(self, track_ids: Iterable[int], bucket_name: str,
+                       processes: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        """Analyze many tracks, fanning feature computation out over a process pool
+
+        A few threads download and decode upcoming tracks into shared memory
+        blocks while the pool works; pool workers attach to those blocks by
+        name, so sample arrays are never pickled. A bounded number of decoded
+        tracks is kept in flight, and each result is written back to S3 as
+        soon as it is ready.
+        """
+        processes = processes or os.cpu_count() or 1
+        max_in_flight = processes * 2
+        # Tracks downloaded and decoded ahead of the pool
+        prefetch = min(4, max(1, processes // 2))
+        results: Dict[int, Dict[str, Any]] = {}
+        saves = []
+        pending = {}
+        loading = []
+        track_ids = iter(track_ids)
+        
+        def prepare(track_id):
+            """Download and decode a track into a shared memory block"""
+            json_key, analysis_data = self._load_analysis_data(track_id, bucket_name)
+            pcm_key = self._pcm_key(bucket_name, analysis_data['audio_path'])
+            pcm = self.pcm_cache.load(pcm_key) if pcm_key is not None else None
+            if pcm is None:
+                with self._open_audio(bucket_name, analysis_data['audio_path']) as audio:
+                    pcm = self._store_pcm(pcm_key, *self._decode(audio))
+            y, sr = pcm
+            
+            # Copy the decoded signal into shared memory once; workers read it in place
+            shm = shared_memory.SharedMemory(create=True, size=max(1, y.nbytes))
+            np.ndarray(y.shape, dtype=np.float32, buffer=shm.buf)[:] = y
+            return json_key, analysis_data, shm, len(y), sr, hash_samples(y)
+        
+        def load_next():
+            track_id = next(track_ids, None)
+            if track_id is not None:
+                loading.append((track_id, loaders.submit(prepare, track_id)))
+        
+        def collect(done):
+            for future in done:
+                track_id, json_key, analysis_data, shm, duration, content_hash = pending.pop(future)
+                try:
+                    technical_features, voice_features, degraded = future.result()
+                    analysis = self._compose_analysis(track_id, duration, technical_features, voice_features,
+                                                      degraded=degraded, sample_md5=content_hash)
+                    results[track_id] = analysis
+                    saves.append((track_id, writers.submit(
+                        self._save_analysis, bucket_name, json_key, analysis_data, analysis
+                    )))
+                except Exception as e:
+                    print(f"Error analyzing track {track_id}: {str(e)}")
+                    results[track_id] = {'error': str(e)}
+                finally:
+                    shm.close()
+                    shm.unlink()
+        
+        # Workers come from a forkserver, not a fork of this process: the loader
+        # and writer threads may hold locks a forked child would inherit held
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=_init_batch_worker,
+            initargs=(self.backend_name, self.feature_extractor.max_workers, self.voice_options, self.time_budget,
+                      self.cache_options)
+        ) as pool, ThreadPoolExecutor(max_workers=prefetch) as loaders, \
+                ThreadPoolExecutor(max_workers=min(16, processes)) as writers:
+            for _ in range(prefetch):
+                load_next()
+            
+            while loading:
+                while len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                
+                track_id, loaded = loading.pop(0)
+                load_next()
+                try:
+                    json_key, analysis_data, shm, length, sr, content_hash = loaded.result()
+                except Exception as e:
+                    print(f"Error preparing track {track_id}: {str(e)}")
+                    results[track_id] = {'error': str(e)}
+                    continue
+                
+                future = pool.submit(_analyze_shared, shm.name, length, sr, content_hash)
+                pending[future] = (track_id, json_key, analysis_data, shm, float(length / sr), content_hash)
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        
+        # Writes ran alongside the analysis; report any that failed
+        for track_id, save in saves:
+            try:
+                save.result()
+            except Exception as e:
+                print(f"Error saving analysis of track {track_id}: {str(e)}")
+                results[track_id] = {'error': str(e)}
+        
+        return results
+
+    def transcribe_track(self, track_id: int, bucket_name: str, regions: List[List[float]]) -> Dict[str, Any]:
+        """Transcribe the vocal regions of an analyzed track and patch its stored voice features
+
+        Only the given regions (start/end seconds, as recorded by voice
+        analysis) are decoded and sent to the speech recognizer. They are
+        sliced from the PCM cache when the analysis stage left the track there
+        at a rate the recognizer can use.
+        """
         try:
-            analysis_path = os.path.join(self.analysis_dir, f"{track_id}_analysis.json")
+            json_key, analysis_data = self._load_analysis_data(track_id, bucket_name)
+            pcm_key = self._pcm_key(bucket_name, analysis_data['audio_path'])
+            pcm = self.pcm_cache.load(pcm_key) if pcm_key is not None else None
+            if pcm is not None and pcm[1] >= self.voice_analyzer.speech_sample_rate:
+                # Slice the regions out of the audio the analysis stage decoded
+                y, sr = pcm
+                segments = [y[int(start * sr):int(start * sr) + max(0, int((end - start) * sr))]
+                            for start, end in regions]
+            else:
+                with self._open_audio(bucket_name, analysis_data['audio_path']) as audio:
+                    segments, sr = self._read_regions(audio, regions)
             
-            if os.path.exists(analysis_path):
-                print(f"Found existing analysis: {analysis_path}")
-                with open(analysis_path, 'r') as f:
-                    existing_analysis = json.load(f)
-                    if self._is_valid_analysis(existing_analysis):
-                        print("Using existing analysis")
-                        return existing_analysis
-                    print("Existing analysis is incomplete, will reanalyze...")
+            speech_features = self.voice_analyzer.transcribe(segments, sr)
+            speech_features['transcription'] = 'completed'
             
-            return None
+            # Patch the voice features of the stored analysis
+            analysis = analysis_data.get('analysis_results')
+            if analysis:
+                analysis.setdefault('analysis', {}).setdefault('voice_features', {}).update(speech_features)
+                self._save_analysis(bucket_name, json_key, analysis_data, analysis)
+            
+            return speech_features
             
         except Exception as e:
-            print(f"Error loading existing analysis: {str(e)}")
+            print(f"Error transcribing track {track_id}: {str(e)}")
+            return {'error': str(e)}
+
+    def _read_regions(self, path: AudioSource, regions: List[List[float]]) -> Tuple[List[np.ndarray], int]:
+        """Decode only the given (start, end) second ranges of a file as mono float32"""
+        probe = self._probe(path)
+        if probe is not None:
+            # One pass over the span covering every region, sliced afterwards
+            sr, _, channels = probe
+            if not regions:
+                return [], sr
+            first = min(start for start, _ in regions)
+            last = max(end for _, end in regions)
+            span = self.audio_decoder.decode(path, sr, first, max(0.0, last - first), channels=channels)
+            return [
+                span[int((start - first) * sr):int((start - first) * sr) + max(0, int((end - start) * sr))]
+                for start, end in regions
+            ], sr
+        
+        segments = []
+        with sf.SoundFile(rewind(path)) as audio_file:
+            sr = audio_file.samplerate
+            for start, end in regions:
+                audio_file.seek(min(int(start * sr), audio_file.frames))
+                block = audio_file.read(max(0, int((end - start) * sr)), dtype='float32', always_2d=True)
+                segments.append(block.mean(axis=1))
+        return segments, sr
+
+    def _load_analysis_data(self, track_id: int, bucket_name: str) -> Tuple[str, Dict[str, Any]]:
+        """Fetch the track's analysis JSON from S3 and check it is ready for processing"""
+        json_key = f"analyses/{track_id}.json"
+        json_obj = self.s3.get_object(
+            Bucket=bucket_name,
+            Key=json_key
+        )
+        analysis_data = json.loads(json_obj['Body'].read().decode('utf-8'))
+        
+        if not analysis_data.get('audio_processed'):
+            raise Exception("Audio file not yet processed")
+            
+        # Get the audio path from the JSON
+        if not analysis_data.get('audio_path'):
+            raise Exception("Audio path not found in analysis data")
+        
+        return json_key, analysis_data
+
+    def _open_audio(self, bucket_name: str, audio_path: str) -> BinaryIO:
+        """Fetch the track's audio from S3 into a seekable buffer the decoder reads directly
+
+        By default the object is downloaded into a spooled buffer that stays in
+        memory up to spool_max_bytes. With overlap_download, decoding starts
+        while the object is still arriving.
+        """
+        print(f"Downloading from S3: {audio_path}")
+        if self.overlap_download:
+            obj = self.s3.get_object(Bucket=bucket_name, Key=audio_path)
+            return PrefetchBuffer(obj['Body'], obj['ContentLength'])
+        
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes, dir=self.downloads_dir)
+        try:
+            self.s3.download_fileobj(bucket_name, audio_path, buffer)
+        except Exception:
+            buffer.close()
+            raise
+        buffer.seek(0)
+        return buffer
+
+    def _pcm_key(self, bucket_name: str, audio_path: str, targets: Optional[List[str]] = None) -> Optional[str]:
+        """PCM cache key of a track's audio object as this analyzer decodes it, or None without a cache
+
+        The object's ETag is part of the key, so replaced audio is decoded afresh.
+        """
+        if self.pcm_cache is None:
+            return None
+        try:
+            etag = self.s3.head_object(Bucket=bucket_name, Key=audio_path)['ETag']
+        except Exception as e:
+            print(f"Error reading audio object metadata: {str(e)}")
             return None
+        # Decoding for fewer features may use a lower rate, so the rate is part of the key
+        identity = [bucket_name, audio_path, etag, self.decoder_name, self.backend_name, str(self._target_rate(targets))]
+        return hashlib.md5('|'.join(identity).encode('utf-8')).hexdigest()
 
-    def _is_valid_analysis(self, analysis: Dict[str, Any]) -> bool:
-        """Check if the analysis is valid and complete"""
+    def _store_pcm(self, key: Optional[str], y: np.ndarray, sr: int) -> Tuple[np.ndarray, int]:
+        """Keep a decoded signal in the PCM cache, continuing on the memory-mapped copy"""
+        if key is None:
+            return y, sr
+        return self.pcm_cache.store(key, y, sr)
+
+    def _audio_info(self, path: AudioSource) -> Tuple[int, float]:
+        """Native sample rate and duration in seconds of an encoded audio source"""
+        probe = self._probe(path)
+        if probe is not None:
+            return probe[:2]
+        info = sf.info(rewind(path))
+        return int(info.samplerate), float(info.duration)
+
+    def _probe(self, path: AudioSource) -> Optional[Tuple[int, float, int]]:
+        """Sample rate, duration and channel count from the ffmpeg decoder, or None to use soundfile"""
+        if self.audio_decoder is None:
+            return None
         try:
-            return (
-                analysis 
-                and 'analysis' in analysis 
-                and analysis['analysis'] 
-                and 'technical_features' in analysis['analysis']
-                and 'mood_scores' in analysis['analysis']
-                and any(analysis['analysis']['technical_features'].values())
-                and any(analysis['analysis']['mood_scores'].values())
+            info = self.audio_decoder.probe(path)
+        except Exception as e:
+            print(f"Error probing audio, decoding with soundfile instead: {str(e)}")
+            return None
+        if not info[1]:
+            print("Audio probe reported no duration, decoding with soundfile instead")
+            return None
+        return info
+
+    def _decode(self, path: AudioSource, targets: Optional[List[str]] = None) -> Tuple[np.ndarray, int]:
+        """Decode an audio file to mono float32 at the analysis rate of the targets"""
+        probe = self._probe(path)
+        if probe is not None:
+            # ffmpeg writes mono samples at the analysis rate into a buffer sized from the probe
+            native_sr, duration, channels = probe
+            sr = self._analysis_rate(native_sr, targets)
+            return self.audio_decoder.decode(path, sr, expected_seconds=duration, channels=channels), sr
+        
+        y, sr = sf.read(rewind(path))
+        
+        # Ensure mono audio
+        if len(y.shape) > 1:
+            y = np.mean(y, axis=1)
+        
+        # Convert to float32
+        y = np.asarray(y, dtype=np.float32)
+        
+        # Resample once to the analysis rate before any feature extraction
+        return self._resample(y, sr, targets)
+
+    def _publish_preview(self, track_id: int, y: np.ndarray, sr: int, duration: float,
+                         on_preview: Callable[[Dict[str, Any]], None],
+                         targets: Optional[List[str]] = None,
+                         stages: Tuple[str, ...] = DEFAULT_STAGES) -> None:
+        """Analyze an excerpt and hand the provisional result to the preview callback"""
+        # The excerpt is analyzed without progress reports, voice or detailed analysis
+        callback = self.feature_extractor.progress_callback
+        self.feature_extractor.set_progress_callback(None)
+        try:
+            technical_features = self.feature_extractor.extract_features(y, sr, targets)
+            if not technical_features:
+                return
+            technical_features['duration_ms'] = int(duration * 1000)
+            preview = self._compose_analysis(
+                track_id, duration, technical_features,
+                self.voice_analyzer._get_default_features(), provisional=True,
+                stages=tuple(stage for stage in stages if stage not in ('voice', 'detailed'))
             )
-        except Exception:
-            return False 
\ No newline at end of file
+            on_preview(preview)
+        except Exception as e:
+            print(f"Error publishing preview for track {track_id}: {str(e)}")
+        finally:
+            self.feature_extractor.set_progress_callback(callback)
+
+    def _loudest_window(self, y: np.ndarray, sr: int) -> Tuple[int, int]:
+        """Sample range of the preview-length window with the most energy"""
+        length = int(self.preview_seconds * sr)
+        if len(y) <= length:
+            return 0, len(y)
+        
+        # Energy per one-second block, then a sliding sum over the window
+        blocks = y[:len(y) // sr * sr].reshape(-1, sr)
+        energy = np.concatenate(([0.0], np.cumsum(np.einsum('ij,ij->i', blocks, blocks), dtype=np.float64)))
+        window = min(len(blocks), max(1, length // sr))
+        start = int(np.argmax(energy[window:] - energy[:-window])) * sr
+        start = min(start, len(y) - length)
+        return start, start + length
+
+    def _centered_excerpt(self, path: AudioSource, targets: Optional[List[str]] = None) -> Tuple[np.ndarray, int]:
+        """Decode a preview-length excerpt from the middle of a file at the analysis rate"""
+        probe = self._probe(path)
+        if probe is not None:
+            native_sr, duration, channels = probe
+            sr = self._analysis_rate(native_sr, targets)
+            start = max(0.0, duration / 2 - self.preview_seconds / 2)
+            return self.audio_decoder.decode(path, sr, start, self.preview_seconds, channels=channels), sr
+        
+        middle = sf.info(rewind(path)).duration / 2
+        half = self.preview_seconds / 2
+        segments, sr = self._read_regions(path, [[max(0.0, middle - half), middle + half]])
+        return self._resample(segments[0], sr, targets)
+
+    def _compose_analysis(self, track_id: int, duration: float, technical_features: Dict[str, Any],
+                          voice_features: Dict[str, Any], provisional: bool = False,
+                          stages: Iterable[str] = DEFAULT_STAGES,
+                          previous: Optional[Dict[str, Any]] = None,
+                          degraded: Optional[Dict[str, str]] = None,
+                          sample_md5: Optional[str] = None,
+                          detailed_analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Score mood and combine all results into the analysis document
+
+        Stages not listed, or skipped for lack of time, are not run. The
+        detailed analysis (track summary, bars, beats, sections, segments and
+        tatums) is added alongside the features when given. Results
+        of a previous analysis of the track fill in every feature and stage
+        that was not recomputed.
+        """
+        degraded = dict(degraded or {})
+        stages = tuple(stage for stage in stages if degraded.get(stage) != 'skipped')
+        previous = (previous or {}).get('analysis', {})
+        present = set(previous.get('available_features', self.default_feature_names())) if previous else set()
+        if previous:
+            # Degradations of outputs recomputed now no longer apply
+            recomputed = set(technical_features.get('available_features', [])) | set(stages)
+            if 'detailed' in stages:
+                # Sections, segments and tatums are coarsened or skipped as part of it
+                recomputed |= set(DETAILED_ANALYSIS_KEYS)
+            for name, how in previous.get('degraded', {}).items():
+                if name not in recomputed:
+                    degraded.setdefault(name, how)
+            technical_features = self._merge_technical_features(previous.get('technical_features', {}),
+                                                                technical_features)
+        
+        # Analyze mood
+        if 'mood' not in stages and 'mood' in present:
+            mood_scores = previous['mood_scores']
+        elif 'mood' in stages and technical_features.get('energy') is not None and technical_features.get('valence') is not None:
+            mood_scores = self.mood_analyzer.analyze(technical_features)
+        else:
+            if 'mood' in stages and ('energy' in degraded or 'valence' in degraded):
+                # The features mood is scored from were skipped for lack of time
+                degraded['mood'] = 'skipped'
+                stages = tuple(stage for stage in stages if stage != 'mood')
+            mood_scores = self.mood_analyzer._get_default_mood_scores()
+        
+        if 'voice' not in stages and 'voice' in present:
+            voice_features = previous['voice_features']
+        
+        if 'detailed' not in stages and 'detailed' in present:
+            detailed_analysis = {key: previous[key] for key in DETAILED_ANALYSIS_KEYS if key in previous}
+        elif detailed_analysis is None:
+            # Not requested, skipped for lack of time or failed
+            stages = tuple(stage for stage in stages if stage != 'detailed')
+            detailed_analysis = {}
+        
+        # Record which features and stages the document holds
+        available = list(technical_features.get('available_features', []))
+        available += [stage for stage in ANALYSIS_STAGES if stage in stages or stage in present]
+        
+        # Combine all results
+        return {
+            'track_id': track_id,
+            'timestamp': datetime.now().isoformat(),
+            'provisional': provisional,
+            'analysis': {
+                'duration': duration,
+                'sample_md5': sample_md5 or previous.get('sample_md5'),
+                'available_features': available,
+                'degraded': degraded,
+                'technical_features': technical_features,
+                'voice_features': voice_features,
+                'mood_scores': mood_scores,
+                **{key: detailed_analysis[key] for key in DETAILED_ANALYSIS_KEYS if key in detailed_analysis}
+            }
+        }
+
+    def _merge_technical_features(self, previous: Dict[str, Any], technical_features: Dict[str, Any]) -> Dict[str, Any]:
+        """Add newly extracted technical features to those of an earlier analysis"""
+        # Analyses stored before feature selection hold every feature
+        names = self.feature_extractor.feature_names()
+        present = set(previous.get('available_features', names)) | set(technical_features.get('available_features', []))
+        merged = dict(previous)
+        merged.update(technical_features)
+        merged['available_features'] = [name for name in names if name in present]
+        return merged
+
+    def _missing_features(self, features: Optional[Iterable[str]],
+                          previous: Optional[Dict[str, Any]] = None) -> Optional[set]:
+        """Requested features not present in a previous analysis, or None for a full analysis"""
+        if features is None:
+            return None
+        requested = set(features)
+        unknown = requested - set(self.feature_names())
+        if unknown:
+            raise ValueError(f"Unknown features: {sorted(unknown)}. Available features: {self.feature_names()}")
+        if not previous:
+            return requested
+        present = previous.get('analysis', {}).get('available_features', self.default_feature_names())
+        return requested - set(present)
+
+    def _plan_features(self, missing: Optional[set],
+                       previous: Optional[Dict[str, Any]] = None) -> Tuple[Optional[List[str]], Tuple[str, ...]]:
+        """Extractor targets and analysis stages needed to compute the missing features"""
+        if missing is None:
+            return None, DEFAULT_STAGES
+        stages = tuple(stage for stage in ANALYSIS_STAGES if stage in missing)
+        targets = set(missing)
+        if 'mood' in stages:
+            # Mood is scored from technical features that may not be present yet
+            present = previous.get('analysis', {}).get('available_features', self.default_feature_names()) if previous else []
+            targets |= set(self.mood_analyzer.requirements()) - set(present)
+        return [name for name in self.feature_extractor.feature_names() if name in targets], stages
+
+    def _reuse_duplicate(self, track_id: int, sample_md5: str, duplicate: Optional[Dict[str, Any]],
+                         features: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Copy of another track's analysis of the same audio, if it is complete enough to reuse"""
+        if not duplicate or duplicate.get('provisional') or 'analysis' not in duplicate:
+            return None
+        if duplicate['analysis'].get('degraded') or duplicate['analysis'].get('sample_md5') != sample_md5:
+            return None
+        if self._missing_features(features if features is not None else self.default_feature_names(), duplicate):
+            return None
+        analysis = copy.deepcopy(duplicate)
+        analysis['track_id'] = track_id
+        analysis['timestamp'] = datetime.now().isoformat()
+        return analysis
+
+    def _save_analysis(self, bucket_name: str, json_key: str, analysis_data: Dict[str, Any],
+                       analysis: Dict[str, Any]) -> None:
+        """Write the completed analysis back into the track's S3 JSON"""
+        # Update the analysis JSON with results
+        analysis_data.update({
+            'analysis_completed': True,
+            'analysis_completed_at': datetime.now().isoformat(),
+            'analysis_results': analysis
+        })
+        
+        # Save updated analysis back to S3
+        self.s3.put_object(
+            Bucket=bucket_name,
+            Key=json_key,
+            Body=json.dumps(analysis_data, indent=2),
+            ContentType='application/json'
+        )
+
+    def _extract_features_and_voice(self, y: np.ndarray, sr: int, targets: Optional[List[str]] = None,
+                                    with_voice: bool = True, budget: Optional[AnalysisBudget] = None,
+                                    sample_md5: Optional[str] = None,
+                                    detailed: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Extract technical and voice features and the detailed analysis in one pass over the shared spectral frames"""
+        # Voice and detailed analysis are nodes of the feature graph, so with a
+        # thread pool configured they also run alongside the graph's other branches
+        technical_features, voice_features, detailed_analysis = self.feature_extractor.extract_analysis(
+            y, sr, self.voice_analyzer if with_voice else None, targets, budget, sample_md5, detailed
+        )
+        if voice_features is None:
+            voice_features = self.voice_analyzer._get_default_features()
+        return technical_features, voice_features, detailed_analysis
+
+    def _use_streaming(self, path: AudioSource) -> bool:
+        """Check whether a file is long enough to be analyzed in streaming mode"""
+        if not self.streaming_min_duration:
+            return False
+        try:
+            return self._audio_info(path)[1] >= self.streaming_min_duration
+        except Exception as e:
+            print(f"Error reading audio info: {str(e)}")
+            return False
+
+    def _analyze_streaming(self, path: AudioSource, targets: Optional[List[str]] = None, with_voice: bool = True,
+                           budget: Optional[AnalysisBudget] = None) -> Tuple[Dict[str, Any], Dict[str, Any], float, Optional[str]]:
+        """Analyze a long recording block by block with bounded memory
+
+        Frame-level features are accumulated from fixed-size blocks. Voice
+        analysis runs on a centered excerpt since it needs a contiguous signal.
+        """
+        reader = BlockReader(
+            path,
+            target_sr=self._target_rate(targets),
+            block_size=self.streaming_block_size,
+            excerpt_seconds=self.streaming_voice_excerpt if with_voice else None,
+            decoder=self.audio_decoder if self._probe(path) is not None else None
+        )
+        
+        technical_features = self.feature_extractor.extract_streaming_features(reader, reader.sr, targets, budget)
+        
+        if with_voice and budget is not None and budget.exhausted():
+            budget.degrade('voice', 'skipped')
+            voice_features = self.voice_analyzer._get_default_features()
+        elif with_voice and reader.excerpt is not None:
+            voice_features = self.voice_analyzer.analyze(reader.excerpt, reader.sr, budget=budget)
+        else:
+            voice_features = self.voice_analyzer._get_default_features()
+        
+        return technical_features, voice_features, reader.duration, reader.sample_md5
+
+    def _target_rate(self, targets: Optional[List[str]] = None) -> Optional[int]:
+        """Configured analysis rate, raised to what the extractors planned for the targets need
+
+        None without a configured rate, when signals keep their native rate.
+        """
+        if not self.sample_rate:
+            return None
+        return max(int(self.sample_rate), self.feature_extractor.required_sample_rate(targets))
+
+    def _analysis_rate(self, sr: int, targets: Optional[List[str]] = None) -> int:
+        """Rate a signal at sr is analyzed at; signals are never upsampled"""
+        if not self.sample_rate:
+            return sr
+        return min(sr, self._target_rate(targets))
+
+    def _resample(self, y: np.ndarray, sr: int, targets: Optional[List[str]] = None):
+        """Downsample to the analysis rate of the targets, never below what their extractors need"""
+        if not self.sample_rate:
+            return y, sr
+        return resample(y, sr, self._target_rate(targets))
+
+
+# Per-process components for batch workers, created once by the pool initializer
+_batch_worker: Dict[str, Any] = {}
+
+
+def _create_voice_analyzer(speech_recognizer: str, max_speech_seconds: float, speech_timeout: float,
+                           defer_transcription: bool = False,
+                           offline_transcript: Optional[str] = None) -> VoiceAnalyzer:
+    """Create a voice analyzer with the named speech recognizer and its limits"""
+    return VoiceAnalyzer(
+        recognizer=get_recognizer(speech_recognizer, offline_transcript),
+        max_speech_seconds=max_speech_seconds,
+        speech_timeout=speech_timeout,
+        defer_transcription=defer_transcription
+    )
+
+
+def _create_feature_cache(cache_options: Optional[Tuple[str, int]]) -> Optional[FeatureCache]:
+    """Create the feature result cache for a (directory, max_bytes) pair, if one is configured"""
+    return FeatureCache(*cache_options) if cache_options else None
+
+
+def _init_batch_worker(backend: str, analysis_threads: int = 1, voice_options: Tuple = ('google', 30.0, 10.0, False, None),
+                       time_budget: Optional[float] = None, cache_options: Optional[Tuple[str, int]] = None):
+    """Create the feature and voice analyzers a batch worker reuses for every track"""
+    _batch_worker['feature_extractor'] = FeatureExtractor(get_backend(backend), max_workers=analysis_threads,
+                                                          cache=_create_feature_cache(cache_options))
+    _batch_worker['voice_analyzer'] = _create_voice_analyzer(*voice_options)
+    _batch_worker['time_budget'] = time_budget
+
+
+def _analyze_shared(shm_name: str, length: int, sr: int,
+                    sample_md5: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, str]]:
+    """Extract technical and voice features from a signal held in shared memory
+
+    Also returns the outputs degraded to stay within the worker's time budget.
+    """
+    # Pool workers share the parent's resource tracker, which unlinks the block
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        budget = AnalysisBudget(_batch_worker['time_budget'])
+        y = np.ndarray((length,), dtype=np.float32, buffer=shm.buf)
+        technical_features, voice_features = _batch_worker['feature_extractor'].extract_features_with_voice(
+            y, sr, _batch_worker['voice_analyzer'], budget=budget, sample_md5=sample_md5
+        )
+        del y
+        return technical_features, voice_features, budget.degraded
+    finally:
+        shm.close()
@@ -0,0 +1,378 @@
+import hashlib
+import io
+import json
+import math
+import shutil
+import subprocess
+import threading
+import numpy as np
+import soundfile as sf
+import soxr
+from scipy.signal import resample_poly
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+# A path or a seekable binary file object holding encoded audio
+AudioSource = Union[str, BinaryIO]
+
+
+def resample(y: np.ndarray, sr: int, target_sr: int) -> Tuple[np.ndarray, int]:
+    """Downsample a mono signal to the target rate with a polyphase filter
+
+    Never upsamples: if the signal is already at or below the target rate it
+    is returned unchanged.
+    """
+    if not target_sr or target_sr >= sr:
+        return y, sr
+
+    divisor = math.gcd(int(sr), int(target_sr))
+    y = resample_poly(y, int(target_sr) // divisor, int(sr) // divisor)
+    return np.asarray(y, dtype=np.float32), int(target_sr)
+
+
+def hash_samples(y: np.ndarray) -> str:
+    """MD5 of a decoded signal's float32 samples, identifying the same recording across uploads"""
+    return hashlib.md5(np.ascontiguousarray(y, dtype='<f4')).hexdigest()
+
+
+def rewind(source: AudioSource) -> AudioSource:
+    """Seek a file object back to its start so it can be decoded again"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+class PrefetchBuffer(io.RawIOBase):
+    """Seekable in-memory file filled from a byte stream by a background thread
+
+    Reads wait until the requested bytes have arrived, so a decoder can start
+    on the head of an object while the rest is still downloading.
+    """
+
+    def __init__(self, stream, size: int, chunk_size: int = 1 << 20):
+        """Start copying size bytes from a readable stream into memory"""
+        super().__init__()
+        self._data = bytearray(size)
+        self._filled = 0
+        self._done = False
+        self._error: Optional[Exception] = None
+        self._position = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, args=(stream, chunk_size), daemon=True)
+        self._thread.start()
+
+    def _fill(self, stream, chunk_size: int) -> None:
+        """Copy the stream into the buffer, waking readers as data arrives, until done or closed"""
+        view = memoryview(self._data)
+        try:
+            while self._filled < len(self._data) and not self._stop.is_set():
+                chunk = stream.read(min(chunk_size, len(self._data) - self._filled))
+                if not chunk:
+                    raise IOError(f"Stream ended after {self._filled} of {len(self._data)} bytes")
+                view[self._filled:self._filled + len(chunk)] = chunk
+                with self._condition:
+                    self._filled += len(chunk)
+                    self._condition.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            view.release()
+            # Release the connection however the copy ended
+            if hasattr(stream, 'close'):
+                stream.close()
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def _wait_for(self, end: int) -> None:
+        """Block until the buffer holds everything before end"""
+        with self._condition:
+            while self._filled < end and not self._done and not self._stop.is_set():
+                self._condition.wait()
+        if self._error is not None:
+            raise IOError(f"Error downloading audio: {self._error}")
+        if self._filled < end and self._stop.is_set():
+            raise IOError("Audio buffer was closed before the download finished")
+
+    def close(self) -> None:
+        """Stop the background copy and wake any reader still waiting on it"""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._position >= len(self._data):
+            return 0
+        end = min(self._position + len(buffer), len(self._data))
+        self._wait_for(end)
+        count = max(0, end - self._position)
+        buffer[:count] = memoryview(self._data)[self._position:end]
+        self._position = end
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._data)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class FFmpegDecoder:
+    """Decodes any container ffmpeg reads into mono float32 through a subprocess pipe
+
+    File objects are fed to ffmpeg's stdin from a writer thread, while the
+    samples, already downmixed and resampled by ffmpeg, are read from its
+    stdout straight into a preallocated float32 buffer.
+    """
+
+    def __init__(self, executable: str = 'ffmpeg', probe_executable: str = 'ffprobe',
+                 chunk_size: int = 1 << 16):
+        """Initialize with the ffmpeg and ffprobe executables and the pipe chunk size"""
+        self.executable = executable
+        self.probe_executable = probe_executable
+        self.chunk_size = chunk_size
+
+    def available(self) -> bool:
+        """Check whether the ffmpeg and ffprobe executables can be found"""
+        return shutil.which(self.executable) is not None and shutil.which(self.probe_executable) is not None
+
+    def probe(self, source: AudioSource) -> Tuple[int, float, int]:
+        """Native sample rate, duration in seconds and channel count of the first audio stream"""
+        command = [
+            self.probe_executable, '-v', 'error', '-select_streams', 'a:0',
+            '-show_entries', 'stream=sample_rate,channels,duration:format=duration', '-of', 'json',
+            self._input(source)
+        ]
+        process = self._start(command, source)
+        output, error = process.communicate() if isinstance(source, str) else self._communicate(process, source)
+        if process.returncode != 0:
+            raise RuntimeError(f"ffprobe failed: {error.decode(errors='replace').strip()}")
+        
+        info = json.loads(output)
+        if not info.get('streams'):
+            raise RuntimeError("No audio stream found")
+        stream = info['streams'][0]
+        duration = stream.get('duration') or info.get('format', {}).get('duration') or 0
+        return int(stream['sample_rate']), float(duration), int(stream.get('channels') or 1)
+
+    def decode(self, source: AudioSource, sr: int, offset: float = 0.0, duration: Optional[float] = None,
+               expected_seconds: Optional[float] = None, channels: int = 2) -> np.ndarray:
+        """Decode a source, or the given time range of it, to mono float32 at rate sr
+
+        expected_seconds sizes the output buffer up front; it grows if the
+        decoded signal turns out longer. channels is the source's channel
+        count, which the downmix averages over.
+        """
+        process = self._start(self._decode_command(source, sr, channels, offset, duration), source)
+        feeder = self._feed(process, source)
+        try:
+            expected = expected_seconds if expected_seconds else (duration or 60.0)
+            y = np.empty(int(expected * sr) + sr, dtype=np.float32)
+            filled = 0
+            while True:
+                if filled == y.nbytes:
+                    grown = np.empty(2 * len(y), dtype=np.float32)
+                    grown[:len(y)] = y
+                    y = grown
+                count = process.stdout.readinto(memoryview(y.view(np.uint8))[filled:])
+                if not count:
+                    break
+                filled += count
+            error = process.stderr.read()
+            process.wait()
+        finally:
+            self._stop(process, feeder)
+        
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {error.decode(errors='replace').strip()}")
+        return y[:filled // 4]
+
+    def blocks(self, source: AudioSource, sr: int, block_size: int = 65536,
+               channels: int = 2) -> Iterator[np.ndarray]:
+        """Decode a source with the given channel count to consecutive mono float32 blocks at rate sr"""
+        process = self._start(self._decode_command(source, sr, channels), source)
+        feeder = self._feed(process, source)
+        try:
+            while True:
+                block = np.empty(block_size, dtype=np.float32)
+                view = memoryview(block.view(np.uint8))
+                filled = 0
+                while filled < len(view):
+                    count = process.stdout.readinto(view[filled:])
+                    if not count:
+                        break
+                    filled += count
+                if filled < 4:
+                    break
+                yield block[:filled // 4]
+            error = process.stderr.read()
+            process.wait()
+            if process.returncode != 0:
+                raise RuntimeError(f"ffmpeg failed: {error.decode(errors='replace').strip()}")
+        finally:
+            self._stop(process, feeder)
+
+    def _decode_command(self, source: AudioSource, sr: int, channels: int, offset: float = 0.0,
+                        duration: Optional[float] = None) -> List[str]:
+        """ffmpeg arguments writing raw little-endian float32 mono samples to stdout"""
+        command = [self.executable, '-nostdin', '-v', 'error', '-i', self._input(source), '-map', '0:a:0']
+        if offset:
+            command += ['-ss', f'{offset:.6f}']
+        if duration is not None:
+            command += ['-t', f'{duration:.6f}']
+        if channels > 1:
+            # Average the channels, as the soundfile path does; -ac 1 would scale by 1/sqrt(2)
+            weight = 1.0 / channels
+            command += ['-af', 'pan=mono|c0=' + '+'.join(f'{weight:.8f}*c{i}' for i in range(channels))]
+        return command + ['-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', '1', '-ar', str(int(sr)), 'pipe:1']
+
+    def _input(self, source: AudioSource) -> str:
+        """Input argument: the path itself, or stdin for file objects"""
+        return source if isinstance(source, str) else 'pipe:0'
+
+    def _start(self, command: List[str], source: AudioSource) -> subprocess.Popen:
+        """Start a subprocess with piped output, and piped input for file objects"""
+        return subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL if isinstance(source, str) else subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    def _feed(self, process: subprocess.Popen, source: AudioSource) -> Optional[threading.Thread]:
+        """Copy a file object into the process's stdin on a background thread"""
+        if isinstance(source, str):
+            return None
+        
+        def feed():
+            try:
+                rewind(source)
+                while True:
+                    chunk = source.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    process.stdin.write(chunk)
+            except (BrokenPipeError, ValueError, OSError):
+                # The process stopped reading, e.g. after the requested range
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+        
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        return feeder
+
+    def _communicate(self, process: subprocess.Popen, source: AudioSource) -> Tuple[bytes, bytes]:
+        """Feed a file object to a process and collect all of its output"""
+        feeder = self._feed(process, source)
+        try:
+            output = process.stdout.read()
+            error = process.stderr.read()
+            process.wait()
+            return output, error
+        finally:
+            self._stop(process, feeder)
+
+    def _stop(self, process: subprocess.Popen, feeder: Optional[threading.Thread]) -> None:
+        """Make sure the process has exited and the input thread has finished"""
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for stream in (process.stdout, process.stderr):
+            if stream is not None:
+                stream.close()
+        if feeder is not None:
+            feeder.join()
+
+
+class BlockReader:
+    """Reads an audio file as mono float32 blocks at the analysis rate
+
+    Blocks are decoded with soundfile.blocks, downmixed and resampled with a
+    streaming resampler, so memory stays bounded by the block size. Given an
+    FFmpegDecoder, blocks are read from its pipe instead, already downmixed
+    and resampled. A centered excerpt of the track can be retained for stages
+    that still need a contiguous signal (e.g. voice analysis).
+    """
+
+    def __init__(self, path: AudioSource, target_sr: Optional[int] = None,
+                 block_size: int = 65536, excerpt_seconds: Optional[float] = None,
+                 decoder: Optional[FFmpegDecoder] = None):
+        """Initialize with file path or file object, analysis rate, block size, excerpt length and decoder"""
+        if decoder is not None:
+            native_sr, duration, channels = decoder.probe(path)
+        else:
+            info = sf.info(rewind(path))
+            native_sr, duration, channels = info.samplerate, info.duration, info.channels
+        self.path = path
+        self.decoder = decoder
+        self.channels = int(channels)
+        self.block_size = block_size
+        self.native_sr = int(native_sr)
+        self.sr = int(target_sr) if target_sr and target_sr < self.native_sr else self.native_sr
+        self.duration = float(duration)
+        self.md5 = hashlib.md5()
+        self.complete = False
+
+        # Excerpt window in output samples, centered in the track
+        self.excerpt = None
+        self._excerpt_window = None
+        if excerpt_seconds:
+            length = int(min(excerpt_seconds, self.duration) * self.sr)
+            start = max(0, int(self.duration * self.sr / 2) - length // 2)
+            self._excerpt_window = (start, start + length)
+
+    def _blocks(self) -> Iterator[np.ndarray]:
+        """Mono float32 blocks at the analysis rate"""
+        if self.decoder is not None:
+            yield from self.decoder.blocks(self.path, self.sr, self.block_size, self.channels)
+            return
+
+        resampler = None
+        if self.sr != self.native_sr:
+            resampler = soxr.ResampleStream(self.native_sr, self.sr, 1, dtype='float32')
+
+        for block in sf.blocks(rewind(self.path), blocksize=self.block_size, dtype='float32', always_2d=True):
+            y = block.mean(axis=1, dtype=np.float32)
+            yield resampler.resample_chunk(y) if resampler is not None else y
+        if resampler is not None:
+            yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        excerpt_parts: List[np.ndarray] = []
+        position = 0
+        for y in self._blocks():
+            if self._excerpt_window is not None:
+                start, end = self._excerpt_window
+                lo, hi = max(start, position), min(end, position + len(y))
+                if lo < hi:
+                    excerpt_parts.append(y[lo - position:hi - position].copy())
+            position += len(y)
+            self.md5.update(np.ascontiguousarray(y, dtype='<f4'))
+
+            if len(y) > 0:
+                yield y
+
+        if excerpt_parts:
+            self.excerpt = np.concatenate(excerpt_parts)
+        self.complete = True
+
+    @property
+    def sample_md5(self) -> Optional[str]:
+        """MD5 of every sample of the track, or None until it has been read to the end"""
+        return self.md5.hexdigest() if self.complete else None
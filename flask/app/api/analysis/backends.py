@@ -1,29 +1,39 @@
 from abc import ABC, abstractmethod
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
 import librosa
 # import audioflux as af
 import traceback
+import itertools
+import threading
+import functools
+import scipy.fft
+import scipy.signal
 # import torch
 # import torchaudio
 # import torchaudio.transforms as T
 from typing import Tuple
+from .context import AnalysisContext, Intermediate
 
 class AudioBackend(ABC):
     """Abstract base class for audio analysis backends"""
     
     def __init__(self):
         self.progress_callback = None
+        self.progress_thread = None
         self.current_feature = None
         self.total_features = 10  # Total number of features we extract
         
     def set_progress_callback(self, callback):
         """Set callback function for progress updates"""
         self.progress_callback = callback
+        self.progress_thread = threading.get_ident()
         
     def _update_progress(self, feature_name: str):
         """Update progress through callback"""
-        if self.progress_callback:
+        # Callbacks may touch thread-bound state (e.g. a database session), so
+        # only the thread that registered the callback reports progress
+        if self.progress_callback and threading.get_ident() == self.progress_thread:
             # Calculate progress based on feature being processed
             feature_weights = {
                 'tempo': 0.1,
@@ -47,253 +57,450 @@ class AudioBackend(ABC):
                 int(progress * 100),
                 f"Extracting {feature_name.replace('_', ' ')}"
             )
+
+    def intermediates(self) -> Dict[str, Intermediate]:
+        """Intermediate representations this backend shares between extractors"""
+        return {}
+
+    def feature_requirements(self) -> Dict[str, Tuple[str, ...]]:
+        """Intermediates each extractor reads from the analysis context"""
+        return {}
+
+    def feature_sample_rates(self) -> Dict[str, int]:
+        """Minimum sample rate each extractor needs to produce meaningful values"""
+        return {}
+
+    def feature_versions(self) -> Dict[str, int]:
+        """Algorithm version of each extractor, 1 unless listed
+
+        Bump a feature's version whenever its extractor's output changes, so
+        results cached under the old version are not reused.
+        """
+        return {}
+
+    def create_context(self, y: np.ndarray, sr: int) -> AnalysisContext:
+        """Create a per-track analysis context for this backend"""
+        return AnalysisContext(y, sr, self.intermediates())
+
+    def create_streaming_context(self, blocks: Iterable[np.ndarray], sr: int) -> AnalysisContext:
+        """Create a context from mono blocks without holding the whole signal in memory"""
+        raise NotImplementedError(f"{type(self).__name__} does not support streaming analysis")
+
+    def _context(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext]) -> AnalysisContext:
+        """Use the shared context if given, otherwise create one for this call"""
+        return context if context is not None else self.create_context(y, sr)
+
+    def _mark_failed(self, context: Optional[AnalysisContext], feature_name: str) -> None:
+        """Flag a feature whose extractor fell back to its default value on the shared context"""
+        if context is not None:
+            context.failed.add(feature_name)
     
     @abstractmethod
-    def extract_tempo(self, y: np.ndarray, sr: int) -> float:
+    def extract_tempo(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract tempo feature"""
         pass
     
     @abstractmethod
-    def extract_energy(self, y: np.ndarray, sr: int) -> float:
+    def extract_energy(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract energy feature"""
         pass
     
     @abstractmethod
-    def extract_loudness(self, y: np.ndarray, sr: int) -> float:
+    def extract_loudness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract loudness feature"""
         pass
     
     @abstractmethod
-    def extract_key(self, y: np.ndarray, sr: int) -> int:
+    def extract_key(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> int:
         """Extract key feature"""
         pass
     
     @abstractmethod
-    def extract_mode(self, y: np.ndarray, sr: int) -> int:
+    def extract_mode(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> int:
         """Extract mode feature"""
         pass
     
     @abstractmethod
-    def extract_time_signature(self, y: np.ndarray, sr: int) -> int:
+    def extract_time_signature(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> int:
         """Extract time signature feature"""
         pass
     
     @abstractmethod
-    def extract_acousticness(self, y: np.ndarray, sr: int) -> float:
+    def extract_acousticness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract acousticness feature"""
         pass
     
     @abstractmethod
-    def extract_instrumentalness(self, y: np.ndarray, sr: int) -> float:
+    def extract_instrumentalness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract instrumentalness feature"""
         pass
     
     @abstractmethod
-    def extract_speechiness(self, y: np.ndarray, sr: int) -> float:
+    def extract_speechiness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract speechiness feature"""
         pass
     
     @abstractmethod
-    def extract_danceability(self, y: np.ndarray, sr: int, tempo: float) -> float:
+    def extract_danceability(self, y: np.ndarray, sr: int, tempo: float, context: Optional[AnalysisContext] = None) -> float:
         """Extract danceability feature"""
         pass
     
     @abstractmethod
-    def extract_valence(self, y: np.ndarray, sr: int) -> float:
+    def extract_valence(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract valence feature"""
         pass
     
     @abstractmethod
-    def extract_liveness(self, y: np.ndarray, sr: int) -> float:
+    def extract_liveness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract liveness feature"""
         pass
 
 class LibrosaBackend(AudioBackend):
     """Librosa implementation of audio analysis"""
-    
-    def extract_tempo(self, y: np.ndarray, sr: int) -> float:
+
+    label = 'Librosa'
+
+    def intermediates(self) -> Dict[str, Intermediate]:
+        """Spectral representations computed once per track and shared by extractors"""
+        return {
+            'stft_complex': Intermediate(lambda ctx: librosa.stft(ctx.y)),
+            'stft': Intermediate(lambda ctx: np.abs(ctx['stft_complex']), requires=('stft_complex',)),
+            'hpss': Intermediate(lambda ctx: librosa.decompose.hpss(ctx['stft_complex']), requires=('stft_complex',)),
+            'harmonic': Intermediate(
+                lambda ctx: librosa.istft(ctx['hpss'][0], dtype=ctx.y.dtype, length=len(ctx.y)),
+                requires=('hpss',)
+            ),
+            'tonnetz': Intermediate(
+                lambda ctx: librosa.feature.tonnetz(y=ctx['harmonic'], sr=ctx.sr),
+                requires=('harmonic',)
+            ),
+            'mel': Intermediate(
+                lambda ctx: librosa.feature.melspectrogram(S=ctx['stft'] ** 2, sr=ctx.sr),
+                requires=('stft',)
+            ),
+            'mel_db': Intermediate(lambda ctx: librosa.power_to_db(ctx['mel']), requires=('mel',)),
+            'onset_env': Intermediate(
+                lambda ctx: librosa.onset.onset_strength(S=ctx['mel_db'], sr=ctx.sr),
+                requires=('mel_db',)
+            ),
+            'beat_track': Intermediate(
+                lambda ctx: librosa.beat.beat_track(onset_envelope=ctx['onset_env'], sr=ctx.sr),
+                requires=('onset_env',)
+            ),
+            'plp': Intermediate(
+                lambda ctx: librosa.beat.plp(onset_envelope=ctx['onset_env'], sr=ctx.sr),
+                requires=('onset_env',)
+            ),
+            'mfcc': Intermediate(lambda ctx: librosa.feature.mfcc(S=ctx['mel_db'], sr=ctx.sr), requires=('mel_db',)),
+            'rms': Intermediate(lambda ctx: librosa.feature.rms(y=ctx.y)[0]),
+            'zcr': Intermediate(lambda ctx: librosa.feature.zero_crossing_rate(ctx.y)[0]),
+            'chroma_stft': Intermediate(
+                lambda ctx: librosa.feature.chroma_stft(S=ctx['stft'] ** 2, sr=ctx.sr),
+                requires=('stft',)
+            ),
+            'chroma_cqt': Intermediate(lambda ctx: librosa.feature.chroma_cqt(y=ctx.y, sr=ctx.sr)),
+            'spectral_centroid': Intermediate(
+                lambda ctx: librosa.feature.spectral_centroid(S=ctx['stft'], sr=ctx.sr)[0],
+                requires=('stft',)
+            ),
+            'spectral_bandwidth': Intermediate(
+                lambda ctx: librosa.feature.spectral_bandwidth(S=ctx['stft'], sr=ctx.sr)[0],
+                requires=('stft',)
+            ),
+            'spectral_contrast': Intermediate(
+                lambda ctx: librosa.feature.spectral_contrast(S=ctx['stft'], sr=ctx.sr)[0],
+                requires=('stft',)
+            ),
+            'chord_profile': Intermediate(lambda ctx: self._chord_profile(ctx['chroma_cqt']), requires=('chroma_cqt',)),
+            'bass_ratio': Intermediate(lambda ctx: self._bass_ratio(ctx['stft'], ctx.sr), requires=('stft',)),
+        }
+
+    def feature_requirements(self) -> Dict[str, Tuple[str, ...]]:
+        """Intermediates read by each extractor"""
+        return {
+            'tempo': ('beat_track',),
+            'energy': ('rms', 'spectral_contrast', 'onset_env'),
+            'loudness': ('rms',),
+            'key': ('chroma_stft',),
+            'mode': ('tonnetz',),
+            'time_signature': ('beat_track',),
+            'acousticness': ('spectral_bandwidth',),
+            'instrumentalness': ('zcr',),
+            'speechiness': ('mfcc', 'zcr'),
+            'danceability': ('beat_track', 'plp', 'bass_ratio'),
+            'valence': ('chord_profile', 'spectral_centroid', 'spectral_bandwidth'),
+            'liveness': ('chord_profile', 'spectral_centroid', 'spectral_bandwidth'),
+        }
+
+    def feature_sample_rates(self) -> Dict[str, int]:
+        """Minimum sample rate per extractor
+
+        Rhythm, loudness and pitch-class features only look at content well
+        below 5 kHz. Spectral shape and zero-crossing features are normalized
+        by the sample rate, so they keep librosa's default rate.
+        """
+        return {
+            'tempo': 11025,
+            'energy': 11025,
+            'loudness': 11025,
+            'key': 11025,
+            'mode': 11025,
+            'time_signature': 11025,
+            'danceability': 11025,
+            'acousticness': 22050,
+            'instrumentalness': 22050,
+            'speechiness': 22050,
+            'valence': 22050,
+            'liveness': 22050,
+        }
+
+    def _chord_profile(self, chroma: np.ndarray) -> float:
+        """Mean correlation of the chromagram with the major minus the minor chord profile"""
+        major_profile = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1])
+        minor_profile = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0])
+
+        # Correlating a 12-bin frame with a 12-bin profile is a dot product
+        chroma_norm = librosa.util.normalize(chroma, axis=0)
+        major_corr = np.mean(chroma_norm.T @ major_profile)
+        minor_corr = np.mean(chroma_norm.T @ minor_profile)
+        return major_corr - minor_corr
+
+    def _bass_ratio(self, spec: np.ndarray, sr: int) -> float:
+        """Ratio of mean magnitude below 250 Hz to the overall mean magnitude"""
+        freqs = librosa.fft_frequencies(sr=sr)
+        bass_mask = freqs <= 250  # Consider frequencies up to 250 Hz as bass
+        return np.mean(spec[bass_mask]) / np.mean(spec)
+
+    def create_streaming_context(self, blocks: Iterable[np.ndarray], sr: int) -> AnalysisContext:
+        """Create a context from streamed mono blocks, keeping only per-frame summaries
+
+        Blocks are framed exactly like a centered 2048/512 STFT, so frame-level
+        summaries line up with the in-memory path. Representations that need
+        the whole signal are approximated from the chroma summary: the chord
+        profile uses chroma_stft instead of chroma_cqt and the tonnetz skips the
+        harmonic/percussive split, so valence and liveness, which read them, may
+        differ from the in-memory values by up to 0.25.
+        """
+        n_fft, hop_length = 2048, 512
+        mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        bass_mask = librosa.fft_frequencies(sr=sr, n_fft=n_fft) <= 250
+        summaries = {
+            name: [] for name in (
+                'mel', 'rms', 'zcr', 'chroma_stft',
+                'spectral_centroid', 'spectral_bandwidth', 'spectral_contrast'
+            )
+        }
+        bass_sum = spectrum_sum = 0.0
+        bass_bins = spectrum_bins = 0
+        num_samples = 0
+
+        # Zero padding at both ends mirrors librosa's centered framing
+        padding = np.zeros(n_fft // 2, dtype=np.float32)
+        buffer = padding
+        for block in itertools.chain(blocks, [None]):
+            if block is None:
+                block = padding
+            else:
+                num_samples += len(block)
+            buffer = np.concatenate((buffer, np.asarray(block, dtype=np.float32)))
+            if len(buffer) < n_fft:
+                continue
+
+            num_frames = 1 + (len(buffer) - n_fft) // hop_length
+            region = buffer[:(num_frames - 1) * hop_length + n_fft]
+            S = np.abs(librosa.stft(region, n_fft=n_fft, hop_length=hop_length, center=False))
+            power = S ** 2
+
+            summaries['mel'].append(mel_basis @ power)
+            summaries['rms'].append(librosa.feature.rms(y=region, center=False)[0])
+            summaries['zcr'].append(librosa.feature.zero_crossing_rate(region, center=False)[0])
+            summaries['chroma_stft'].append(librosa.feature.chroma_stft(S=power, sr=sr, tuning=0.0))
+            summaries['spectral_centroid'].append(librosa.feature.spectral_centroid(S=S, sr=sr)[0])
+            summaries['spectral_bandwidth'].append(librosa.feature.spectral_bandwidth(S=S, sr=sr)[0])
+            summaries['spectral_contrast'].append(librosa.feature.spectral_contrast(S=S, sr=sr)[0])
+
+            bass_sum += float(S[bass_mask].sum())
+            bass_bins += S[bass_mask].size
+            spectrum_sum += float(S.sum())
+            spectrum_bins += S.size
+
+            # Keep only the samples that still belong to upcoming frames
+            buffer = buffer[num_frames * hop_length:]
+
+        context = AnalysisContext(None, sr, self.intermediates(), num_samples=num_samples)
+        for name, frames in summaries.items():
+            context.seed(name, np.concatenate(frames, axis=-1))
+
+        chroma = context['chroma_stft']
+        context.seed('chord_profile', self._chord_profile(chroma))
+        context.seed('tonnetz', librosa.feature.tonnetz(sr=sr, chroma=chroma))
+        context.seed('bass_ratio', (bass_sum / bass_bins) / (spectrum_sum / spectrum_bins))
+        return context
+
+    def extract_tempo(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         try:
             self._update_progress('tempo')
-            tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-            return float(tempo)
+            ctx = self._context(y, sr, context)
+            # Shares the track's single beat tracking pass with time signature and danceability
+            tempo, _ = ctx['beat_track']
+            return float(np.atleast_1d(tempo)[0])
         except Exception as e:
-            print("Error extracting tempo (Librosa):")
+            print(f"Error extracting tempo ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'tempo')
             return 120.0
 
-    def extract_energy(self, y: np.ndarray, sr: int) -> float:
+    def extract_energy(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         try:
             self._update_progress('energy')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-                
+            ctx = self._context(y, sr, context)
+
             # Calculate multiple energy features
-            rms = librosa.feature.rms(y=y)[0]
-            spectral = librosa.feature.spectral_contrast(y=y, sr=sr)[0]
-            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-            
+            rms = ctx['rms']
+            spectral = ctx['spectral_contrast']
+            onset_env = ctx['onset_env']
+
             # Combine different energy indicators
             energy_score = (
                 0.4 * np.mean(rms) / np.max(rms) +  # RMS energy
                 0.3 * np.mean(spectral) / np.max(spectral) +  # Spectral contrast
                 0.3 * np.mean(onset_env) / np.max(onset_env)  # Onset strength
             )
-            
+
             # Apply non-linear scaling to better differentiate high-energy tracks
             energy = np.power(energy_score, 0.5)  # Square root to boost high values
-            
+
             return float(np.clip(energy, 0.0, 1.0))
         except Exception as e:
-            print("Error extracting energy (Librosa):")
+            print(f"Error extracting energy ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'energy')
             return 0.5
 
-    def extract_loudness(self, y: np.ndarray, sr: int) -> float:
+    def extract_loudness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         try:
             self._update_progress('loudness')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-            rms = librosa.feature.rms(y=y)
-            if isinstance(rms, tuple):
-                rms = rms[0]
-            rms = np.array(rms, dtype=np.float32)
+            ctx = self._context(y, sr, context)
+            rms = np.array(ctx['rms'], dtype=np.float32)
             mean_rms = np.array([np.mean(rms)], dtype=np.float32)
             return float(librosa.amplitude_to_db(mean_rms)[0])
         except Exception as e:
-            print("Error extracting loudness (Librosa):")
+            print(f"Error extracting loudness ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'loudness')
             return -20.0
 
-    def extract_key(self, y: np.ndarray, sr: int) -> int:
+    def extract_key(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> int:
         try:
             self._update_progress('key')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-            chromagram = librosa.feature.chroma_stft(y=y, sr=sr)
-            if isinstance(chromagram, tuple):
-                chromagram = chromagram[0]
-            chromagram = np.array(chromagram, dtype=np.float32)
+            ctx = self._context(y, sr, context)
+            chromagram = np.array(ctx['chroma_stft'], dtype=np.float32)
             return int(np.argmax(np.mean(chromagram, axis=1)))
         except Exception as e:
-            print("Error extracting key (Librosa):")
+            print(f"Error extracting key ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'key')
             return 0
 
-    def extract_mode(self, y: np.ndarray, sr: int) -> int:
+    def extract_mode(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> int:
         try:
             self._update_progress('mode')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-            y_harmonic = librosa.effects.harmonic(y)
-            if y_harmonic is not None:
-                mode_feature = librosa.feature.tonnetz(y=y_harmonic, sr=sr)
-                if isinstance(mode_feature, tuple):
-                    mode_feature = mode_feature[0]
-                mode_feature = np.array(mode_feature, dtype=np.float32)
-                return int(np.mean(mode_feature[0]) > np.mean(mode_feature[1]))
+            ctx = self._context(y, sr, context)
+            # Tonnetz of the harmonic component from the shared HPSS pass
+            mode_feature = np.array(ctx['tonnetz'], dtype=np.float32)
+            return int(np.mean(mode_feature[0]) > np.mean(mode_feature[1]))
         except Exception as e:
-            print("Error extracting mode (Librosa):")
+            print(f"Error extracting mode ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'mode')
         return 1
 
-    def extract_time_signature(self, y: np.ndarray, sr: int) -> int:
+    def extract_time_signature(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> int:
         try:
             self._update_progress('time_signature')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-            _, beats = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
+            ctx = self._context(y, sr, context)
+            _, beats = ctx['beat_track']
             if len(beats) > 0:
                 return int(round(np.mean(np.diff(beats)) / 2) * 2)
         except Exception as e:
-            print("Error extracting time signature (Librosa):")
+            print(f"Error extracting time signature ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'time_signature')
         return 4
 
-    def extract_acousticness(self, y: np.ndarray, sr: int) -> float:
+    def extract_acousticness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         try:
             self._update_progress('acousticness')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-            spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)
-            if isinstance(spectral_bandwidth, tuple):
-                spectral_bandwidth = spectral_bandwidth[0]
-            spectral_bandwidth = np.array(spectral_bandwidth, dtype=np.float32)
+            ctx = self._context(y, sr, context)
+            spectral_bandwidth = np.array(ctx['spectral_bandwidth'], dtype=np.float32)
             return float(1.0 - min(1.0, np.mean(spectral_bandwidth) / (sr/4)))
         except Exception as e:
-            print("Error extracting acousticness (Librosa):")
+            print(f"Error extracting acousticness ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'acousticness')
             return 0.5
 
-    def extract_instrumentalness(self, y: np.ndarray, sr: int) -> float:
+    def extract_instrumentalness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         try:
             self._update_progress('instrumentalness')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-            zcr = librosa.feature.zero_crossing_rate(y)
-            if isinstance(zcr, tuple):
-                zcr = zcr[0]
-            zcr = np.array(zcr, dtype=np.float32)
+            ctx = self._context(y, sr, context)
+            zcr = np.array(ctx['zcr'], dtype=np.float32)
             return float(min(1.0, np.mean(zcr) * 10))
         except Exception as e:
-            print("Error extracting instrumentalness (Librosa):")
+            print(f"Error extracting instrumentalness ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'instrumentalness')
             return 0.5
 
-    def extract_speechiness(self, y: np.ndarray, sr: int) -> float:
+    def extract_speechiness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         try:
             self._update_progress('speechiness')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
+            ctx = self._context(y, sr, context)
             # Use multiple features to detect speech
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            zcr = librosa.feature.zero_crossing_rate(y)[0]
-            
+            mfccs = ctx['mfcc'][:13]
+            zcr = ctx['zcr']
+
             # Speech typically has higher MFCC variance and ZCR
             mfcc_var = np.std(mfccs, axis=1)
             zcr_mean = np.mean(zcr)
-            
+
             # Combine features with weights
             speech_score = (
                 0.6 * np.mean(mfcc_var) / 100 +  # Normalized MFCC variance
                 0.4 * zcr_mean * 10  # Normalized ZCR
             )
-            
+
             # Apply sigmoid-like normalization
             return float(np.clip(speech_score, 0.0, 1.0))
         except Exception as e:
-            print("Error extracting speechiness (Librosa):")
+            print(f"Error extracting speechiness ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'speechiness')
             return 0.1
 
-    def extract_danceability(self, y: np.ndarray, sr: int, tempo: float) -> float:
+    def extract_danceability(self, y: np.ndarray, sr: int, tempo: float, context: Optional[AnalysisContext] = None) -> float:
         try:
             self._update_progress('danceability')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-                
-            # Get onset envelope and tempo-related features
-            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+            ctx = self._context(y, sr, context)
+
+            # Get tempo-related features
             tempo_normalized = max(0, min(1, (tempo - 50) / (180 - 50)))  # Normalize tempo between 50-180 BPM
-            
+
             # Calculate rhythm regularity
-            _, beats = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
+            _, beats = ctx['beat_track']
             if len(beats) > 1:
                 beat_intervals = np.diff(beats)
                 rhythm_regularity = 1.0 - np.std(beat_intervals) / np.mean(beat_intervals)
             else:
                 rhythm_regularity = 0.0
-                
+
             # Calculate pulse clarity using PLP (Perceptual Linear Prediction)
-            pulse = librosa.beat.plp(onset_envelope=onset_env, sr=sr)
+            pulse = ctx['plp']
             pulse_clarity = np.mean(pulse) / np.max(pulse) if len(pulse) > 0 else 0.0
-            
+
             # Get low-frequency energy ratio (bass presence)
-            spec = np.abs(librosa.stft(y))
-            freqs = librosa.fft_frequencies(sr=sr)
-            bass_mask = freqs <= 250  # Consider frequencies up to 250 Hz as bass
-            bass_energy = np.mean(spec[bass_mask]) / np.mean(spec)
-            
+            bass_energy = ctx['bass_ratio']
+
             # Combine features with weights
             danceability = (
                 0.3 * tempo_normalized +          # Tempo contribution
@@ -301,93 +508,314 @@ class LibrosaBackend(AudioBackend):
                 0.2 * pulse_clarity +             # Beat strength
                 0.2 * min(1.0, bass_energy)       # Bass presence
             )
-            
+
             # Apply non-linear scaling to emphasize differences
             danceability = np.power(danceability, 0.7)  # Adjust curve
-            
+
             return float(np.clip(danceability, 0.0, 1.0))
-            
+
         except Exception as e:
-            print("Error extracting danceability (Librosa):")
+            print(f"Error extracting danceability ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'danceability')
             return 0.5
 
-    def extract_valence(self, y: np.ndarray, sr: int) -> float:
+    def extract_valence(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract valence (musical positiveness)"""
         try:
             self._update_progress('valence')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-                
-            # Get chromagram
-            chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-            
-            # Calculate spectral statistics
-            spec_cent = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-            spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
-            
-            # Major/minor chord detection
-            major_profile = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1])
-            minor_profile = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0])
-            
-            # Calculate correlation with major/minor profiles
-            chroma_norm = librosa.util.normalize(chroma, axis=0)
-            major_corr = np.mean([np.correlate(chr_frame, major_profile) for chr_frame in chroma_norm.T])
-            minor_corr = np.mean([np.correlate(chr_frame, minor_profile) for chr_frame in chroma_norm.T])
-            
+            ctx = self._context(y, sr, context)
+
             # Combine features
             valence_score = (
-                0.5 * (major_corr - minor_corr) +  # Chord profile contribution
-                0.3 * (np.mean(spec_cent) / (sr/2)) +  # Spectral centroid contribution
-                0.2 * (1 - np.mean(spec_bw) / (sr/2))  # Spectral bandwidth contribution
+                0.5 * ctx['chord_profile'] +  # Chord profile contribution
+                0.3 * (np.mean(ctx['spectral_centroid']) / (sr/2)) +  # Spectral centroid contribution
+                0.2 * (1 - np.mean(ctx['spectral_bandwidth']) / (sr/2))  # Spectral bandwidth contribution
             )
-            
+
             # Normalize to 0-1 range
             valence = (valence_score + 1) / 2
             return float(np.clip(valence, 0.0, 1.0))
         except Exception as e:
-            print("Error extracting valence (Librosa):")
+            print(f"Error extracting valence ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'valence')
             return 0.5
 
-    def extract_liveness(self, y: np.ndarray, sr: int) -> float:
+    def extract_liveness(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None) -> float:
         """Extract liveness feature"""
         try:
             self._update_progress('liveness')
-            if len(y.shape) > 1:
-                y = librosa.to_mono(y)
-                
-            # Get chromagram
-            chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-            
-            # Calculate spectral statistics
-            spec_cent = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-            spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
-            
-            # Major/minor chord detection
-            major_profile = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1])
-            minor_profile = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0])
-            
-            # Calculate correlation with major/minor profiles
-            chroma_norm = librosa.util.normalize(chroma, axis=0)
-            major_corr = np.mean([np.correlate(chr_frame, major_profile) for chr_frame in chroma_norm.T])
-            minor_corr = np.mean([np.correlate(chr_frame, minor_profile) for chr_frame in chroma_norm.T])
-            
+            ctx = self._context(y, sr, context)
+
             # Combine features
             liveness_score = (
-                0.5 * (major_corr - minor_corr) +  # Chord profile contribution
-                0.3 * (np.mean(spec_cent) / (sr/2)) +  # Spectral centroid contribution
-                0.2 * (1 - np.mean(spec_bw) / (sr/2))  # Spectral bandwidth contribution
+                0.5 * ctx['chord_profile'] +  # Chord profile contribution
+                0.3 * (np.mean(ctx['spectral_centroid']) / (sr/2)) +  # Spectral centroid contribution
+                0.2 * (1 - np.mean(ctx['spectral_bandwidth']) / (sr/2))  # Spectral bandwidth contribution
             )
-            
+
             # Normalize to 0-1 range
             liveness = (liveness_score + 1) / 2
             return float(np.clip(liveness, 0.0, 1.0))
         except Exception as e:
-            print("Error extracting liveness (Librosa):")
+            print(f"Error extracting liveness ({self.label}):")
             traceback.print_exc()
+            self._mark_failed(context, 'liveness')
             return 0.5
 
+class NumpyBackend(LibrosaBackend):
+    """Fast NumPy/SciPy implementation of audio analysis
+
+    Computes the same intermediates as the librosa backend (same names, frame
+    grid and shapes) from strided frame views, a real FFT and precomputed
+    filterbanks, in float32 throughout. Tempo comes from the autocorrelation
+    of the onset envelope rather than dynamic-programming beat tracking, the
+    chroma is a plain STFT pitch-class fold (also standing in for the CQT
+    chroma), the tonnetz skips the harmonic/percussive split and spectral
+    contrast is the raw peak-to-valley ratio of the lowest band without
+    librosa's quantile averaging.
+
+    Features are therefore approximate: several times cheaper than librosa's,
+    but not numerically interchangeable with them. On the test suite's
+    synthetic tracks loudness stays within 0.5 dB and tempo within 2% of
+    librosa's, the unit-range features within 0.05, and valence and liveness
+    (which lean on the contrast and tonnetz approximations) within 0.2; key
+    and mode may differ. The feature cache keys entries by backend, so the
+    two never mix.
+    """
+
+    label = 'NumPy'
+    n_fft = 2048
+    hop_length = 512
+
+    def intermediates(self) -> Dict[str, Intermediate]:
+        """Spectral representations computed once per track and shared by extractors"""
+        return {
+            'stft_complex': Intermediate(self._stft),
+            'stft': Intermediate(lambda ctx: np.abs(ctx['stft_complex']), requires=('stft_complex',)),
+            'power': Intermediate(lambda ctx: np.square(ctx['stft']), requires=('stft',)),
+            'mel': Intermediate(
+                lambda ctx: _mel_filterbank(ctx.sr, self.n_fft) @ ctx['power'],
+                requires=('power',)
+            ),
+            'mel_db': Intermediate(lambda ctx: self._power_to_db(ctx['mel']), requires=('mel',)),
+            'onset_env': Intermediate(self._onset_envelope, requires=('mel_db',)),
+            'beat_track': Intermediate(self._beat_track, requires=('onset_env',)),
+            'plp': Intermediate(self._plp, requires=('onset_env', 'beat_track')),
+            'mfcc': Intermediate(
+                lambda ctx: scipy.fft.dct(ctx['mel_db'], type=2, norm='ortho', axis=0)[:20],
+                requires=('mel_db',)
+            ),
+            'rms': Intermediate(self._rms),
+            'zcr': Intermediate(self._zcr),
+            'chroma_stft': Intermediate(self._chroma, requires=('power',)),
+            'chroma_cqt': Intermediate(lambda ctx: ctx['chroma_stft'], requires=('chroma_stft',)),
+            'tonnetz': Intermediate(lambda ctx: self._tonnetz(ctx['chroma_stft']), requires=('chroma_stft',)),
+            'spectral_moments': Intermediate(self._spectral_moments, requires=('stft',)),
+            'spectral_centroid': Intermediate(lambda ctx: ctx['spectral_moments'][0], requires=('spectral_moments',)),
+            'spectral_bandwidth': Intermediate(lambda ctx: ctx['spectral_moments'][1], requires=('spectral_moments',)),
+            'spectral_contrast': Intermediate(self._spectral_contrast, requires=('stft',)),
+            'chord_profile': Intermediate(lambda ctx: self._chord_profile(ctx['chroma_cqt']), requires=('chroma_cqt',)),
+            'bass_ratio': Intermediate(lambda ctx: self._bass_ratio(ctx['stft'], ctx.sr), requires=('stft',)),
+        }
+
+    def _num_frames(self, ctx: AnalysisContext) -> int:
+        """Number of centered frames, matching librosa's framing"""
+        return 1 + ctx.num_samples // self.hop_length
+
+    def _frames(self, ctx: AnalysisContext) -> np.ndarray:
+        """Strided (frames x n_fft) view over the zero-padded signal"""
+        padding = self.n_fft // 2
+        padded = np.zeros(ctx.num_samples + 2 * padding, dtype=np.float32)
+        padded[padding:padding + ctx.num_samples] = ctx.y
+        return np.lib.stride_tricks.sliding_window_view(padded, self.n_fft)[::self.hop_length]
+
+    def _stft(self, ctx: AnalysisContext, chunk: int = 1024) -> np.ndarray:
+        """Complex STFT (bins x frames) of the Hann-windowed frames
+
+        Frames are windowed and transformed in chunks so the only full-size
+        allocation is the output itself.
+        """
+        frames = self._frames(ctx)
+        window = _hann_window(self.n_fft)
+        spectrum = np.empty((self.n_fft // 2 + 1, len(frames)), dtype=np.complex64)
+        for start in range(0, len(frames), chunk):
+            block = frames[start:start + chunk] * window
+            spectrum[:, start:start + chunk] = scipy.fft.rfft(block, axis=1, workers=-1).T
+        return spectrum
+
+    def _power_to_db(self, S: np.ndarray, top_db: float = 80.0) -> np.ndarray:
+        """Power to decibels, clipped to top_db below the peak"""
+        S_db = 10.0 * np.log10(np.maximum(S, np.float32(1e-10)))
+        return np.maximum(S_db, S_db.max() - top_db, out=S_db)
+
+    def _onset_envelope(self, ctx: AnalysisContext) -> np.ndarray:
+        """Mean positive spectral flux of the log-mel spectrogram"""
+        mel_db = ctx['mel_db']
+        flux = np.maximum(0.0, mel_db[:, 1:] - mel_db[:, :-1]).mean(axis=0)
+        # Shift by the lag plus half a frame to line onsets up with the centered frames
+        shift = 1 + self.n_fft // (2 * self.hop_length)
+        onset_env = np.zeros(mel_db.shape[1], dtype=np.float32)
+        onset_env[shift:] = flux[:mel_db.shape[1] - shift]
+        return onset_env
+
+    def _beat_track(self, ctx: AnalysisContext) -> Tuple[np.ndarray, np.ndarray]:
+        """Autocorrelation tempo and a beat grid aligned to the strongest onset phase"""
+        onset_env = ctx['onset_env']
+        frame_rate = ctx.sr / self.hop_length
+        if len(onset_env) < 2 or not np.any(onset_env):
+            return np.array([0.0]), np.array([], dtype=int)
+
+        # Autocorrelation through the power spectrum of the zero-padded envelope
+        size = scipy.fft.next_fast_len(2 * len(onset_env))
+        autocorr = scipy.fft.irfft(np.abs(scipy.fft.rfft(onset_env, size)) ** 2, size)[:len(onset_env)]
+
+        # Weight candidate lags with a log-normal prior around 120 BPM, as librosa does
+        lags = np.arange(1, len(autocorr))
+        bpms = 60.0 * frame_rate / lags
+        valid = (bpms >= 30.0) & (bpms <= 300.0)
+        if not np.any(valid):
+            return np.array([0.0]), np.array([], dtype=int)
+        prior = np.exp(-0.5 * np.log2(bpms[valid] / 120.0) ** 2)
+        period = int(lags[valid][np.argmax(autocorr[1:][valid] * prior)])
+        tempo = 60.0 * frame_rate / period
+
+        # Pick the phase whose beat grid collects the most onset strength
+        num_beats = len(onset_env) // period
+        grid = onset_env[:num_beats * period].reshape(num_beats, period)
+        phase = int(np.argmax(grid.sum(axis=0)))
+        beats = np.arange(phase, len(onset_env), period)
+        return np.array([tempo]), beats
+
+    def _plp(self, ctx: AnalysisContext) -> np.ndarray:
+        """Pulse curve: the onset envelope band-passed around the detected tempo"""
+        onset_env = ctx['onset_env']
+        tempo = float(np.atleast_1d(ctx['beat_track'][0])[0])
+        if tempo <= 0:
+            return np.zeros_like(onset_env)
+
+        frame_rate = ctx.sr / self.hop_length
+        spectrum = scipy.fft.rfft(onset_env)
+        frequencies = scipy.fft.rfftfreq(len(onset_env), d=1.0 / frame_rate) * 60.0
+        spectrum[(frequencies < 0.8 * tempo) | (frequencies > 1.2 * tempo)] = 0
+        pulse = np.maximum(scipy.fft.irfft(spectrum, len(onset_env)), 0.0).astype(np.float32)
+        peak = pulse.max()
+        return pulse / peak if peak > 0 else pulse
+
+    def _frame_sums(self, ctx: AnalysisContext, values: np.ndarray) -> np.ndarray:
+        """Sum of a per-sample quantity over each centered frame, via a cumulative sum"""
+        padding = self.n_fft // 2
+        cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+        starts = np.arange(self._num_frames(ctx)) * self.hop_length - padding
+        ends = np.clip(starts + self.n_fft, 0, len(values))
+        starts = np.clip(starts, 0, len(values))
+        return cumulative[ends] - cumulative[starts]
+
+    def _rms(self, ctx: AnalysisContext) -> np.ndarray:
+        """Frame root-mean-square energy"""
+        energy = self._frame_sums(ctx, np.square(ctx.y, dtype=np.float32))
+        return np.sqrt(energy / self.n_fft).astype(np.float32)
+
+    def _zcr(self, ctx: AnalysisContext) -> np.ndarray:
+        """Fraction of sign changes per frame"""
+        signs = np.signbit(ctx.y)
+        crossings = np.empty(len(signs), dtype=np.float32)
+        crossings[0] = 0
+        np.not_equal(signs[1:], signs[:-1], out=crossings[1:])
+        return (self._frame_sums(ctx, crossings) / self.n_fft).astype(np.float32)
+
+    def _chroma(self, ctx: AnalysisContext) -> np.ndarray:
+        """Pitch-class energy per frame, peak-normalized"""
+        chroma = _chroma_filterbank(ctx.sr, self.n_fft) @ ctx['power']
+        peak = chroma.max(axis=0, keepdims=True)
+        return chroma / np.where(peak > 0, peak, 1)
+
+    def _tonnetz(self, chroma: np.ndarray) -> np.ndarray:
+        """Tonal centroid projection of the L1-normalized chroma"""
+        pitch_classes = np.arange(12, dtype=np.float32)
+        scale = np.array([7.0 / 6, 7.0 / 6, 3.0 / 2, 3.0 / 2, 2.0 / 3, 2.0 / 3], dtype=np.float32)
+        angles = np.multiply.outer(scale, pitch_classes)
+        angles[::2] -= 0.5
+        radii = np.array([1, 1, 1, 1, 0.5, 0.5], dtype=np.float32)
+        phi = radii[:, np.newaxis] * np.cos(np.pi * angles)
+        total = chroma.sum(axis=0, keepdims=True)
+        return phi @ (chroma / np.where(total > 0, total, 1))
+
+    def _spectral_moments(self, ctx: AnalysisContext) -> Tuple[np.ndarray, np.ndarray]:
+        """Spectral centroid and bandwidth from the first three moments of each frame"""
+        S = ctx['stft']
+        frequencies = np.fft.rfftfreq(self.n_fft, d=1.0 / ctx.sr).astype(np.float32)
+        total = S.sum(axis=0)
+        total[total == 0] = 1
+        centroid = (frequencies @ S) / total
+        variance = (np.square(frequencies) @ S) / total - np.square(centroid)
+        return centroid, np.sqrt(np.maximum(variance, 0.0))
+
+    def _spectral_contrast(self, ctx: AnalysisContext) -> np.ndarray:
+        """Peak-to-valley contrast in decibels of the lowest (0-200 Hz) band"""
+        S = ctx['stft']
+        frequencies = np.fft.rfftfreq(self.n_fft, d=1.0 / ctx.sr)
+        band = S[frequencies <= 200.0]
+        return (
+            10.0 * np.log10(np.maximum(band.max(axis=0), 1e-10))
+            - 10.0 * np.log10(np.maximum(band.min(axis=0), 1e-10))
+        ).astype(np.float32)
+
+    def _chord_profile(self, chroma: np.ndarray) -> float:
+        """Mean correlation of the chromagram with the major minus the minor chord profile"""
+        major_profile = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1], dtype=np.float32)
+        minor_profile = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0], dtype=np.float32)
+        return float(np.mean((major_profile - minor_profile) @ chroma))
+
+    def _bass_ratio(self, spec: np.ndarray, sr: int) -> float:
+        """Ratio of mean magnitude below 250 Hz to the overall mean magnitude"""
+        bass_mask = np.fft.rfftfreq(self.n_fft, d=1.0 / sr) <= 250
+        return float(np.mean(spec[bass_mask]) / np.mean(spec))
+
+
+@functools.lru_cache(maxsize=8)
+def _hann_window(n_fft: int) -> np.ndarray:
+    """Periodic Hann window"""
+    return scipy.signal.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=8)
+def _mel_filterbank(sr: int, n_fft: int, n_mels: int = 128) -> np.ndarray:
+    """Slaney-style triangular mel filterbank (n_mels x bins), area-normalized"""
+    def hz_to_mel(hz):
+        hz = np.asarray(hz, dtype=np.float64)
+        linear = hz / (200.0 / 3)
+        log = 15.0 + np.log(np.maximum(hz, 1e-10) / 1000.0) / (np.log(6.4) / 27.0)
+        return np.where(hz >= 1000.0, log, linear)
+
+    def mel_to_hz(mel):
+        mel = np.asarray(mel, dtype=np.float64)
+        linear = mel * (200.0 / 3)
+        log = 1000.0 * np.exp((np.log(6.4) / 27.0) * (mel - 15.0))
+        return np.where(mel >= 15.0, log, linear)
+
+    frequencies = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    edges = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sr / 2.0), n_mels + 2))
+    lower = (frequencies - edges[:-2, np.newaxis]) / np.diff(edges)[:-1, np.newaxis]
+    upper = (edges[2:, np.newaxis] - frequencies) / np.diff(edges)[1:, np.newaxis]
+    weights = np.maximum(0.0, np.minimum(lower, upper))
+    weights *= (2.0 / (edges[2:] - edges[:-2]))[:, np.newaxis]
+    return weights.astype(np.float32)
+
+
+@functools.lru_cache(maxsize=8)
+def _chroma_filterbank(sr: int, n_fft: int, fmin: float = 27.5) -> np.ndarray:
+    """Map each FFT bin above fmin to its nearest pitch class (12 x bins)"""
+    frequencies = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    audible = frequencies >= fmin
+    midi = np.zeros_like(frequencies)
+    midi[audible] = 69.0 + 12.0 * np.log2(frequencies[audible] / 440.0)
+    weights = np.zeros((12, len(frequencies)), dtype=np.float32)
+    weights[np.round(midi[audible]).astype(int) % 12, np.flatnonzero(audible)] = 1.0
+    return weights
+
+
 # class TorchAudioBackend(AudioBackend):
 #     """TorchAudio implementation of audio analysis"""
     
@@ -732,6 +1160,7 @@ def get_backend(backend_name: str = 'librosa') -> AudioBackend:
     """Factory function to get the appropriate backend"""
     backends = {
         'librosa': LibrosaBackend,
+        'fast': NumpyBackend,
         # 'torchaudio': TorchAudioBackend,
 
         #'audioflux': AudioFluxBackend
@@ -0,0 +1,44 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class AnalysisBudget:
+    """Wall-clock compute budget of one analysis and a record of what was cut short
+
+    Stages check the remaining time before they run. When it runs low they
+    compute optional outputs at a coarser resolution, once it is spent they
+    skip them, and either way they note it here. Without a limit every check
+    passes.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        """Start the clock on a budget of the given seconds, or no limit"""
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.degraded: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        """Seconds since the budget was started"""
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        """Seconds left, infinite without a limit"""
+        if not self.seconds:
+            return float('inf')
+        return self.seconds - self.elapsed()
+
+    def exhausted(self) -> bool:
+        """Check whether the budget is spent"""
+        return self.remaining() <= 0
+
+    def low(self, fraction: float = 0.25) -> bool:
+        """Check whether less than the given fraction of the budget is left"""
+        return bool(self.seconds) and self.remaining() < fraction * self.seconds
+
+    def degrade(self, output: str, how: str) -> None:
+        """Record that an output was skipped or computed at reduced quality"""
+        # Graph nodes running on a thread pool may report concurrently
+        with self._lock:
+            self.degraded[output] = how
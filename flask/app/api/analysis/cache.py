@@ -0,0 +1,184 @@
+import os
+import glob
+import json
+import tempfile
+import threading
+import numpy as np
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class DiskCache:
+    """Directory of cache entries with a size cap and LRU eviction
+
+    Reading an entry refreshes its file's modification time, so once the
+    directory grows past max_bytes the least recently used entries are
+    deleted first. Writes are atomic renames, so worker processes can share
+    one directory.
+    """
+
+    suffix = ''
+
+    def __init__(self, directory: str, max_bytes: int):
+        """Initialize with the cache directory and its size cap in bytes"""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Bytes in the directory, counted on first write and re-counted before evicting
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        """File holding an entry, sharded by the first characters of the key"""
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    def _touch(self, path: str) -> None:
+        """Mark an entry as recently used"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write(self, key: str, write: Callable[[str], None]) -> str:
+        """Write an entry through a temporary file, then evict past the size cap"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            write(temp_path)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """Path, size and last use time of every entry"""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(self.suffix):
+                    # Temporary files still being written
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Evicted by another process
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache is well under its cap"""
+        # Re-count, since other processes write to the same directory; evicting
+        # down to a low-water mark keeps every write from triggering a scan
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for path, size, _ in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._size -= size
+
+
+class FeatureCache(DiskCache):
+    """Disk-backed cache of extracted feature values, one small JSON file per feature"""
+
+    suffix = '.json'
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        """Initialize with the cache directory and its size cap in bytes"""
+        super().__init__(directory, max_bytes)
+
+    def key(self, sample_md5: str, backend: str, feature: str, version: int) -> str:
+        """Cache key of a feature extracted by a backend, at an algorithm version, from a decoded signal"""
+        return f"{sample_md5}-{backend}-{feature}-v{version}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value for a key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            return None
+        self._touch(path)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a value, evicting least recently used entries past the size cap"""
+        if hasattr(value, 'item'):
+            # numpy scalars are not JSON serializable
+            value = value.item()
+
+        def write(path: str):
+            with open(path, 'w') as f:
+                json.dump({'value': value}, f)
+
+        try:
+            self._write(key, write)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing feature cache entry {key}: {str(e)}")
+
+
+class PCMCache(DiskCache):
+    """Disk-backed cache of decoded mono float32 signals as memory-mapped .npy files
+
+    Every stage that opens an entry maps the same file, so they share its
+    pages through the OS page cache instead of decoding the audio again.
+    """
+
+    suffix = '.npy'
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        """Initialize with the cache directory and its size cap in bytes"""
+        super().__init__(directory, max_bytes)
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, int]]:
+        """Memory-mapped signal and sample rate stored under a key, or None on a miss"""
+        # The sample rate is part of the file name: <key>-<sr>.npy
+        for path in glob.glob(self._path(f"{key}-*")):
+            try:
+                sr = int(os.path.basename(path)[len(key) + 1:-len(self.suffix)])
+                # Copy-on-write, so a stage modifying its signal never changes the file
+                y = np.load(path, mmap_mode='c')
+            except (OSError, ValueError):
+                continue
+            self._touch(path)
+            return y, sr
+        return None
+
+    def store(self, key: str, y: np.ndarray, sr: int) -> Tuple[np.ndarray, int]:
+        """Write a signal under a key and return it memory-mapped from the cache file
+
+        Returns the signal unchanged if it cannot be written.
+        """
+        def write(path: str):
+            # open_memmap streams the samples to disk without another copy in memory
+            stored = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=y.shape)
+            stored[:] = y
+            stored.flush()
+            del stored
+
+        try:
+            path = self._write(f"{key}-{int(sr)}", write)
+            return np.load(path, mmap_mode='c'), sr
+        except (OSError, ValueError) as e:
+            print(f"Error writing decoded audio cache entry {key}: {str(e)}")
+            return y, sr
@@ -0,0 +1,81 @@
+import threading
+import numpy as np
+import librosa
+from typing import Dict, Any, Callable, Optional, Set, Tuple
+from dataclasses import dataclass
+from .budget import AnalysisBudget
+
+
+@dataclass
+class Intermediate:
+    """Declaration of an intermediate representation and the ones it is derived from"""
+    compute: Callable[['AnalysisContext'], Any]
+    requires: Tuple[str, ...] = ()
+
+
+class AnalysisContext:
+    """Per-track store of intermediate representations shared by feature extractors
+
+    Each intermediate (STFT magnitude, onset envelope, chroma, MFCC, ...) is
+    computed lazily the first time an extractor asks for it and then reused by
+    every other extractor working on the same track. Access is thread-safe, so
+    extractors running concurrently still compute each intermediate only once.
+    """
+
+    def __init__(self, y: Optional[np.ndarray], sr: int, intermediates: Dict[str, Intermediate],
+                 num_samples: Optional[int] = None):
+        """Initialize with mono audio signal and the backend's intermediate definitions
+
+        In streaming mode the full signal is never held in memory: y is None and
+        the frame-level intermediates are seeded from block summaries instead.
+        """
+        if y is not None and len(y.shape) > 1:
+            y = librosa.to_mono(y)
+        self.y = y
+        self.sr = sr
+        self.num_samples = num_samples if num_samples is not None else len(y)
+        self._intermediates = intermediates
+        # Compute budget of the analysis this context belongs to, if any
+        self.budget: Optional[AnalysisBudget] = None
+        # MD5 of the decoded signal, keying cached feature results, if known
+        self.sample_md5: Optional[str] = None
+        # Features whose extractor failed and returned a default value instead
+        self.failed: Set[str] = set()
+        self._cache: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, name: str) -> threading.RLock:
+        """Per-intermediate lock so concurrent readers wait for a single computation"""
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.RLock())
+
+    def get(self, name: str) -> Any:
+        """Get an intermediate, computing it on first access"""
+        if name in self._cache:
+            return self._cache[name]
+        if name not in self._intermediates:
+            raise KeyError(f"Unknown intermediate: {name}")
+        with self._lock(name):
+            if name not in self._cache:
+                self._cache[name] = self._intermediates[name].compute(self)
+            return self._cache[name]
+
+    def __getitem__(self, name: str) -> Any:
+        return self.get(name)
+
+    def seed(self, name: str, value: Any) -> None:
+        """Provide an intermediate computed elsewhere, e.g. from streamed blocks"""
+        self._cache[name] = value
+
+    def has(self, name: str) -> bool:
+        """Check whether an intermediate is currently cached"""
+        return name in self._cache
+
+    def release(self, name: str) -> None:
+        """Drop a cached intermediate to free its memory"""
+        self._cache.pop(name, None)
+
+    def clear(self) -> None:
+        """Drop all cached intermediates"""
+        self._cache.clear()
@@ -16,6 +16,7 @@ class AudioAnalysis(Updateable, CanHaveFileMixin, db.Model):
     artist = db.Column(db.String(255), nullable=True, index=True)
     track_name = db.Column(db.String(255), nullable=False)  # For YouTube download
     duration = db.Column(db.Float, nullable=True)
+    sample_md5 = db.Column(db.String(32), nullable=True, index=True)  # Hash of the decoded audio
     
     # Spotify Information
     spotify_info = db.Column(JSONB, nullable=True)  # Store Spotify track details
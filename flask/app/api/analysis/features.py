@@ -1,25 +1,110 @@
 import numpy as np
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from .backends import AudioBackend
+from .budget import AnalysisBudget
+from .cache import FeatureCache
+from .context import AnalysisContext
+from .graph import FeatureGraph, FeatureNode
 import librosa
 import platform
 import time
 
+# Features extracted by every backend, in graph order
+FEATURE_NAMES = (
+    'tempo', 'energy', 'loudness', 'key', 'mode', 'time_signature', 'acousticness',
+    'instrumentalness', 'speechiness', 'danceability', 'valence', 'liveness'
+)
+
+# Relative (value, cost) of each graph node; under a compute budget the
+# features with the most value per cost are extracted first
+FEATURE_PRIORITIES = {
+    'loudness': (1.0, 1.0),
+    'energy': (1.0, 2.0),
+    'tempo': (1.0, 2.0),
+    'key': (1.0, 2.0),
+    'mode': (1.0, 4.0),
+    'instrumentalness': (0.6, 1.0),
+    'acousticness': (0.6, 1.5),
+    'speechiness': (0.6, 2.0),
+    'time_signature': (0.5, 2.0),
+    'danceability': (0.8, 3.0),
+    'valence': (0.8, 3.0),
+    'liveness': (0.4, 3.0),
+    'voice': (0.5, 4.0),
+    'detailed': (0.4, 6.0),
+}
+
+# Features and intermediates the detailed (Spotify-style) analysis reads
+DETAILED_REQUIREMENTS = (
+    'tempo', 'loudness', 'key', 'mode', 'time_signature',
+    'stft', 'onset_env', 'beat_track', 'plp', 'mfcc', 'rms', 'chroma_cqt', 'tonnetz',
+)
+
 class FeatureExtractor:
     """Component for extracting audio features using configurable backend"""
     
-    def __init__(self, backend: AudioBackend):
-        """Initialize with audio analysis backend"""
+    def __init__(self, backend: AudioBackend, max_workers: int = 1, cache: Optional[FeatureCache] = None):
+        """Initialize with audio analysis backend, optional intra-track thread pool size and result cache"""
         self.backend = backend
+        self.cache = cache
         self.progress_callback = None
+        self.graph = self._build_graph()
+        self.max_workers = max(1, int(max_workers or 1))
+        self.executor = None
+        if self.max_workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix='feature-extractor')
         
     def set_progress_callback(self, callback):
         """Set progress callback function"""
         self.progress_callback = callback
         self.backend.set_progress_callback(callback)
 
-    def extract_features(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
-        """Extract all audio features using the configured backend"""
+    def _build_graph(self) -> FeatureGraph:
+        """Build the feature dependency graph for the configured backend"""
+        backend = self.backend
+        requirements = backend.feature_requirements()
+
+        def node(name: str, extract, depends_on: tuple = ()) -> FeatureNode:
+            return FeatureNode(name, extract, tuple(requirements.get(name, ())) + depends_on,
+                               *FEATURE_PRIORITIES.get(name, (1.0, 1.0)))
+
+        return FeatureGraph([
+            node('tempo', lambda ctx, r: backend.extract_tempo(ctx.y, ctx.sr, ctx)),
+            node('energy', lambda ctx, r: backend.extract_energy(ctx.y, ctx.sr, ctx)),
+            node('loudness', lambda ctx, r: backend.extract_loudness(ctx.y, ctx.sr, ctx)),
+            node('key', lambda ctx, r: backend.extract_key(ctx.y, ctx.sr, ctx)),
+            node('mode', lambda ctx, r: backend.extract_mode(ctx.y, ctx.sr, ctx)),
+            node('time_signature', lambda ctx, r: backend.extract_time_signature(ctx.y, ctx.sr, ctx)),
+            node('acousticness', lambda ctx, r: backend.extract_acousticness(ctx.y, ctx.sr, ctx)),
+            node('instrumentalness', lambda ctx, r: backend.extract_instrumentalness(ctx.y, ctx.sr, ctx)),
+            node('speechiness', lambda ctx, r: backend.extract_speechiness(ctx.y, ctx.sr, ctx)),
+            node('danceability', lambda ctx, r: backend.extract_danceability(ctx.y, ctx.sr, r['tempo'], ctx), ('tempo',)),
+            node('valence', lambda ctx, r: backend.extract_valence(ctx.y, ctx.sr, ctx)),
+            node('liveness', lambda ctx, r: backend.extract_liveness(ctx.y, ctx.sr, ctx)),
+        ], backend.intermediates())
+
+    def required_sample_rate(self, features: Optional[Iterable[str]] = None) -> int:
+        """Lowest sample rate that still satisfies the extractors planned for features (all by default)"""
+        rates = self.backend.feature_sample_rates()
+        return max((rates.get(name, 0) for name in self.graph.plan(features)), default=0)
+
+    def feature_names(self) -> List[str]:
+        """Names of the features the graph can extract"""
+        return list(self.graph.features)
+
+    def extract_features(self, y: np.ndarray, sr: int,
+                         features: Optional[Iterable[str]] = None,
+                         budget: Optional[AnalysisBudget] = None,
+                         sample_md5: Optional[str] = None) -> Dict[str, Any]:
+        """Extract audio features using the configured backend
+
+        With features, only those features and the intermediates they depend
+        on are computed; otherwise every feature is extracted. With a budget,
+        features not started before it runs out are skipped. With the signal's
+        sample_md5 and a cache, cached features are reused, not recomputed.
+        """
         try:
             # Ensure input is numpy array with correct dtype
             y = np.asarray(y, dtype=np.float32)
@@ -32,60 +117,227 @@ class FeatureExtractor:
             print(f"Input audio dtype: {y.dtype}")
             print(f"Sample rate: {sr}")
             
-            # Extract each feature using the configured backend
-            features = {
-                'duration_ms': int(len(y) / sr * 1000),
-                'tempo': self.backend.extract_tempo(y, sr),
-                'energy': self.backend.extract_energy(y, sr),
-                'loudness': self.backend.extract_loudness(y, sr),
-                'key': self.backend.extract_key(y, sr),
-                'mode': self.backend.extract_mode(y, sr),
-                'time_signature': self.backend.extract_time_signature(y, sr),
-                'acousticness': self.backend.extract_acousticness(y, sr),
-                'instrumentalness': self.backend.extract_instrumentalness(y, sr),
-                'speechiness': self.backend.extract_speechiness(y, sr)
-            }
+            return self._extract_from_context(self._create_context(y, sr, budget, sample_md5), features)
             
-            # Validate and normalize features
-            features['time_signature'] = min(12, max(3, features['time_signature']))
-            features['key'] = min(11, max(0, features['key']))
-            features['mode'] = min(1, max(0, features['mode']))
-            
-            # Extract features that depend on other features
-            features['danceability'] = self.backend.extract_danceability(y, sr, features['tempo'])
-            features['valence'] = self.backend.extract_valence(y, sr)
-            
-            # Print extracted features for debugging
-            print("\nExtracted features:")
-            for key, value in features.items():
-                print(f"{key}: {value}")
+        except Exception as e:
+            print(f"Error extracting features: {str(e)}")
+            return {}
+
+    def extract_features_with_voice(self, y: np.ndarray, sr: int, voice_analyzer,
+                                    features: Optional[Iterable[str]] = None,
+                                    budget: Optional[AnalysisBudget] = None,
+                                    sample_md5: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Extract audio features and voice characteristics over the same spectral frames"""
+        technical_features, voice_features, _ = self.extract_analysis(
+            y, sr, voice_analyzer, features, budget, sample_md5
+        )
+        if voice_features is None:
+            # Skipped for lack of time
+            voice_features = voice_analyzer._get_default_features()
+        return technical_features, voice_features
+
+    def extract_analysis(self, y: np.ndarray, sr: int, voice_analyzer=None,
+                         features: Optional[Iterable[str]] = None,
+                         budget: Optional[AnalysisBudget] = None,
+                         sample_md5: Optional[str] = None,
+                         detailed: bool = False) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Extract audio features, voice characteristics and the detailed analysis in one graph run
+
+        Voice analysis and the detailed (Spotify-style) analysis run as extra
+        nodes of the feature graph, so they read the shared STFT, beat track,
+        chroma and so on before those are released. Either result is None
+        when not requested or skipped for lack of time.
+        """
+        try:
+            y = np.asarray(y, dtype=np.float32)
             
-            # Normalize values to proper ranges
-            for key in ['acousticness', 'danceability', 'energy', 'instrumentalness', 
-                       'speechiness', 'valence']:
-                if features[key] is not None:
-                    features[key] = max(0.0, min(0.95, features[key]))  # Cap at 0.95 instead of 1.0
+            if self.progress_callback:
+                self.progress_callback(0, "Starting feature extraction")
             
-            if features['loudness'] is not None:
-                features['loudness'] = max(-60.0, min(0.0, features['loudness']))
+            nodes = list(self.graph.features.values())
+            stages = []
+            if voice_analyzer is not None:
+                nodes.append(FeatureNode(
+                    'voice',
+                    lambda ctx, r: voice_analyzer.analyze(ctx.y, ctx.sr, ctx),
+                    tuple(voice_analyzer.requirements()),
+                    *FEATURE_PRIORITIES['voice']
+                ))
+                stages.append('voice')
+            if detailed:
+                nodes.append(FeatureNode(
+                    'detailed',
+                    lambda ctx, r: self._create_analysis_format(ctx.y, ctx.sr, r, ctx),
+                    DETAILED_REQUIREMENTS,
+                    *FEATURE_PRIORITIES['detailed']
+                ))
+                stages.append('detailed')
+            graph = FeatureGraph(nodes, self.graph.intermediates)
+            
+            targets = self._targets(features)
+            if targets is not None:
+                targets += stages
+            
+            context = self._create_context(y, sr, budget, sample_md5)
+            results = self._run_graph(context, graph, targets)
+            voice_features = results.pop('voice', None)
+            detailed_analysis = results.pop('detailed', None)
+            return self._normalize_features(results, context), voice_features, detailed_analysis
             
-            # Add liveness since it's part of Spotify's format
-            features['liveness'] = self.backend.extract_liveness(y, sr)
-            if features['liveness'] is not None:
-                features['liveness'] = max(0.0, min(0.95, features['liveness']))
+        except Exception as e:
+            print(f"Error extracting features: {str(e)}")
+            return {}, None, None
+
+    def extract_streaming_features(self, blocks: Iterable[np.ndarray], sr: int,
+                                   features: Optional[Iterable[str]] = None,
+                                   budget: Optional[AnalysisBudget] = None) -> Dict[str, Any]:
+        """Extract audio features from streamed mono blocks with bounded memory"""
+        try:
+            if self.progress_callback:
+                self.progress_callback(0, "Starting streaming feature extraction")
             
-            # Add type and empty fields to match Spotify format
-            features['type'] = 'audio_features'
-            features['analysis_url'] = None
-            features['track_href'] = None
-            features['uri'] = None
-            features['id'] = None
+            print(f"\nStreaming analysis at sample rate: {sr}")
             
-            return features
+            context = self.backend.create_streaming_context(blocks, sr)
+            context.budget = budget
+            # Readers that hash their blocks (BlockReader) identify the signal once it has been read
+            context.sample_md5 = getattr(blocks, 'sample_md5', None)
+            return self._extract_from_context(context, features)
             
         except Exception as e:
-            print(f"Error extracting features: {str(e)}")
+            print(f"Error extracting streaming features: {str(e)}")
+            return {}
+
+    def _create_context(self, y: np.ndarray, sr: int, budget: Optional[AnalysisBudget] = None,
+                        sample_md5: Optional[str] = None) -> AnalysisContext:
+        """Create a backend context that carries the analysis budget and the signal's hash"""
+        context = self.backend.create_context(y, sr)
+        context.budget = budget
+        context.sample_md5 = sample_md5
+        return context
+
+    def _extract_from_context(self, context: AnalysisContext,
+                              features: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Run the feature graph on a context and normalize the results"""
+        results = self._run_graph(context, self.graph, self._targets(features))
+        return self._normalize_features(results, context)
+
+    def _targets(self, features: Optional[Iterable[str]]) -> Optional[List[str]]:
+        """Graph targets for a requested feature set, or None for every feature"""
+        if features is None:
+            return None
+        targets = list(dict.fromkeys(features))
+        unknown = [name for name in targets if name not in self.graph.features]
+        if unknown:
+            raise ValueError(f"Unknown features: {unknown}. Available features: {self.feature_names()}")
+        return targets
+
+    def _run_graph(self, context: AnalysisContext, graph: FeatureGraph,
+                   targets: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Execute a feature graph on a context, then drop its intermediates
+
+        Features found in the result cache are not recomputed, and newly
+        extracted ones are added to it.
+        """
+        cached = self._cached_features(context, graph, targets)
+        if cached:
+            # Cached features become constant nodes, so features depending on
+            # them (e.g. danceability on tempo) do not recompute them either
+            graph = FeatureGraph(
+                [FeatureNode(node.name, lambda ctx, r, value=cached[node.name]: value)
+                 if node.name in cached else node for node in graph.features.values()],
+                graph.intermediates
+            )
+            targets = [name for name in (targets if targets is not None else graph.features) if name not in cached]
+        
+        # Run every extractor through the dependency graph so shared
+        # intermediates are computed once and released when no longer needed
+        if self.executor is not None:
+            # Progress is reported from this thread as each node is submitted
+            results = graph.execute(context, targets, executor=self.executor,
+                                    on_submit=self.backend._update_progress)
+        else:
+            results = graph.execute(context, targets)
+        context.clear()
+        
+        self._cache_features(context, {name: value for name, value in results.items() if name not in cached})
+        results.update(cached)
+        return results
+
+    def _cache_key(self, context: AnalysisContext, name: str) -> str:
+        """Result cache key of a feature extracted from the context's signal"""
+        # Streaming contexts approximate some intermediates, so their results are kept apart
+        backend = type(self.backend).__name__ + ('-streaming' if context.y is None else '')
+        return self.cache.key(context.sample_md5, backend, name, self.backend.feature_versions().get(name, 1))
+
+    def _cached_features(self, context: AnalysisContext, graph: FeatureGraph,
+                         targets: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Values of the requested features already in the result cache"""
+        if self.cache is None or not context.sample_md5:
             return {}
+        cached = {}
+        for name in (targets if targets is not None else graph.features):
+            # Only backend features are cached; other nodes (e.g. voice) are not
+            if name in self.graph.features:
+                value = self.cache.get(self._cache_key(context, name))
+                if value is not None:
+                    cached[name] = value
+        return cached
+
+    def _cache_features(self, context: AnalysisContext, results: Dict[str, Any]) -> None:
+        """Add newly extracted feature values to the result cache
+
+        Default values returned by failed extractors are not cached, so the
+        next analysis of the same signal tries them again.
+        """
+        if self.cache is None or not context.sample_md5:
+            return
+        for name, value in results.items():
+            if name in self.graph.features and name not in context.failed and value is not None:
+                self.cache.put(self._cache_key(context, name), value)
+
+    def _normalize_features(self, results: Dict[str, Any], context: AnalysisContext) -> Dict[str, Any]:
+        """Clamp extracted features and add the Spotify-style fields"""
+        features = {'duration_ms': int(context.num_samples / context.sr * 1000)}
+        features.update(results)
+        
+        # Validate and normalize features; a requested subset may omit any of them
+        if 'time_signature' in features:
+            features['time_signature'] = min(12, max(3, features['time_signature']))
+        if 'key' in features:
+            features['key'] = min(11, max(0, features['key']))
+        if 'mode' in features:
+            features['mode'] = min(1, max(0, features['mode']))
+        
+        # Print extracted features for debugging
+        print("\nExtracted features:")
+        for key, value in features.items():
+            print(f"{key}: {value}")
+        
+        # Normalize values to proper ranges
+        for key in ['acousticness', 'danceability', 'energy', 'instrumentalness', 
+                   'speechiness', 'valence']:
+            if features.get(key) is not None:
+                features[key] = max(0.0, min(0.95, features[key]))  # Cap at 0.95 instead of 1.0
+        
+        if features.get('loudness') is not None:
+            features['loudness'] = max(-60.0, min(0.0, features['loudness']))
+        
+        # Clamp liveness since it's part of Spotify's format
+        if features.get('liveness') is not None:
+            features['liveness'] = max(0.0, min(0.95, features['liveness']))
+        
+        # Record which features were extracted
+        features['available_features'] = [name for name in self.graph.features if name in results]
+        
+        # Add type and empty fields to match Spotify format
+        features['type'] = 'audio_features'
+        features['analysis_url'] = None
+        features['track_href'] = None
+        features['uri'] = None
+        features['id'] = None
+        
+        return features
 
     def calculate_valence(self, energy: float, danceability: float, loudness: float) -> float:
         """Legacy valence calculation - kept for reference but not used"""
@@ -164,26 +416,46 @@ class FeatureExtractor:
         
         return default_features 
 
-    def _create_analysis_format(self, y: np.ndarray, sr: int, features: Dict[str, Any]) -> Dict[str, Any]:
-        """Create detailed audio analysis format similar to Spotify's"""
+    def _create_analysis_format(self, y: np.ndarray, sr: int, features: Dict[str, Any],
+                                context: Optional[AnalysisContext] = None,
+                                budget: Optional[AnalysisBudget] = None) -> Dict[str, Any]:
+        """Create detailed audio analysis format similar to Spotify's
+
+        Under a budget, sections, segments and tatums are computed at a
+        coarser resolution when time runs low and skipped once it is spent.
+        """
         try:
+            # Share intermediates (STFT, HPSS, tonnetz, ...) between all analysis components
+            context = context if context is not None else self._create_context(y, sr, budget)
+            budget = budget if budget is not None else context.budget
+            
             # Get basic analysis components
             tempo = features.get('tempo', 120.0)
             
             # Calculate confidence scores
-            tempo_confidence = self._calculate_confidence(y, sr, 'tempo')
-            key_confidence = self._calculate_confidence(y, sr, 'key')
-            mode_confidence = self._calculate_confidence(y, sr, 'mode')
-            time_signature_confidence = self._calculate_confidence(y, sr, 'time_signature')
+            tempo_confidence = self._calculate_confidence(y, sr, 'tempo', context)
+            key_confidence = self._calculate_confidence(y, sr, 'key', context)
+            mode_confidence = self._calculate_confidence(y, sr, 'mode', context)
+            time_signature_confidence = self._calculate_confidence(y, sr, 'time_signature', context)
             
             # Get timing information
             duration = len(y) / sr
             
             # Get sections, beats, bars, and segments
-            sections = self._analyze_sections(y, sr, features)
-            beats = self._analyze_beats(y, sr)
-            bars = self._analyze_bars(y, sr)
-            segments = self._analyze_segments(y, sr)
+            beats = self._analyze_beats(y, sr, context)
+            bars = self._analyze_bars(y, sr, context)
+            sections = self._budgeted(
+                'sections', budget,
+                lambda coarse: self._analyze_sections(y, sr, features, context, coarse)
+            )
+            segments = self._budgeted(
+                'segments', budget,
+                lambda coarse: self._analyze_segments(y, sr, context, coarse)
+            )
+            tatums = self._budgeted(
+                'tatums', budget,
+                lambda coarse: self._analyze_tatums(y, sr, context, coarse)
+            )
             
             return {
                 'meta': {
@@ -198,7 +470,7 @@ class FeatureExtractor:
                 'track': {
                     'num_samples': len(y),
                     'duration': duration,
-                    'sample_md5': '',  # Not implemented
+                    'sample_md5': context.sample_md5 or '',
                     'offset_seconds': 0,
                     'window_seconds': 0,
                     'analysis_sample_rate': sr,
@@ -227,42 +499,78 @@ class FeatureExtractor:
                 'beats': beats,
                 'sections': sections,
                 'segments': segments,
-                'tatums': self._analyze_tatums(y, sr)
+                'tatums': tatums
             }
         except Exception as e:
             print(f"Error creating analysis format: {str(e)}")
             return self._get_default_analysis()
 
-    def _calculate_confidence(self, y: np.ndarray, sr: int, feature_type: str) -> float:
+    def _budgeted(self, output: str, budget: Optional[AnalysisBudget], analyze) -> List[Dict[str, Any]]:
+        """Run an optional analysis at full or coarse resolution, or skip it, depending on the time left"""
+        if budget is None:
+            return analyze(False)
+        if budget.exhausted():
+            budget.degrade(output, 'skipped')
+            return []
+        if budget.low():
+            budget.degrade(output, 'coarse')
+            return analyze(True)
+        return analyze(False)
+
+    def _calculate_confidence(self, y: np.ndarray, sr: int, feature_type: str,
+                              context: Optional[AnalysisContext] = None) -> float:
         """Calculate confidence score for different feature types"""
         try:
-            if feature_type == 'tempo':
-                # Use tempo stability as confidence
-                onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-                return float(np.mean(librosa.feature.rms(y=onset_env)))
+            if feature_type in ['tempo', 'time_signature']:
+                # Use tempo/rhythm stability (RMS of the onset envelope) as confidence
+                if context is not None:
+                    onset_env = context['onset_env']
+                else:
+                    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+                return float(np.sqrt(np.mean(onset_env ** 2)))
             elif feature_type in ['key', 'mode']:
-                # Use harmonic features for key/mode confidence
+                # Use harmonic features for key/mode confidence, reusing the
+                # track's single HPSS pass when a context is available
+                if context is not None:
+                    return float(np.mean(context['tonnetz'][0]))
                 harmonic = librosa.effects.harmonic(y)
                 return float(np.mean(librosa.feature.tonnetz(y=harmonic, sr=sr)[0]))
-            elif feature_type == 'time_signature':
-                # Use rhythm stability for time signature confidence
-                onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-                return float(np.mean(librosa.feature.rms(y=onset_env)))
             return 0.5
         except:
             return 0.5
 
-    def _analyze_sections(self, y: np.ndarray, sr: int, features: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Analyze track sections"""
+    def _analyze_sections(self, y: np.ndarray, sr: int, features: Dict[str, Any],
+                          context: Optional[AnalysisContext] = None,
+                          coarse: bool = False) -> List[Dict[str, Any]]:
+        """Analyze track sections, clustering beat-synchronous chroma when coarse"""
         try:
+            context = context if context is not None else self.backend.create_context(y, sr)
+            
             # Use librosa's spectral clustering for segmentation
-            S = np.abs(librosa.stft(y))
+            S = context['stft']
             chroma = librosa.feature.chroma_stft(S=S, sr=sr)
             
             # Detect section boundaries
-            bound_frames = librosa.segment.agglomerative(chroma, 8)  # Detect 8 sections
+            if coarse:
+                # Cluster one column per beat instead of one per frame
+                _, beat_frames = context['beat_track']
+                beat_frames = librosa.util.fix_frames(beat_frames, x_max=chroma.shape[1])
+                beat_chroma = librosa.util.sync(chroma, beat_frames)
+                bound_frames = beat_frames[librosa.segment.agglomerative(beat_chroma, min(8, beat_chroma.shape[1]))]
+            else:
+                bound_frames = librosa.segment.agglomerative(chroma, 8)  # Detect 8 sections
             bound_times = librosa.frames_to_time(bound_frames, sr=sr)
             
+            # Aggregate track-wide frame envelopes over each section's frame range
+            # so the cost does not grow with the number of sections
+            starts = bound_frames[:-1]
+            ends = np.maximum(bound_frames[1:], starts + 1)
+            loudness = self._frame_means(context['rms'], starts, ends)
+            # Rhythm confidence is the RMS of the onset envelope within the section
+            rhythm_confidence = np.sqrt(self._frame_means(context['onset_env'] ** 2, starts, ends))
+            # Key/mode confidence comes from the tonnetz of the harmonic component
+            harmonic_confidence = self._frame_means(context['tonnetz'][0], starts, ends)
+            
             sections = []
             for i in range(len(bound_times) - 1):
                 start = bound_times[i]
@@ -273,15 +581,15 @@ class FeatureExtractor:
                     'start': float(start),
                     'duration': float(duration),
                     'confidence': 0.8,  # Default confidence
-                    'loudness': float(librosa.feature.rms(y=y[int(start*sr):int((start+duration)*sr)])[0].mean()),
+                    'loudness': float(loudness[i]),
                     'tempo': features.get('tempo', 120.0),
-                    'tempo_confidence': self._calculate_confidence(y[int(start*sr):int((start+duration)*sr)], sr, 'tempo'),
+                    'tempo_confidence': float(rhythm_confidence[i]),
                     'key': features.get('key', 0),
-                    'key_confidence': self._calculate_confidence(y[int(start*sr):int((start+duration)*sr)], sr, 'key'),
+                    'key_confidence': float(harmonic_confidence[i]),
                     'mode': features.get('mode', 1),
-                    'mode_confidence': self._calculate_confidence(y[int(start*sr):int((start+duration)*sr)], sr, 'mode'),
+                    'mode_confidence': float(harmonic_confidence[i]),
                     'time_signature': features.get('time_signature', 4),
-                    'time_signature_confidence': self._calculate_confidence(y[int(start*sr):int((start+duration)*sr)], sr, 'time_signature')
+                    'time_signature_confidence': float(rhythm_confidence[i])
                 }
                 sections.append(section)
                 
@@ -290,120 +598,147 @@ class FeatureExtractor:
             print(f"Error analyzing sections: {str(e)}")
             return []
 
-    def _analyze_beats(self, y: np.ndarray, sr: int) -> List[Dict[str, Any]]:
+    def _frame_means(self, values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Mean of a frame-level envelope over each [start, end) frame range"""
+        ends = np.minimum(ends, len(values))
+        starts = np.minimum(starts, ends - 1)
+        cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+        return (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+    def _pulse_events(self, frames: np.ndarray, sr: int, num_frames: int,
+                      context: AnalysisContext) -> List[Dict[str, Any]]:
+        """Build start/duration/confidence events for a sequence of frames, each lasting until the next"""
+        if len(frames) == 0:
+            return []
+        times = librosa.frames_to_time(frames, sr=sr)
+        duration_total = len(context.y) / sr
+        durations = np.append(np.diff(times), duration_total - times[-1])
+        confidences = self._frame_means(context['rms'], frames, np.append(frames[1:], num_frames))
+        
+        return [
+            {
+                'start': float(times[i]),
+                'duration': float(durations[i]),
+                'confidence': float(confidences[i])
+            }
+            for i in range(len(frames))
+        ]
+
+    def _analyze_beats(self, y: np.ndarray, sr: int,
+                       context: Optional[AnalysisContext] = None) -> List[Dict[str, Any]]:
         """Analyze beats in the track"""
         try:
-            tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-            beat_times = librosa.frames_to_time(beat_frames, sr=sr)
-            
-            beats = []
-            for i in range(len(beat_times)):
-                if i < len(beat_times) - 1:
-                    duration = beat_times[i + 1] - beat_times[i]
-                else:
-                    duration = (len(y) / sr) - beat_times[i]
-                    
-                beat = {
-                    'start': float(beat_times[i]),
-                    'duration': float(duration),
-                    'confidence': float(librosa.feature.rms(
-                        y=y[int(beat_times[i]*sr):int((beat_times[i]+duration)*sr)]
-                    )[0].mean())
-                }
-                beats.append(beat)
-            
-            return beats
+            context = context if context is not None else self.backend.create_context(y, sr)
+            _, beat_frames = context['beat_track']
+            return self._pulse_events(beat_frames, sr, len(context['rms']), context)
         except Exception as e:
             print(f"Error analyzing beats: {str(e)}")
             return []
 
-    def _analyze_bars(self, y: np.ndarray, sr: int) -> List[Dict[str, Any]]:
+    def _analyze_bars(self, y: np.ndarray, sr: int,
+                      context: Optional[AnalysisContext] = None) -> List[Dict[str, Any]]:
         """Analyze bars in the track"""
         try:
-            tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+            context = context if context is not None else self.backend.create_context(y, sr)
+            _, beat_frames = context['beat_track']
             beat_times = librosa.frames_to_time(beat_frames, sr=sr)
             
             # Group beats into bars (assuming 4 beats per bar)
             beats_per_bar = 4
-            bars = []
-            
-            for i in range(0, len(beat_times), beats_per_bar):
-                if i + beats_per_bar <= len(beat_times):
-                    start = beat_times[i]
-                    duration = beat_times[i + beats_per_bar - 1] - start
-                    
-                    bar = {
-                        'start': float(start),
-                        'duration': float(duration),
-                        'confidence': float(librosa.feature.rms(
-                            y=y[int(start*sr):int((start+duration)*sr)]
-                        )[0].mean())
-                    }
-                    bars.append(bar)
-            
-            return bars
+            first = np.arange(0, len(beat_frames) - beats_per_bar + 1, beats_per_bar)
+            if len(first) == 0:
+                return []
+            last = first + beats_per_bar - 1
+            
+            confidences = self._frame_means(context['rms'], beat_frames[first], beat_frames[last])
+            
+            return [
+                {
+                    'start': float(beat_times[i]),
+                    'duration': float(beat_times[j] - beat_times[i]),
+                    'confidence': float(confidence)
+                }
+                for i, j, confidence in zip(first, last, confidences)
+            ]
         except Exception as e:
             print(f"Error analyzing bars: {str(e)}")
             return []
 
-    def _analyze_segments(self, y: np.ndarray, sr: int) -> List[Dict[str, Any]]:
-        """Analyze segments in the track"""
+    def _analyze_segments(self, y: np.ndarray, sr: int,
+                          context: Optional[AnalysisContext] = None,
+                          coarse: bool = False) -> List[Dict[str, Any]]:
+        """Analyze segments in the track, one per beat when coarse"""
         try:
+            context = context if context is not None else self.backend.create_context(y, sr)
+            
             # Use onset detection for segments
-            onset_frames = librosa.onset.onset_detect(y=y, sr=sr)
+            if coarse:
+                _, onset_frames = context['beat_track']
+            else:
+                onset_frames = librosa.onset.onset_detect(onset_envelope=context['onset_env'], sr=sr)
+            if len(onset_frames) < 2:
+                return []
             onset_times = librosa.frames_to_time(onset_frames, sr=sr)
             
+            # Aggregate the track-wide frame matrices over each segment's frames
+            # instead of re-analyzing every segment slice
+            chroma = context['chroma_cqt']
+            mfcc = context['mfcc']
+            rms = context['rms']
+            
+            starts = onset_frames[:-1]
+            ends = np.minimum(onset_frames[1:], rms.shape[-1])
+            starts = np.minimum(starts, ends - 1)
+            counts = ends - starts
+            
+            # Means over [start, end) through reduceat on frames up to the last onset
+            last = ends[-1]
+            pitches = np.add.reduceat(chroma[:, :last], starts, axis=1) / counts
+            timbre = np.add.reduceat(mfcc[:, :last], starts, axis=1) / counts
+            loudness_max = np.maximum.reduceat(rms[:last], starts)
+            
+            # Start/end loudness from the first and last 10% of each segment's frames
+            edge = np.maximum(1, (counts * 0.1).astype(int))
+            loudness_start = self._frame_means(rms, starts, starts + edge)
+            loudness_end = self._frame_means(rms, ends - edge, ends)
+            
+            durations = np.diff(onset_times)
+            pitches = pitches.T.tolist()
+            timbre = timbre.T.tolist()
+            
             segments = []
-            for i in range(len(onset_times)):
-                if i < len(onset_times) - 1:
-                    start = onset_times[i]
-                    duration = onset_times[i + 1] - start
-                    segment_samples = y[int(start*sr):int((start+duration)*sr)]
-                    
-                    # Calculate segment features
-                    segment = {
-                        'start': float(start),
-                        'duration': float(duration),
-                        'confidence': 0.8,
-                        'loudness_start': float(librosa.feature.rms(y=segment_samples[:int(len(segment_samples)*0.1)])[0].mean()),
-                        'loudness_max': float(librosa.feature.rms(y=segment_samples)[0].max()),
-                        'loudness_max_time': 0.1,  # Simplified
-                        'loudness_end': float(librosa.feature.rms(y=segment_samples[-int(len(segment_samples)*0.1):])[0].mean()),
-                        'pitches': [float(p) for p in librosa.feature.chroma_cqt(y=segment_samples, sr=sr).mean(axis=1)],
-                        'timbre': [float(t) for t in librosa.feature.mfcc(y=segment_samples, sr=sr).mean(axis=1)]
-                    }
-                    segments.append(segment)
+            for i in range(len(starts)):
+                segment = {
+                    'start': float(onset_times[i]),
+                    'duration': float(durations[i]),
+                    'confidence': 0.8,
+                    'loudness_start': float(loudness_start[i]),
+                    'loudness_max': float(loudness_max[i]),
+                    'loudness_max_time': 0.1,  # Simplified
+                    'loudness_end': float(loudness_end[i]),
+                    'pitches': pitches[i],
+                    'timbre': timbre[i]
+                }
+                segments.append(segment)
             
             return segments
         except Exception as e:
             print(f"Error analyzing segments: {str(e)}")
             return []
 
-    def _analyze_tatums(self, y: np.ndarray, sr: int) -> List[Dict[str, Any]]:
-        """Analyze tatums (smallest rhythmic units) in the track"""
+    def _analyze_tatums(self, y: np.ndarray, sr: int,
+                        context: Optional[AnalysisContext] = None,
+                        coarse: bool = False) -> List[Dict[str, Any]]:
+        """Analyze tatums (smallest rhythmic units) in the track, falling back to beats when coarse"""
         try:
-            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-            _, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
-            tatum_frames = librosa.beat.plp_track(onset_envelope=onset_env, sr=sr)[1]
-            tatum_times = librosa.frames_to_time(tatum_frames, sr=sr)
-            
-            tatums = []
-            for i in range(len(tatum_times)):
-                if i < len(tatum_times) - 1:
-                    duration = tatum_times[i + 1] - tatum_times[i]
-                else:
-                    duration = (len(y) / sr) - tatum_times[i]
-                    
-                tatum = {
-                    'start': float(tatum_times[i]),
-                    'duration': float(duration),
-                    'confidence': float(librosa.feature.rms(
-                        y=y[int(tatum_times[i]*sr):int((tatum_times[i]+duration)*sr)]
-                    )[0].mean())
-                }
-                tatums.append(tatum)
-            
-            return tatums
+            context = context if context is not None else self.backend.create_context(y, sr)
+            if coarse:
+                # The beat grid is already tracked; skip the PLP pulse curve
+                _, tatum_frames = context['beat_track']
+                return self._pulse_events(tatum_frames, sr, len(context['rms']), context)
+            # Tatums are the local maxima of the shared PLP pulse curve
+            tatum_frames = np.flatnonzero(librosa.util.localmax(context['plp']))
+            return self._pulse_events(tatum_frames, sr, len(context['rms']), context)
         except Exception as e:
             print(f"Error analyzing tatums: {str(e)}")
             return []
@@ -0,0 +1,188 @@
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+from .context import AnalysisContext, Intermediate
+
+
+@dataclass
+class FeatureNode:
+    """A feature extractor, the intermediates or features it depends on, and its relative value and cost"""
+    name: str
+    extract: Callable[[AnalysisContext, Dict[str, Any]], Any]
+    requires: Tuple[str, ...] = ()
+    value: float = 1.0
+    cost: float = 1.0
+
+
+class FeatureGraph:
+    """Dependency graph of features and intermediates for a backend
+
+    Executing the graph computes every node once, in topological order, and
+    releases each intermediate from the context as soon as the last node that
+    depends on it has run. Given an executor, independent branches (rhythm,
+    harmony, timbre, ...) run concurrently as soon as their dependencies are
+    ready; every node still runs exactly once, so results match the serial path.
+
+    Features are scheduled by value per cost. When the context carries a
+    compute budget and it runs out, the nodes not yet started are skipped
+    and the skipped features are recorded on the budget.
+    """
+
+    def __init__(self, features: List[FeatureNode], intermediates: Dict[str, Intermediate]):
+        """Initialize with feature nodes and the backend's intermediate declarations"""
+        self.features = {node.name: node for node in features}
+        self.intermediates = intermediates
+
+    def _requires(self, name: str) -> Tuple[str, ...]:
+        """Direct dependencies of a node"""
+        if name in self.features:
+            return self.features[name].requires
+        if name in self.intermediates:
+            return self.intermediates[name].requires
+        raise ValueError(f"Unknown feature or intermediate: {name}")
+
+    def plan(self, targets: Optional[Iterable[str]] = None, available: Iterable[str] = ()) -> List[str]:
+        """Topologically ordered list of nodes needed to compute the targets
+
+        Dependencies of intermediates listed in available (already present in
+        the context) are not scheduled.
+        """
+        targets = list(self.features) if targets is None else list(targets)
+        # Most valuable features per unit of cost first
+        targets.sort(key=self._priority, reverse=True)
+        available = set(available)
+        order: List[str] = []
+        visiting = set()
+        visited = set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle detected at: {name}")
+            visiting.add(name)
+            if name not in available:
+                for dependency in self._requires(name):
+                    visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def _priority(self, name: str) -> float:
+        """Value per cost of a target, unknown names last"""
+        node = self.features.get(name)
+        if node is None:
+            return 0.0
+        return node.value / node.cost if node.cost > 0 else float('inf')
+
+    def _release_schedule(self, order: List[str]) -> Dict[int, List[str]]:
+        """Map each step to the intermediates that are no longer needed after it"""
+        scheduled = set(order)
+        last_use: Dict[str, int] = {}
+        for index, name in enumerate(order):
+            for dependency in self._requires(name):
+                if dependency in scheduled:
+                    last_use[dependency] = index
+
+        schedule: Dict[int, List[str]] = {}
+        for name, index in last_use.items():
+            if name in self.intermediates:
+                schedule.setdefault(index, []).append(name)
+        return schedule
+
+    def execute(self, context: AnalysisContext, targets: Optional[Iterable[str]] = None,
+                executor: Optional[Executor] = None,
+                on_submit: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Compute the target features, sharing and releasing intermediates along the way"""
+        available = [name for name in self.intermediates if context.has(name)]
+        order = self.plan(targets, available)
+        if executor is not None:
+            return self._execute_concurrent(context, order, set(available), executor, on_submit)
+
+        schedule = self._release_schedule(order)
+
+        results: Dict[str, Any] = {}
+        for index, name in enumerate(order):
+            if self._over_budget(context, name):
+                continue
+            if on_submit and name in self.features:
+                on_submit(name)
+            results[name] = self._run_node(context, name, results)
+
+            for released in schedule.get(index, []):
+                context.release(released)
+
+        return {name: value for name, value in results.items() if name in self.features}
+
+    def _over_budget(self, context: AnalysisContext, name: str) -> bool:
+        """Check whether a node has to be skipped because the analysis ran out of time"""
+        budget = context.budget
+        if budget is None or not budget.exhausted():
+            return False
+        if name in self.features:
+            budget.degrade(name, 'skipped')
+        return True
+
+    def _run_node(self, context: AnalysisContext, name: str, results: Dict[str, Any]) -> Any:
+        """Run a feature extractor or materialize an intermediate in the context"""
+        if name in self.features:
+            return self.features[name].extract(context, results)
+        context.get(name)
+        return None
+
+    def _execute_concurrent(self, context: AnalysisContext, order: List[str], available: set,
+                            executor: Executor,
+                            on_submit: Optional[Callable[[str], None]]) -> Dict[str, Any]:
+        """Run planned nodes on an executor as soon as their dependencies have finished"""
+        scheduled = set(order)
+        requires: Dict[str, set] = {}
+        waiting: Dict[str, set] = {}
+        dependents: Dict[str, List[str]] = {name: [] for name in order}
+        consumers: Dict[str, int] = {}
+        for name in order:
+            dependencies = set() if name in available else set(self._requires(name)) & scheduled
+            requires[name] = dependencies
+            waiting[name] = set(dependencies)
+            for dependency in dependencies:
+                dependents[dependency].append(name)
+                consumers[dependency] = consumers.get(dependency, 0) + 1
+
+        results: Dict[str, Any] = {}
+        ready = [name for name in order if not waiting[name]]
+        running = {}
+        while ready or running:
+            # Submission and bookkeeping stay on the calling thread; only the
+            # node computations themselves run on the executor
+            finished = []
+            for name in ready:
+                if self._over_budget(context, name):
+                    # Skipped nodes finish at once so their dependents are reached
+                    finished.append(name)
+                    continue
+                if on_submit and name in self.features:
+                    on_submit(name)
+                running[executor.submit(self._run_node, context, name, results)] = name
+            ready = []
+
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    finished.append(name)
+
+            for name in finished:
+                for dependency in requires[name]:
+                    consumers[dependency] -= 1
+                    if consumers[dependency] == 0 and dependency in self.intermediates:
+                        context.release(dependency)
+                for dependent in dependents[name]:
+                    waiting[dependent].discard(name)
+                    if not waiting[dependent]:
+                        ready.append(dependent)
+
+        return {name: value for name, value in results.items() if name in self.features}
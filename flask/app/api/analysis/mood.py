@@ -15,6 +15,10 @@ class MoodAnalyzer:
     def __init__(self):
         """Initialize with mood mapping data"""
         self.mood_tags = self._initialize_mood_tags()
+        # Tag coordinates as arrays for vectorized distance computations
+        self.tag_names = [tag.name for tag in self.mood_tags]
+        self.tag_coordinates = np.array([[tag.valence, tag.arousal] for tag in self.mood_tags])
+        self.tag_quadrants = np.array([tag.quadrant for tag in self.mood_tags])
         self.quadrant_descriptions = {
             1: "High Valence, High Arousal (Happy, Energetic)",
             2: "Low Valence, High Arousal (Aggressive, Intense)",
@@ -44,112 +48,111 @@ class MoodAnalyzer:
             MoodTag("upbeat", 7.14/10, 4.92/10, 4),
         ]
 
+    def requirements(self) -> Tuple[str, ...]:
+        """Technical features read when scoring mood"""
+        return ('energy', 'valence', 'tempo', 'loudness', 'speechiness')
+
     def analyze(self, features: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze mood based on audio features"""
         try:
-            # Get features with defaults
-            valence = features.get('valence')
-            energy = features.get('energy')
-            
-            # Return default scores if essential features are missing
-            if valence is None or energy is None:
-                return self._get_default_mood_scores()
-            
-            # Map energy to arousal (considering additional features)
-            arousal = self._calculate_arousal(features)
-            if arousal is None:
+            row = [features.get(name) for name in self.requirements()]
+            if any(value is None for value in row):
+                # Return default scores if any feature mood is scored from is missing
                 return self._get_default_mood_scores()
+            return self.analyze_batch([row])[0]
             
-            # Get quadrant and closest moods
-            quadrant = self._get_quadrant(valence, arousal)
-            closest_moods = self._find_closest_moods(valence, arousal)
-            
-            # Calculate confidence scores
-            mood_confidence = self._calculate_confidence(valence, arousal, closest_moods)
-            
-            return {
-                'valence': valence,
-                'arousal': arousal,
-                'energy': energy,
+        except Exception as e:
+            print(f"Error analyzing mood: {str(e)}")
+            return self._get_default_mood_scores()
+
+    def analyze_batch(self, features_matrix, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Score the mood of many tracks in one vectorized pass
+
+        Each row of features_matrix holds one track's features in the order
+        of requirements(); rows with a missing (NaN) value get default scores.
+        """
+        features_matrix = np.asarray(features_matrix, dtype=np.float64).reshape(-1, len(self.requirements()))
+        energy, valence, tempo, loudness, speechiness = features_matrix.T
+        valid = ~np.isnan(features_matrix).any(axis=1)
+        
+        arousal = self._calculate_arousal(energy, tempo, loudness, speechiness)
+        quadrants = self._get_quadrant(valence, arousal)
+        nearest, distances = self._find_closest_moods(valence, arousal, top_k)
+        confidences = self._calculate_confidence(distances)
+        
+        results = []
+        for i in range(len(features_matrix)):
+            if not valid[i]:
+                results.append(self._get_default_mood_scores())
+                continue
+            closest_moods = [
+                {
+                    'mood': self.tag_names[tag],
+                    'distance': float(distance),
+                    'quadrant': int(self.tag_quadrants[tag]),
+                    'valence': float(self.tag_coordinates[tag, 0]),
+                    'arousal': float(self.tag_coordinates[tag, 1])
+                }
+                for tag, distance in zip(nearest[i], distances[i])
+            ]
+            quadrant = int(quadrants[i])
+            results.append({
+                'valence': float(valence[i]),
+                'arousal': float(arousal[i]),
+                'energy': float(energy[i]),
                 'quadrant': quadrant,
                 'quadrant_description': self.quadrant_descriptions.get(quadrant, "Unknown"),
                 'closest_moods': closest_moods,
                 'primary_mood': closest_moods[0]['mood'] if closest_moods else 'unknown',
-                'confidence': mood_confidence,
+                'confidence': float(confidences[i]),
                 'mood_tags': [mood['mood'] for mood in closest_moods[:3]]
-            }
-            
-        except Exception as e:
-            print(f"Error analyzing mood: {str(e)}")
-            return self._get_default_mood_scores()
+            })
+        return results
 
-    def _calculate_arousal(self, features: Dict[str, Any]) -> float:
-        """Calculate arousal score based on multiple features"""
-        try:
-            energy = features.get('energy')
-            tempo = features.get('tempo')
-            loudness = features.get('loudness')
-            speechiness = features.get('speechiness')
-            
-            # Return None if any required feature is missing
-            if any(x is None for x in [energy, tempo, loudness, speechiness]):
-                return None
-            
-            # Normalize tempo and loudness
-            tempo_norm = tempo / 200.0
-            loudness_norm = (loudness + 60) / 60.0
-            
-            # Weighted combination of features
-            arousal = (
-                energy * 0.4 +
-                tempo_norm * 0.25 +
-                loudness_norm * 0.25 +
-                speechiness * 0.1
-            )
-            
-            return max(0.0, min(1.0, arousal))
-        except Exception as e:
-            print(f"Error calculating arousal: {str(e)}")
-            return None
+    def _calculate_arousal(self, energy: np.ndarray, tempo: np.ndarray, loudness: np.ndarray,
+                           speechiness: np.ndarray) -> np.ndarray:
+        """Calculate arousal scores from energy, tempo, loudness and speechiness"""
+        # Normalize tempo and loudness
+        tempo_norm = tempo / 200.0
+        loudness_norm = (loudness + 60) / 60.0
+        
+        # Weighted combination of features
+        arousal = (
+            energy * 0.4 +
+            tempo_norm * 0.25 +
+            loudness_norm * 0.25 +
+            speechiness * 0.1
+        )
+        
+        return np.clip(arousal, 0.0, 1.0)
 
-    def _get_quadrant(self, valence: float, arousal: float) -> int:
-        """Determine the mood quadrant"""
-        if valence >= 0.5:
-            return 1 if arousal >= 0.5 else 4
-        else:
-            return 2 if arousal >= 0.5 else 3
+    def _get_quadrant(self, valence: np.ndarray, arousal: np.ndarray) -> np.ndarray:
+        """Determine the mood quadrants"""
+        return np.where(valence >= 0.5,
+                        np.where(arousal >= 0.5, 1, 4),
+                        np.where(arousal >= 0.5, 2, 3))
 
-    def _find_closest_moods(self, valence: float, arousal: float) -> List[Dict[str, Any]]:
-        """Find the closest matching mood tags"""
-        distances = []
-        for mood in self.mood_tags:
-            distance = np.sqrt(
-                (valence - mood.valence)**2 + 
-                (arousal - mood.arousal)**2
-            )
-            distances.append({
-                'mood': mood.name,
-                'distance': distance,
-                'quadrant': mood.quadrant,
-                'valence': mood.valence,
-                'arousal': mood.arousal
-            })
+    def _find_closest_moods(self, valence: np.ndarray, arousal: np.ndarray,
+                            top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of and distances to the closest mood tags, nearest first"""
+        # Distance from every track to every tag at once
+        points = np.stack([valence, arousal], axis=1)
+        distances = np.sqrt(np.square(points[:, np.newaxis, :] - self.tag_coordinates[np.newaxis]).sum(axis=2))
         
-        # Sort by distance and return top matches
-        return sorted(distances, key=lambda x: x['distance'])[:5]
+        # A stable sort keeps tag order between equally distant tags
+        nearest = np.argsort(distances, axis=1, kind='stable')[:, :top_k]
+        return nearest, np.take_along_axis(distances, nearest, axis=1)
 
-    def _calculate_confidence(self, valence: float, arousal: float, closest_moods: List[Dict[str, Any]]) -> float:
-        """Calculate confidence score for mood prediction"""
-        if not closest_moods:
-            return 0.0
-            
+    def _calculate_confidence(self, distances: np.ndarray) -> np.ndarray:
+        """Calculate confidence scores for mood predictions"""
+        if distances.shape[1] == 0:
+            return np.zeros(len(distances))
+        
         # Calculate average distance to top 3 matches
-        avg_distance = np.mean([mood['distance'] for mood in closest_moods[:3]])
+        avg_distance = distances[:, :3].mean(axis=1)
         
         # Convert distance to confidence score (inverse relationship)
-        confidence = max(0.0, min(1.0, 1.0 - avg_distance))
-        
-        return confidence
+        return np.clip(1.0 - avg_distance, 0.0, 1.0)
 
     def _get_default_mood_scores(self) -> Dict[str, Any]:
         """Return default mood scores"""
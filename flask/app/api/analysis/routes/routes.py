@@ -7,6 +7,7 @@ from app.main import db, celery
 from app.api.analysis.database.models import AudioAnalysis
 from app.api.analysis.schemas.analysis import (
     AudioAnalysisSchema, 
+    AudioAnalysisCreateSchema,
     AnalysisStatusSchema,
     AnalysisCancelSchema
 )
@@ -28,7 +29,7 @@ status_schema = AnalysisStatusSchema()
 cancel_schema = AnalysisCancelSchema()
 
 @bp.route("/analyses", methods=["POST"])
-@body(AudioAnalysisSchema)
+@body(AudioAnalysisCreateSchema)
 @response(AudioAnalysisSchema, 201, description="Newly created audio analysis")
 @other_responses({
     400: "Invalid input data",
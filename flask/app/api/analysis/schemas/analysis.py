@@ -3,6 +3,7 @@ from app.utils.schemas.utils import CustomSQLAlchemySchema, UTCDateTime
 from app.api.files.schemas import FileSchema
 from marshmallow import validate, fields
 from flask_babel import lazy_gettext as _
+from app.api.analysis.analyzer import ANALYSIS_FEATURES
 
 class SpotifyInfoSchema(ma.Schema):
     """Schema for Spotify track information"""
@@ -52,6 +53,10 @@ class AudioAnalysisSchema(CustomSQLAlchemySchema):
         dump_only=True,
         metadata={"title":"Duration", "description":"Song duration in seconds"}
     )
+    sample_md5 = ma.String(
+        dump_only=True,
+        metadata={"title":"Sample MD5", "description":"MD5 of the decoded audio samples"}
+    )
 
     # Spotify Information
     spotify_info = fields.Nested(
@@ -96,6 +101,18 @@ class AudioAnalysisSchema(CustomSQLAlchemySchema):
         metadata={"title":"Image URL", "description":"Album cover image URL"}
     )
 
+class AudioAnalysisCreateSchema(AudioAnalysisSchema):
+    """Schema for creating an audio analysis, optionally limited to some features"""
+
+    # Requested features; all of them when omitted
+    features = ma.List(
+        ma.String(validate=validate.OneOf(ANALYSIS_FEATURES)),
+        load_only=True,
+        required=False,
+        allow_none=True,
+        metadata={"title":"Features", "description":"Features to compute, e.g. tempo, key, mode, voice, mood, detailed"}
+    )
+
 class AnalysisStatusSchema(ma.Schema):
     """Schema for analysis status response"""
     status = ma.String(required=True)
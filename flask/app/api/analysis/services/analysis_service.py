@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from sqlalchemy import or_, and_
 from app.main import db
 from app.api.analysis.database.models import AudioAnalysis
@@ -6,7 +6,9 @@ from app.api.files.services import FileService
 from app.api.exceptions import BusinessLogicException
 from flask_babel import gettext as _
 from app.api.analysis import AudioAnalyzer
+from app.api.analysis.analyzer import DEFAULT_FEATURES
 from flask import current_app
+from celery.result import AsyncResult
 from werkzeug.datastructures import FileStorage
 from app.utils.app.file import FileType
 import boto3
@@ -14,6 +16,9 @@ import json
 import io
 import os
 
+# Current step of a completed analysis while missing features are added to it
+TOP_UP_STEP = 'Adding features'
+
 class AudioAnalysisService:
     @staticmethod
     def create_analysis(data: dict) -> AudioAnalysis:
@@ -28,6 +33,7 @@ class AudioAnalysisService:
                 "spotify_info": data.get("spotify_info"),
                 "image_url": data.get("spotify_info", {}).get("imageUrl"),
             }
+            features = data.get("features")
 
             # Check if analysis already exists
             existing = AudioAnalysis.query.filter(
@@ -44,6 +50,9 @@ class AudioAnalysisService:
             ).first()
 
             if existing:
+                missing = AudioAnalysisService.missing_features(existing, features)
+                if missing:
+                    existing = AudioAnalysisService.request_missing_features(existing, missing)
                 return existing
 
             # Create analysis record
@@ -96,7 +105,7 @@ class AudioAnalysisService:
 
             # Start async analysis
             from app.celery.celery_tasks import analyze_audio
-            task = analyze_audio.delay(analysis.id, audio_file.id)
+            task = analyze_audio.delay(analysis.id, audio_file.id, features)
             analysis.task_id = task.id
 
             db.session.commit()
@@ -111,6 +120,60 @@ class AudioAnalysisService:
                     print(f"Error cleaning up file {audio_path}: {cleanup_error}")
             raise e
 
+    @staticmethod
+    def missing_features(analysis: AudioAnalysis, features: Optional[List[str]] = None) -> List[str]:
+        """Requested features a completed analysis does not hold yet; those of a full analysis when none are given"""
+        if analysis.status != "completed":
+            return []
+        results = (analysis.raw_analysis_data or {}).get('raw_analysis_data') or {}
+        # Analyses stored before feature selection hold those of a full analysis
+        present = results.get('analysis', {}).get('available_features', DEFAULT_FEATURES)
+        requested = features if features is not None else DEFAULT_FEATURES
+        return [name for name in dict.fromkeys(requested) if name not in present]
+
+    @staticmethod
+    def request_missing_features(analysis: AudioAnalysis, missing: List[str]) -> AudioAnalysis:
+        """Enqueue a top-up computing the features a completed analysis lacks, unless one is running
+
+        Only the missing features are computed; the analysis stays completed
+        and readable meanwhile.
+        """
+        # Lock the row so concurrent requests enqueue a single top-up
+        analysis = AudioAnalysis.query.filter_by(id=analysis.id).with_for_update().first()
+        if not AudioAnalysisService.top_up_in_flight(analysis):
+            from app.celery.celery_tasks import analyze_audio
+            task = analyze_audio.delay(analysis.id, None, missing)
+            analysis.task_id = task.id
+            analysis.current_step = TOP_UP_STEP
+        db.session.commit()
+        return analysis
+
+    @staticmethod
+    def top_up_in_flight(analysis: AudioAnalysis) -> bool:
+        """Check whether missing features are still being added to a completed analysis"""
+        if analysis.current_step != TOP_UP_STEP or not analysis.task_id:
+            return False
+        return not AsyncResult(analysis.task_id).ready()
+
+    @staticmethod
+    def find_duplicate_results(sample_md5: str, exclude_id: Optional[int] = None) -> Optional[dict]:
+        """Analyzer results of a completed analysis of the same decoded audio, if any"""
+        query = AudioAnalysis.query.filter(
+            AudioAnalysis.sample_md5 == sample_md5,
+            AudioAnalysis.status == "completed",
+        )
+        if exclude_id is not None:
+            query = query.filter(AudioAnalysis.id != exclude_id)
+        duplicate = query.order_by(AudioAnalysis.id).first()
+        if duplicate is None:
+            return None
+        data = duplicate.raw_analysis_data or {}
+        results = data.get('raw_analysis_data')
+        if results and 'detailed' in results.get('analysis', {}).get('available_features', []):
+            # Segments are stored once, next to the features
+            results = {**results, 'analysis': {**results['analysis'], 'segments': data.get('segments', [])}}
+        return results
+
     @staticmethod
     def get(id: int) -> AudioAnalysis:
         """Get an analysis by ID"""
@@ -175,6 +238,133 @@ class AudioAnalysisService:
         db.session.add(analysis)
         return analysis
 
+    @staticmethod
+    def build_analysis_results(results: dict) -> dict:
+        """Map an analyzer result document to the stored analysis results"""
+        features = results.get('analysis', {}).get('technical_features', {})
+        voice_features = results.get('analysis', {}).get('voice_features', {})
+        mood_scores = results.get('analysis', {}).get('mood_scores', {})
+        segments = results.get('analysis', {}).get('segments', [])
+        if 'segments' in results.get('analysis', {}):
+            # Keep a single copy of the segments, the largest part of the document
+            results = {**results, 'analysis': {key: value for key, value in results['analysis'].items()
+                                               if key != 'segments'}}
+
+        return {
+            'tempo': features.get('tempo'),
+            'key': features.get('key'),
+            'mode': features.get('mode'),
+            'time_signature': features.get('time_signature'),
+            'danceability': features.get('danceability'),
+            'energy': features.get('energy'),
+            'loudness': features.get('loudness'),
+            'speechiness': features.get('speechiness'),
+            'acousticness': features.get('acousticness'),
+            'instrumentalness': features.get('instrumentalness'),
+            'liveness': features.get('spotify_audio_features', {}).get('liveness'),
+            'valence': features.get('valence'),
+            'mood': mood_scores.get('primary_mood'),
+            'mood_confidence': mood_scores.get('confidence'),
+            'voice_characteristics': voice_features,
+            'segments': segments,
+            'provisional': results.get('provisional', False),
+            'sample_md5': results.get('analysis', {}).get('sample_md5'),
+            'raw_analysis_data': results
+        }
+
+    @staticmethod
+    def bulk_update_analysis_results(results: Dict[int, dict]) -> List[AudioAnalysis]:
+        """Update the results of many analyses in one pass, marking failures"""
+        from datetime import datetime, timezone
+
+        analyses = AudioAnalysis.query.filter(AudioAnalysis.id.in_(list(results))).all()
+        now = datetime.now(timezone.utc)
+        for analysis in analyses:
+            result = results[analysis.id]
+            if 'error' in result:
+                analysis.status = "failed"
+                analysis.error_message = result['error']
+                analysis.progress = 0
+                analysis.current_step = 'Analysis failed'
+            else:
+                analysis.timestamp = now
+                analysis.raw_analysis_data = AudioAnalysisService.build_analysis_results(result)
+                analysis.sample_md5 = analysis.raw_analysis_data['sample_md5'] or analysis.sample_md5
+                analysis.status = "completed"
+                analysis.progress = 100
+                analysis.current_step = 'Analysis completed'
+
+        db.session.add_all(analyses)
+        return analyses
+
+    @staticmethod
+    def update_voice_features(id: int, voice_features: dict) -> AudioAnalysis:
+        """Merge follow-up voice results (e.g. transcription) into the stored analysis"""
+        import copy
+
+        analysis = AudioAnalysisService.get(id)
+        # Assign a modified copy so the JSONB column is marked as changed
+        data = copy.deepcopy(analysis.raw_analysis_data or {})
+        data.setdefault('voice_characteristics', {}).update(voice_features)
+        raw = data.get('raw_analysis_data') or {}
+        if raw.get('analysis') is not None:
+            raw['analysis'].setdefault('voice_features', {}).update(voice_features)
+
+        analysis.raw_analysis_data = data
+        db.session.add(analysis)
+        return analysis
+
+    @staticmethod
+    def rescore_moods() -> List[AudioAnalysis]:
+        """Re-score the mood of every completed analysis in one vectorized pass"""
+        import copy
+        from app.api.analysis import MoodAnalyzer
+
+        mood_analyzer = MoodAnalyzer()
+        names = mood_analyzer.requirements()
+        analyses = [
+            analysis for analysis in AudioAnalysis.query.filter_by(status="completed").all()
+            if all((analysis.raw_analysis_data or {}).get(name) is not None for name in names)
+        ]
+        if not analyses:
+            return []
+
+        features_matrix = [[analysis.raw_analysis_data[name] for name in names] for analysis in analyses]
+        for analysis, mood_scores in zip(analyses, mood_analyzer.analyze_batch(features_matrix)):
+            # Assign a modified copy so the JSONB column is marked as changed
+            data = copy.deepcopy(analysis.raw_analysis_data)
+            data['mood'] = mood_scores.get('primary_mood')
+            data['mood_confidence'] = mood_scores.get('confidence')
+            raw = data.get('raw_analysis_data') or {}
+            if raw.get('analysis') is not None:
+                raw['analysis']['mood_scores'] = mood_scores
+            analysis.raw_analysis_data = data
+
+        db.session.add_all(analyses)
+        return analyses
+
+    @staticmethod
+    def publish_provisional_results(id: int, results: dict) -> AudioAnalysis:
+        """Store preview results while the full analysis is still processing"""
+        from datetime import datetime, timezone
+
+        analysis = AudioAnalysisService.get(id)
+        analysis.timestamp = datetime.now(timezone.utc)
+        analysis.raw_analysis_data = results
+        analysis.current_step = 'Provisional results available'
+
+        db.session.add(analysis)
+        return analysis
+
+    @staticmethod
+    def discard_provisional_results(id: int) -> AudioAnalysis:
+        """Drop preview results, e.g. once the full analysis has failed"""
+        analysis = AudioAnalysisService.get(id)
+        if (analysis.raw_analysis_data or {}).get('provisional'):
+            analysis.raw_analysis_data = None
+            db.session.add(analysis)
+        return analysis
+
     @staticmethod
     def update_analysis_results(id: int, results: dict) -> AudioAnalysis:
         """Update the analysis results"""
@@ -190,6 +380,7 @@ class AudioAnalysisService:
 
         
             analysis.raw_analysis_data = results
+            analysis.sample_md5 = results.get('sample_md5') or analysis.sample_md5
 
 
             # Update status
@@ -0,0 +1,58 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+import speech_recognition
+
+
+class SpeechRecognizer(ABC):
+    """Abstract base class for speech-to-text engines used by voice analysis"""
+
+    @abstractmethod
+    def recognize(self, pcm: bytes, sample_rate: int, timeout: float) -> Optional[str]:
+        """Transcribe 16-bit mono PCM, returning None when nothing was understood"""
+        pass
+
+
+class GoogleSpeechRecognizer(SpeechRecognizer):
+    """Google Web Speech API recognizer fed from in-memory PCM"""
+
+    def recognize(self, pcm: bytes, sample_rate: int, timeout: float) -> Optional[str]:
+        # The timeout lives on the recognizer, so each request gets its own to keep concurrent calls apart
+        recognizer = speech_recognition.Recognizer()
+        recognizer.operation_timeout = timeout
+        audio = speech_recognition.AudioData(pcm, sample_rate, 2)
+        try:
+            return recognizer.recognize_google(audio)
+        except speech_recognition.UnknownValueError:
+            print("Speech recognition could not understand the audio")
+            return None
+        except speech_recognition.RequestError as e:
+            print(f"Could not request results from speech recognition service: {e}")
+            return None
+
+
+class OfflineSpeechRecognizer(SpeechRecognizer):
+    """Local stub that never leaves the process, for offline runs and tests"""
+
+    def __init__(self, transcript: Optional[str] = None):
+        """Initialize with the transcript to return for any audio, or none to understand nothing"""
+        self.transcript = transcript
+
+    def recognize(self, pcm: bytes, sample_rate: int, timeout: float) -> Optional[str]:
+        return self.transcript if pcm and self.transcript else None
+
+
+def get_recognizer(recognizer_name: str = 'google', offline_transcript: Optional[str] = None) -> SpeechRecognizer:
+    """Factory function to get the appropriate speech recognizer
+
+    offline_transcript is what the 'offline' recognizer returns for any audio;
+    without one it transcribes nothing.
+    """
+    recognizers = {
+        'google': GoogleSpeechRecognizer,
+        'offline': lambda: OfflineSpeechRecognizer(offline_transcript),
+    }
+
+    if recognizer_name not in recognizers:
+        raise ValueError(f"Unknown speech recognizer: {recognizer_name}. Available recognizers: {list(recognizers.keys())}")
+
+    return recognizers[recognizer_name]()
@@ -0,0 +1,36 @@
+import pytest
+from types import SimpleNamespace
+
+
+class _Session:
+    """Stand-in for the database session, recording what was added and committed"""
+
+    def __init__(self):
+        self.added = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def add(self, item):
+        self.added.append(item)
+
+    def add_all(self, items):
+        self.added.extend(items)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """Database session and app config seen by the analysis service and celery tasks"""
+    from app.api.analysis.services import analysis_service
+    from app.celery import celery_tasks
+
+    session = _Session()
+    monkeypatch.setattr(celery_tasks, 'db', SimpleNamespace(session=session))
+    monkeypatch.setattr(analysis_service, 'db', SimpleNamespace(session=session))
+    monkeypatch.setattr(celery_tasks, 'current_app', SimpleNamespace(config={'AWS_S3_BUCKET_NAME': 'bucket'}))
+    return session
@@ -0,0 +1,66 @@
+import threading
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from app.api.analysis.backends import LibrosaBackend, NumpyBackend, get_backend
+from app.api.analysis.features import FeatureExtractor
+from app.celery import celery_tasks
+
+# Largest difference from librosa allowed per feature, as documented on NumpyBackend
+TOLERANCES = {
+    'loudness': 0.5,
+    'energy': 0.05,
+    'danceability': 0.05,
+    'acousticness': 0.05,
+    'instrumentalness': 0.05,
+    'speechiness': 0.05,
+    'valence': 0.2,
+    'liveness': 0.2,
+}
+
+
+def _track(bpm, root, minor=False, seconds=10.0, sr=22050):
+    """Triad over noise bursts on every beat"""
+    t = np.arange(int(seconds * sr)) / sr
+    third = root * 2 ** ((3 if minor else 4) / 12)
+    y = 0.2 * sum(np.sin(2 * np.pi * frequency * t) for frequency in (root, third, root * 1.5))
+    bursts = np.exp(-(t % (60.0 / bpm)) * 30)
+    y = y + 0.4 * bursts * np.random.default_rng(0).standard_normal(len(t))
+    return (0.8 * y / np.abs(y).max()).astype(np.float32)
+
+
+def test_backend_flag_selects_the_fast_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(celery_tasks, '_analyzers', threading.local())
+    monkeypatch.setattr(celery_tasks, 'current_app', SimpleNamespace(config={
+        'UPLOAD_FOLDER': str(tmp_path / 'downloads'),
+        'ANALYSIS_FOLDER': str(tmp_path / 'analysis'),
+        'ANALYSIS_BACKEND': 'fast',
+        'ANALYSIS_SPEECH_RECOGNIZER': 'offline',
+    }))
+
+    analyzer = celery_tasks.get_analyzer()
+
+    assert isinstance(analyzer.feature_extractor.backend, NumpyBackend)
+    features = analyzer.feature_extractor.extract_features(_track(120, 261.63), 22050)
+    assert set(features['available_features']) == set(analyzer.feature_extractor.feature_names())
+    for name in features['available_features']:
+        assert features[name] is not None
+
+
+def test_get_backend_rejects_unknown_names():
+    assert type(get_backend()) is LibrosaBackend
+    with pytest.raises(ValueError):
+        get_backend('torchaudio')
+
+
+@pytest.mark.parametrize('bpm, root, minor', [(120, 261.63, False), (100, 220.0, True), (140, 196.0, False)])
+def test_fast_backend_stays_close_to_librosa(bpm, root, minor):
+    y = _track(bpm, root, minor)
+
+    expected = FeatureExtractor(get_backend('librosa')).extract_features(y, 22050)
+    fast = FeatureExtractor(get_backend('fast')).extract_features(y, 22050)
+
+    assert fast['available_features'] == expected['available_features']
+    assert fast['tempo'] == pytest.approx(expected['tempo'], rel=0.02)
+    for name, tolerance in TOLERANCES.items():
+        assert fast[name] == pytest.approx(expected[name], abs=tolerance), name
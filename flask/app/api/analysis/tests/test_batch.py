@@ -0,0 +1,100 @@
+import io
+import json
+import numpy as np
+import pytest
+import soundfile as sf
+from multiprocessing import shared_memory
+from app.api.analysis import analyzer as analyzer_module
+from app.api.analysis.analyzer import AudioAnalyzer
+
+
+class _Bucket:
+    """In-memory stand-in for the S3 client, holding analysis JSONs and audio objects"""
+
+    def __init__(self, fail_writes=()):
+        self.objects = {}
+        self.fail_writes = set(fail_writes)
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def download_fileobj(self, Bucket, Key, Fileobj):
+        Fileobj.write(self.objects[Key])
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        if Key in self.fail_writes:
+            raise IOError(f"Cannot write {Key}")
+        self.objects[Key] = Body.encode('utf-8')
+
+
+def _tone(seconds=3.0, sr=22050, frequency=220.0):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def _add_track(bucket, track_id, y=None, processed=True):
+    audio_path = f"audio/{track_id}.wav"
+    if y is not None:
+        encoded = io.BytesIO()
+        sf.write(encoded, y, 22050, format='WAV', subtype='FLOAT')
+        bucket.objects[audio_path] = encoded.getvalue()
+    bucket.objects[f"analyses/{track_id}.json"] = json.dumps(
+        {'audio_processed': processed, 'audio_path': audio_path}
+    ).encode('utf-8')
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = AudioAnalyzer(downloads_dir=str(tmp_path / 'downloads'), analysis_dir=str(tmp_path / 'analysis'),
+                             backend='fast', speech_recognizer='offline')
+    analyzer.s3 = _Bucket()
+    return analyzer
+
+
+def test_analyze_shared_reads_the_signal_from_shared_memory():
+    y = _tone()
+    analyzer_module._init_batch_worker('fast')
+    shm = shared_memory.SharedMemory(create=True, size=y.nbytes)
+    try:
+        np.ndarray(y.shape, dtype=np.float32, buffer=shm.buf)[:] = y
+        technical_features, voice_features, degraded = analyzer_module._analyze_shared(
+            shm.name, len(y), 22050, 'f' * 32
+        )
+    finally:
+        shm.close()
+        shm.unlink()
+
+    expected = analyzer_module._batch_worker['feature_extractor'].extract_features(y, 22050)
+    assert technical_features == expected
+    assert voice_features is not None
+    assert degraded == {}
+
+
+def test_analyze_tracks_saves_every_analyzed_track(analyzer):
+    _add_track(analyzer.s3, 1, _tone(frequency=220.0))
+    _add_track(analyzer.s3, 2, _tone(frequency=330.0))
+    _add_track(analyzer.s3, 3, processed=False)
+
+    results = analyzer.analyze_tracks([1, 2, 3], 'bucket', processes=1)
+
+    assert sorted(results) == [1, 2, 3]
+    assert 'error' in results[3]
+    for track_id in (1, 2):
+        stored = json.loads(analyzer.s3.objects[f"analyses/{track_id}.json"])
+        assert stored['analysis_completed']
+        assert stored['analysis_results'] == json.loads(json.dumps(results[track_id]))
+        # The detailed analysis only runs when requested
+        assert 'detailed' not in stored['analysis_results']['analysis']['available_features']
+        assert 'segments' not in stored['analysis_results']['analysis']
+    assert results[1]['analysis']['sample_md5'] != results[2]['analysis']['sample_md5']
+
+
+def test_analyze_tracks_reports_failed_writes(analyzer):
+    analyzer.s3.fail_writes.add('analyses/2.json')
+    _add_track(analyzer.s3, 1, _tone())
+    _add_track(analyzer.s3, 2, _tone(frequency=330.0))
+
+    results = analyzer.analyze_tracks([1, 2], 'bucket', processes=1)
+
+    assert 'analysis' in results[1]
+    assert 'error' in results[2]
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.api.analysis.analyzer import AudioAnalyzer, ANALYSIS_STAGES
+from app.api.analysis.backends import get_backend
+from app.api.analysis.budget import AnalysisBudget
+from app.api.analysis.context import AnalysisContext
+from app.api.analysis.features import FeatureExtractor
+from app.api.analysis.graph import FeatureGraph, FeatureNode
+
+
+def _spend(budget):
+    """Move the budget's start back so all of it is used up"""
+    budget.started -= budget.seconds + 1
+
+
+def _graph(budget=None):
+    """Three independent features; tempo runs first and may spend the budget"""
+    def tempo(ctx, results):
+        if budget is not None:
+            _spend(budget)
+        return 120.0
+
+    return FeatureGraph([
+        FeatureNode('tempo', tempo, value=4.0),
+        FeatureNode('key', lambda ctx, r: 5, value=2.0),
+        FeatureNode('mode', lambda ctx, r: 1, value=1.0),
+    ], {})
+
+
+def _context(budget):
+    context = AnalysisContext(np.zeros(16, dtype=np.float32), 22050, {})
+    context.budget = budget
+    return context
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    return AudioAnalyzer(downloads_dir=str(tmp_path / 'downloads'), analysis_dir=str(tmp_path / 'analysis'),
+                         speech_recognizer='offline')
+
+
+def test_budget_without_limit_never_runs_out():
+    budget = AnalysisBudget()
+    assert budget.remaining() == float('inf')
+    assert not budget.low()
+    assert not budget.exhausted()
+
+
+def test_budget_runs_low_then_out():
+    budget = AnalysisBudget(10.0)
+    assert not budget.low()
+    budget.started -= 8.0
+    assert budget.low() and not budget.exhausted()
+    budget.started -= 4.0
+    assert budget.exhausted()
+
+
+def test_graph_skips_every_feature_once_the_budget_is_spent():
+    budget = AnalysisBudget(1.0)
+    _spend(budget)
+
+    results = _graph().execute(_context(budget))
+
+    assert results == {}
+    assert budget.degraded == {'tempo': 'skipped', 'key': 'skipped', 'mode': 'skipped'}
+
+
+def test_graph_skips_the_features_left_when_the_budget_runs_out():
+    budget = AnalysisBudget(60.0)
+
+    results = _graph(budget).execute(_context(budget))
+
+    assert results == {'tempo': 120.0}
+    assert budget.degraded == {'key': 'skipped', 'mode': 'skipped'}
+
+
+def test_concurrent_graph_skips_the_features_left_when_the_budget_runs_out():
+    budget = AnalysisBudget(60.0)
+    graph = _graph(budget)
+    # Dependent nodes are only submitted once tempo has spent the budget
+    graph.features['key'].requires = ('tempo',)
+    graph.features['mode'].requires = ('key',)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = graph.execute(_context(budget), executor=executor)
+
+    assert results == {'tempo': 120.0}
+    assert budget.degraded == {'key': 'skipped', 'mode': 'skipped'}
+
+
+def test_budgeted_outputs_are_coarsened_when_low_and_skipped_when_spent():
+    extractor = FeatureExtractor(get_backend('librosa'))
+    analyze = lambda coarse: ['coarse' if coarse else 'full']
+
+    assert extractor._budgeted('segments', None, analyze) == ['full']
+
+    budget = AnalysisBudget(10.0)
+    assert extractor._budgeted('segments', budget, analyze) == ['full']
+    budget.started -= 9.0
+    assert extractor._budgeted('segments', budget, analyze) == ['coarse']
+    budget.started -= 2.0
+    assert extractor._budgeted('tatums', budget, analyze) == []
+    assert budget.degraded == {'segments': 'coarse', 'tatums': 'skipped'}
+
+
+def test_skipped_detailed_stage_is_left_out_of_the_analysis(analyzer):
+    analysis = analyzer._compose_analysis(
+        1, 30.0, {'available_features': ['tempo'], 'tempo': 120.0}, {},
+        degraded={'detailed': 'skipped'}, detailed_analysis=None
+    )['analysis']
+
+    assert 'detailed' not in analysis['available_features']
+    assert 'segments' not in analysis
+    assert analysis['degraded'] == {'detailed': 'skipped'}
+
+
+def test_recomputed_detailed_stage_clears_its_earlier_degradations(analyzer):
+    previous = analyzer._compose_analysis(
+        1, 30.0, {'available_features': ['tempo'], 'tempo': 120.0}, {}, stages=ANALYSIS_STAGES,
+        degraded={'segments': 'coarse', 'key': 'skipped'},
+        detailed_analysis={'segments': [{'start': 0.0}], 'sections': []}
+    )
+    assert previous['analysis']['degraded'] == {'segments': 'coarse', 'key': 'skipped'}
+
+    analysis = analyzer._compose_analysis(
+        1, 30.0, {'available_features': []}, {}, stages=('detailed',), previous=previous,
+        detailed_analysis={'segments': [{'start': 0.0}, {'start': 0.5}], 'sections': []}
+    )['analysis']
+
+    assert analysis['degraded'] == {'key': 'skipped'}
+    assert len(analysis['segments']) == 2
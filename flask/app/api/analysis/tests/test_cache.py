@@ -0,0 +1,142 @@
+import os
+import time
+import numpy as np
+from app.api.analysis.audio import hash_samples
+from app.api.analysis.backends import get_backend
+from app.api.analysis.cache import FeatureCache, PCMCache
+from app.api.analysis.context import Intermediate
+from app.api.analysis.features import FeatureExtractor
+
+
+def _age(cache, key, seconds):
+    """Backdate an entry's last use"""
+    past = time.time() - seconds
+    os.utime(cache._path(key), (past, past))
+
+
+def _tone(seconds=2.0, sr=22050, frequency=440.0):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def test_feature_cache_round_trip(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    key = cache.key('0' * 32, 'librosa', 'tempo', 1)
+    assert cache.get(key) is None
+
+    cache.put(key, np.float32(120.5))
+    assert cache.get(key) == 120.5
+
+    cache.put(key, [1.0, 2.0])
+    assert cache.get(key) == [1.0, 2.0]
+
+
+def test_feature_cache_keys_by_backend_and_version(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    cache.put(cache.key('a' * 32, 'librosa', 'key', 1), 5)
+
+    assert cache.get(cache.key('a' * 32, 'librosa', 'key', 1)) == 5
+    assert cache.get(cache.key('a' * 32, 'fast', 'key', 1)) is None
+    assert cache.get(cache.key('a' * 32, 'librosa', 'key', 2)) is None
+    assert cache.get(cache.key('b' * 32, 'librosa', 'key', 1)) is None
+
+
+def test_feature_cache_ignores_unreadable_entries(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    key = cache.key('c' * 32, 'librosa', 'energy', 1)
+    cache.put(key, 0.5)
+    with open(cache._path(key), 'w') as f:
+        f.write('{"val')
+    assert cache.get(key) is None
+
+
+def test_feature_cache_evicts_least_recently_used(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    keys = [cache.key(f"{i:032d}", 'librosa', 'mfcc', 1) for i in range(5)]
+    value = [0.125] * 64
+
+    for age, key in zip((40, 30, 20, 10), keys):
+        cache.put(key, value)
+        _age(cache, key, age)
+    entry_size = os.path.getsize(cache._path(keys[0]))
+
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0]) == value
+
+    cache.max_bytes = int(entry_size * 4.5)
+    cache.put(keys[4], value)
+
+    assert cache.get(keys[1]) is None
+    for key in (keys[0], keys[2], keys[3], keys[4]):
+        assert cache.get(key) == value
+    assert sum(size for _, size, _ in cache._entries()) <= cache.max_bytes
+
+
+def test_pcm_cache_round_trip(tmp_path):
+    cache = PCMCache(str(tmp_path))
+    y = np.linspace(-1.0, 1.0, 1000, dtype=np.float32)
+    assert cache.load('track') is None
+
+    stored, sr = cache.store('track', y, 22050)
+    assert sr == 22050
+    assert isinstance(stored, np.memmap)
+    np.testing.assert_array_equal(stored, y)
+
+    loaded, sr = cache.load('track')
+    assert sr == 22050
+    np.testing.assert_array_equal(loaded, y)
+
+
+def test_pcm_cache_maps_copy_on_write(tmp_path):
+    cache = PCMCache(str(tmp_path))
+    y = np.ones(100, dtype=np.float32)
+    cache.store('track', y, 16000)
+
+    loaded, _ = cache.load('track')
+    loaded[:] = 0.0
+    reloaded, _ = cache.load('track')
+    np.testing.assert_array_equal(reloaded, y)
+
+
+def test_pcm_cache_evicts_least_recently_used(tmp_path):
+    cache = PCMCache(str(tmp_path))
+    y = np.zeros(1000, dtype=np.float32)
+    for age, key in ((30, 'first'), (20, 'second'), (10, 'third')):
+        cache.store(key, y, 8000)
+        _age(cache, f"{key}-8000", age)
+    entry_size = os.path.getsize(cache._path('first-8000'))
+
+    assert cache.load('first') is not None
+
+    cache.max_bytes = int(entry_size * 3.5)
+    cache.store('fourth', y, 8000)
+
+    assert cache.load('second') is None
+    for key in ('first', 'third', 'fourth'):
+        assert cache.load(key) is not None
+
+
+def test_failed_extractors_are_not_cached_and_recompute_next_run(tmp_path):
+    backend = get_backend('librosa')
+    extractor = FeatureExtractor(backend, cache=FeatureCache(str(tmp_path)))
+    y = _tone()
+    sample_md5 = hash_samples(y)
+    intermediates = backend.intermediates
+    failing = {'chroma_stft'}
+
+    def flaky_intermediates():
+        declared = intermediates()
+        for name in failing:
+            # An unusable chromagram makes the key extractor fall back to its default
+            declared[name] = Intermediate(lambda ctx: None)
+        return declared
+
+    backend.intermediates = flaky_intermediates
+    first = extractor.extract_features(y, 22050, features=['key', 'loudness'], sample_md5=sample_md5)
+    assert first['key'] == 0
+    assert extractor.cache.get(extractor._cache_key(backend.create_context(y, 22050), 'key')) is None
+
+    failing.clear()
+    second = extractor.extract_features(y, 22050, features=['key', 'loudness'], sample_md5=sample_md5)
+    assert second['key'] == 9
+    assert second['loudness'] == first['loudness']
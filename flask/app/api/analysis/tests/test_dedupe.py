@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from app.api.analysis.analyzer import AudioAnalyzer
+from app.api.analysis.audio import BlockReader, hash_samples
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    return AudioAnalyzer(downloads_dir=str(tmp_path / 'downloads'), analysis_dir=str(tmp_path / 'analysis'),
+                         speech_recognizer='offline')
+
+
+def _signal(seconds=2.0, sr=8000):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def _duplicate(analyzer, sample_md5, **analysis):
+    """Stored analysis of another track holding every feature"""
+    return {
+        'track_id': 1,
+        'timestamp': '2024-01-01T00:00:00',
+        'provisional': False,
+        'analysis': {
+            'sample_md5': sample_md5,
+            'available_features': analyzer.feature_names(),
+            'degraded': {},
+            'technical_features': {'tempo': 120.0},
+            **analysis
+        }
+    }
+
+
+def test_hash_samples_depends_on_the_samples_not_their_dtype():
+    y = _signal()
+    assert hash_samples(y) == hash_samples(y.astype(np.float64))
+    assert hash_samples(y) != hash_samples(y[:-1])
+    assert hash_samples(y) != hash_samples(y * 0.5)
+
+
+def test_streamed_blocks_hash_like_the_decoded_signal(tmp_path):
+    y = _signal()
+    path = str(tmp_path / 'track.wav')
+    sf.write(path, y, 8000, subtype='FLOAT')
+
+    reader = BlockReader(path, block_size=1000)
+    assert reader.sample_md5 is None
+    blocks = list(reader)
+
+    assert len(blocks) == 16
+    assert reader.sample_md5 == hash_samples(sf.read(path, dtype='float32')[0])
+
+
+def test_reuse_duplicate_copies_the_analysis_for_the_new_track(analyzer):
+    sample_md5 = hash_samples(_signal())
+    duplicate = _duplicate(analyzer, sample_md5)
+
+    analysis = analyzer._reuse_duplicate(2, sample_md5, duplicate)
+
+    assert analysis['track_id'] == 2
+    assert analysis['analysis'] == duplicate['analysis']
+    analysis['analysis']['technical_features']['tempo'] = 90.0
+    assert duplicate['analysis']['technical_features']['tempo'] == 120.0
+
+
+def test_reuse_duplicate_rejects_incomplete_or_mismatched_analyses(analyzer):
+    sample_md5 = hash_samples(_signal())
+
+    assert analyzer._reuse_duplicate(2, sample_md5, None) is None
+    assert analyzer._reuse_duplicate(2, sample_md5, {'track_id': 1}) is None
+    assert analyzer._reuse_duplicate(2, sample_md5, {**_duplicate(analyzer, sample_md5), 'provisional': True}) is None
+    assert analyzer._reuse_duplicate(2, sample_md5, _duplicate(analyzer, sample_md5, degraded={'key': 'skipped'})) is None
+    assert analyzer._reuse_duplicate(2, sample_md5, _duplicate(analyzer, '0' * 32)) is None
+
+
+def test_reuse_duplicate_requires_the_requested_features(analyzer):
+    sample_md5 = hash_samples(_signal())
+    duplicate = _duplicate(analyzer, sample_md5, available_features=['tempo', 'key', 'mood'])
+
+    assert analyzer._reuse_duplicate(2, sample_md5, duplicate) is None
+    assert analyzer._reuse_duplicate(2, sample_md5, duplicate, features=['tempo', 'voice']) is None
+    assert analyzer._reuse_duplicate(2, sample_md5, duplicate, features=['tempo', 'mood'])['track_id'] == 2
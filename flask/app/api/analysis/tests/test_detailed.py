@@ -0,0 +1,73 @@
+import json
+import pytest
+from types import SimpleNamespace
+from app.api.analysis.analyzer import AudioAnalyzer, DEFAULT_STAGES
+from app.api.analysis.services import analysis_service
+from app.api.analysis.services.analysis_service import AudioAnalysisService
+from .test_batch import _Bucket, _add_track, _tone
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = AudioAnalyzer(downloads_dir=str(tmp_path / 'downloads'), analysis_dir=str(tmp_path / 'analysis'),
+                             backend='fast', speech_recognizer='offline')
+    analyzer.s3 = _Bucket()
+    return analyzer
+
+
+def test_full_analysis_leaves_out_the_detailed_stage(analyzer):
+    assert analyzer._plan_features(None) == (None, DEFAULT_STAGES)
+    assert analyzer._plan_features({'detailed'}) == ([], ('detailed',))
+
+    # Analyses stored before feature selection hold a full analysis
+    legacy = {'analysis': {'technical_features': {'tempo': 120.0}}}
+    assert analyzer._missing_features(['tempo', 'voice'], legacy) == set()
+    assert analyzer._missing_features(['tempo', 'detailed'], legacy) == {'detailed'}
+
+
+def test_detailed_analysis_is_added_only_when_requested(analyzer):
+    _add_track(analyzer.s3, 1, _tone(seconds=6.0))
+
+    full = analyzer.analyze_track(1, 'bucket')
+    assert 'detailed' not in full['analysis']['available_features']
+    assert 'segments' not in full['analysis']
+
+    topped_up = analyzer.analyze_track(1, 'bucket', features=['detailed'])
+    assert 'detailed' in topped_up['analysis']['available_features']
+    assert topped_up['analysis']['segments']
+    assert topped_up['analysis']['technical_features'] == full['analysis']['technical_features']
+    stored = json.loads(analyzer.s3.objects['analyses/1.json'])
+    assert stored['analysis_results']['analysis']['segments'] == json.loads(json.dumps(topped_up['analysis']['segments']))
+
+
+def test_service_only_tops_up_the_detailed_stage_when_requested():
+    legacy = SimpleNamespace(status='completed', raw_analysis_data={'raw_analysis_data': {'analysis': {}}})
+    assert AudioAnalysisService.missing_features(legacy) == []
+    assert AudioAnalysisService.missing_features(legacy, ['tempo', 'detailed']) == ['detailed']
+
+
+def test_segments_are_stored_once_and_restored_for_duplicates(monkeypatch):
+    segments = [{'start': 0.0, 'duration': 0.5}, {'start': 0.5, 'duration': 0.5}]
+    results = {'analysis': {
+        'available_features': ['tempo', 'detailed'],
+        'technical_features': {'tempo': 120.0},
+        'sections': [],
+        'segments': segments
+    }}
+
+    stored = AudioAnalysisService.build_analysis_results(results)
+
+    assert stored['segments'] == segments
+    assert 'segments' not in stored['raw_analysis_data']['analysis']
+    assert stored['raw_analysis_data']['analysis']['sections'] == []
+    assert results['analysis']['segments'] == segments
+
+    duplicate = SimpleNamespace(raw_analysis_data=stored)
+    query = SimpleNamespace(filter=lambda *conditions: SimpleNamespace(
+        filter=lambda *conditions: None,
+        order_by=lambda *columns: SimpleNamespace(first=lambda: duplicate)
+    ))
+    model = SimpleNamespace(query=query, sample_md5=None, status=None, id=None)
+    monkeypatch.setattr(analysis_service, 'AudioAnalysis', model)
+
+    assert AudioAnalysisService.find_duplicate_results('a' * 32) == results
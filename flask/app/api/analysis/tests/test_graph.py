@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.api.analysis.analyzer import AudioAnalyzer
+from app.api.analysis.backends import get_backend
+from app.api.analysis.context import AnalysisContext, Intermediate
+from app.api.analysis.features import FeatureExtractor
+from app.api.analysis.graph import FeatureGraph, FeatureNode
+
+
+def _graph(calls, seen=None):
+    """Small graph: key reads chroma, tempo reads onset, both derived from stft"""
+    def intermediate(name, value):
+        def compute(ctx):
+            calls.append(name)
+            return value
+        return compute
+
+    def danceability(ctx, results):
+        if seen is not None:
+            seen.update({name: ctx.has(name) for name in ('stft', 'chroma', 'onset')})
+        return results['tempo'] * 2
+
+    intermediates = {
+        'stft': Intermediate(intermediate('stft', 1.0)),
+        'chroma': Intermediate(intermediate('chroma', 2.0), requires=('stft',)),
+        'onset': Intermediate(intermediate('onset', 3.0), requires=('stft',)),
+    }
+    features = [
+        FeatureNode('key', lambda ctx, r: ctx['chroma'] + ctx['stft'], ('chroma', 'stft'), value=1.0, cost=1.0),
+        FeatureNode('tempo', lambda ctx, r: ctx['onset'], ('onset',), value=4.0, cost=1.0),
+        FeatureNode('danceability', danceability, ('tempo', 'onset'), value=1.0, cost=4.0),
+    ]
+    return FeatureGraph(features, intermediates)
+
+
+def _context(graph):
+    return AnalysisContext(np.zeros(16, dtype=np.float32), 22050, graph.intermediates)
+
+
+def test_plan_orders_dependencies_first_and_valuable_features_early():
+    graph = _graph([])
+    assert graph.plan() == ['stft', 'onset', 'tempo', 'chroma', 'key', 'danceability']
+
+
+def test_plan_schedules_only_what_the_targets_need():
+    graph = _graph([])
+    assert graph.plan(['key']) == ['stft', 'chroma', 'key']
+    assert graph.plan(['danceability']) == ['stft', 'onset', 'tempo', 'danceability']
+
+
+def test_plan_skips_dependencies_of_available_intermediates():
+    graph = _graph([])
+    assert graph.plan(['tempo'], available=['onset']) == ['onset', 'tempo']
+
+
+def test_plan_rejects_cycles_and_unknown_names():
+    graph = FeatureGraph([FeatureNode('a', lambda ctx, r: 0, ('b',)), FeatureNode('b', lambda ctx, r: 0, ('a',))], {})
+    with pytest.raises(ValueError):
+        graph.plan()
+    with pytest.raises(ValueError):
+        _graph([]).plan(['loudness'])
+
+
+def test_execute_computes_intermediates_once_and_releases_them_after_last_use():
+    calls, seen = [], {}
+    graph = _graph(calls, seen)
+    context = _context(graph)
+
+    results = graph.execute(context)
+
+    assert results == {'tempo': 3.0, 'key': 3.0, 'danceability': 6.0}
+    assert sorted(calls) == ['chroma', 'onset', 'stft']
+    # Danceability runs last: chroma and stft were released after key, onset is still needed
+    assert seen == {'stft': False, 'chroma': False, 'onset': True}
+    assert not any(context.has(name) for name in graph.intermediates)
+
+
+def test_execute_on_an_executor_matches_the_serial_path():
+    serial = _graph([]).execute(_context(_graph([])))
+
+    calls = []
+    graph = _graph(calls)
+    context = _context(graph)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = graph.execute(context, executor=executor)
+
+    assert results == serial
+    assert sorted(calls) == ['chroma', 'onset', 'stft']
+    assert not any(context.has(name) for name in graph.intermediates)
+
+
+def test_required_sample_rate_covers_only_the_planned_extractors():
+    extractor = FeatureExtractor(get_backend('librosa'))
+
+    assert extractor.required_sample_rate() == 22050
+    assert extractor.required_sample_rate(['tempo', 'key']) == 11025
+    assert extractor.required_sample_rate(['tempo', 'valence']) == 22050
+    assert extractor.required_sample_rate([]) == 0
+
+
+def test_analysis_rate_follows_the_requested_features(tmp_path):
+    analyzer = AudioAnalyzer(downloads_dir=str(tmp_path / 'downloads'), analysis_dir=str(tmp_path / 'analysis'),
+                             speech_recognizer='offline', sample_rate=8000)
+
+    assert analyzer._analysis_rate(44100) == 22050
+    assert analyzer._analysis_rate(44100, ['tempo', 'loudness']) == 11025
+    assert analyzer._analysis_rate(44100, []) == 8000
+    assert analyzer._analysis_rate(16000) == 16000
@@ -0,0 +1,62 @@
+import math
+import numpy as np
+import pytest
+from app.api.analysis.mood import MoodAnalyzer
+
+
+FEATURES = [
+    {'energy': 0.9, 'valence': 0.8, 'tempo': 140.0, 'loudness': -5.0, 'speechiness': 0.1},
+    {'energy': 0.2, 'valence': 0.3, 'tempo': 70.0, 'loudness': -20.0, 'speechiness': 0.05},
+    {'energy': 0.6, 'valence': 0.55, 'tempo': 100.0, 'loudness': -12.0, 'speechiness': 0.4},
+    {'energy': 0.05, 'valence': 0.9, 'tempo': 60.0, 'loudness': -35.0, 'speechiness': 0.02},
+    {'energy': 1.0, 'valence': 0.1, 'tempo': 190.0, 'loudness': 0.0, 'speechiness': 0.9},
+]
+
+
+def _score_one(analyzer, features):
+    """Closest moods of one track computed tag by tag, as the scalar analyzer did"""
+    arousal = (features['energy'] * 0.4 + features['tempo'] / 200.0 * 0.25 +
+               (features['loudness'] + 60) / 60.0 * 0.25 + features['speechiness'] * 0.1)
+    arousal = max(0.0, min(1.0, arousal))
+    distances = [
+        (math.hypot(features['valence'] - valence, arousal - tag_arousal), name)
+        for name, (valence, tag_arousal) in zip(analyzer.tag_names, analyzer.tag_coordinates)
+    ]
+    closest = sorted(distances, key=lambda item: item[0])[:5]
+    confidence = max(0.0, min(1.0, 1.0 - np.mean([distance for distance, _ in closest[:3]])))
+    return arousal, closest, confidence
+
+
+@pytest.fixture
+def analyzer():
+    return MoodAnalyzer()
+
+
+def test_analyze_batch_matches_scoring_each_track_on_its_own(analyzer):
+    rows = [[features[name] for name in analyzer.requirements()] for features in FEATURES]
+
+    batch = analyzer.analyze_batch(rows)
+
+    assert len(batch) == len(FEATURES)
+    for features, scores in zip(FEATURES, batch):
+        assert scores == analyzer.analyze(features)
+        arousal, closest, confidence = _score_one(analyzer, features)
+        assert scores['arousal'] == pytest.approx(arousal)
+        assert [mood['mood'] for mood in scores['closest_moods']] == [name for _, name in closest]
+        assert [mood['distance'] for mood in scores['closest_moods']] == pytest.approx(
+            [distance for distance, _ in closest]
+        )
+        assert scores['confidence'] == pytest.approx(confidence)
+        assert scores['primary_mood'] == closest[0][1]
+
+
+def test_analyze_batch_gives_rows_with_missing_features_default_scores(analyzer):
+    rows = [[features[name] for name in analyzer.requirements()] for features in FEATURES[:2]]
+    rows.insert(1, [0.5, np.nan, 120.0, -10.0, 0.1])
+
+    batch = analyzer.analyze_batch(rows)
+
+    assert batch[1] == analyzer._get_default_mood_scores()
+    assert batch[1] == analyzer.analyze({**FEATURES[0], 'valence': None})
+    assert batch[0] == analyzer.analyze(FEATURES[0])
+    assert batch[2] == analyzer.analyze(FEATURES[1])
@@ -0,0 +1,47 @@
+import pytest
+from types import SimpleNamespace
+from app.api.analysis.services.analysis_service import AudioAnalysisService
+from app.celery import celery_tasks
+
+
+def _previewed_analysis():
+    """Analysis still processing, with the provisional results of an excerpt published"""
+    return SimpleNamespace(
+        id=3,
+        status='processing',
+        progress=40,
+        current_step='Provisional results available',
+        error_message=None,
+        raw_analysis_data={'tempo': 118.0, 'provisional': True}
+    )
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    analysis = _previewed_analysis()
+    monkeypatch.setattr(AudioAnalysisService, 'get', staticmethod(lambda id: analysis))
+    return analysis
+
+
+def test_discard_provisional_results_keeps_full_results(session, analysis):
+    analysis.raw_analysis_data = {'tempo': 120.0, 'provisional': False}
+    AudioAnalysisService.discard_provisional_results(3)
+    assert analysis.raw_analysis_data == {'tempo': 120.0, 'provisional': False}
+
+    analysis.raw_analysis_data = {'tempo': 118.0, 'provisional': True}
+    AudioAnalysisService.discard_provisional_results(3)
+    assert analysis.raw_analysis_data is None
+
+
+def test_failed_analysis_discards_its_preview(monkeypatch, session, analysis):
+    def broken_analyzer():
+        raise RuntimeError('Decoder crashed')
+
+    monkeypatch.setattr(celery_tasks, 'get_analyzer', broken_analyzer)
+
+    with pytest.raises(RuntimeError):
+        celery_tasks.analyze_audio.run(3, 1)
+
+    assert analysis.status == 'failed'
+    assert analysis.error_message == 'Decoder crashed'
+    assert analysis.raw_analysis_data is None
@@ -0,0 +1,141 @@
+import threading
+import numpy as np
+import pytest
+import soundfile as sf
+from app.api.analysis.analyzer import AudioAnalyzer
+from app.api.analysis.audio import BlockReader, PrefetchBuffer, hash_samples
+from app.api.analysis.backends import get_backend
+from app.api.analysis.features import FeatureExtractor
+
+
+def _write(tmp_path, seconds, sr, channels=1):
+    """Write a tone with a different level per channel and return its path and samples"""
+    t = np.arange(int(seconds * sr)) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 220 * t)
+    y = np.stack([tone * (channel + 1) / channels for channel in range(channels)], axis=1).astype(np.float32)
+    path = str(tmp_path / f"track-{channels}.wav")
+    sf.write(path, y, sr, subtype='FLOAT')
+    return path, y
+
+
+class _SlowStream:
+    """Byte stream that hands out its first chunk, then stalls until released"""
+
+    def __init__(self, data, chunk):
+        self.data = data
+        self.chunk = chunk
+        self.released = threading.Event()
+        self.closed = False
+
+    def read(self, size):
+        if self.chunk is None:
+            self.released.wait(5.0)
+        data, self.data = self.data[:size], self.data[size:]
+        self.chunk = None
+        return data
+
+    def close(self):
+        self.closed = True
+
+
+def test_block_reader_downmixes_stereo_to_the_channel_mean(tmp_path):
+    path, y = _write(tmp_path, 1.0, 8000, channels=2)
+
+    reader = BlockReader(path, block_size=1024)
+    streamed = np.concatenate(list(reader))
+
+    assert reader.sr == 8000
+    np.testing.assert_allclose(streamed, y.mean(axis=1), atol=1e-6)
+
+
+def test_block_reader_resamples_to_the_target_rate(tmp_path):
+    path, _ = _write(tmp_path, 2.0, 44100)
+
+    reader = BlockReader(path, target_sr=22050, block_size=4096)
+    streamed = np.concatenate(list(reader))
+
+    assert reader.sr == 22050
+    assert abs(len(streamed) - 2 * 22050) <= 2
+    assert reader.sample_md5 == hash_samples(streamed)
+
+
+def test_block_reader_never_upsamples(tmp_path):
+    path, _ = _write(tmp_path, 1.0, 8000)
+    assert BlockReader(path, target_sr=22050).sr == 8000
+
+
+def test_block_reader_keeps_a_centered_excerpt(tmp_path):
+    path, y = _write(tmp_path, 4.0, 8000)
+
+    reader = BlockReader(path, block_size=1000, excerpt_seconds=1.0)
+    list(reader)
+
+    np.testing.assert_array_equal(reader.excerpt, y[12000:20000, 0])
+
+
+def test_prefetch_buffer_reads_the_stream_as_it_arrives():
+    stream = _SlowStream(bytes(range(200)), chunk=100)
+    stream.released.set()
+
+    with PrefetchBuffer(stream, 200, chunk_size=100) as buffer:
+        assert buffer.read(50) == bytes(range(50))
+        buffer.seek(150)
+        assert buffer.read() == bytes(range(150, 200))
+    buffer._thread.join(5.0)
+    assert stream.closed
+
+
+def test_closing_a_prefetch_buffer_stops_its_download():
+    stream = _SlowStream(bytes(300), chunk=100)
+    errors = []
+
+    def read_ahead():
+        try:
+            buffer.read(100)
+        except IOError as e:
+            errors.append(e)
+
+    buffer = PrefetchBuffer(stream, 300, chunk_size=100)
+    assert len(buffer.read(100)) == 100
+    waiter = threading.Thread(target=read_ahead)
+    waiter.start()
+    buffer.close()
+    waiter.join(5.0)
+    assert not waiter.is_alive()
+    assert len(errors) == 1
+
+    # The copy stops after the read in progress and releases the stream
+    stream.released.set()
+    buffer._thread.join(5.0)
+    assert not buffer._thread.is_alive()
+    assert stream.closed
+    assert buffer._filled == 200
+
+
+def test_streaming_is_off_unless_a_minimum_duration_is_set(tmp_path):
+    path, _ = _write(tmp_path, 2.0, 8000)
+    analyzer = AudioAnalyzer(downloads_dir=str(tmp_path / 'downloads'), analysis_dir=str(tmp_path / 'analysis'),
+                             speech_recognizer='offline')
+    assert not analyzer._use_streaming(path)
+
+    analyzer.streaming_min_duration = 1.0
+    assert analyzer._use_streaming(path)
+    analyzer.streaming_min_duration = 3.0
+    assert not analyzer._use_streaming(path)
+
+
+def test_streaming_extraction_yields_the_same_features(tmp_path):
+    path, y = _write(tmp_path, 8.0, 22050)
+    extractor = FeatureExtractor(get_backend('librosa'))
+
+    full = extractor.extract_features(y[:, 0], 22050)
+    streamed = extractor.extract_streaming_features(BlockReader(path, block_size=22050), 22050)
+
+    assert streamed['available_features'] == full['available_features']
+    # Frame-level summaries line up with the in-memory STFT frames
+    for name in ('tempo', 'energy', 'loudness', 'key', 'mode', 'time_signature', 'acousticness',
+                 'instrumentalness', 'speechiness', 'danceability'):
+        assert streamed[name] == pytest.approx(full[name], rel=1e-3), name
+    # The chord profile and tonnetz are approximated from the streamed chroma
+    for name in ('valence', 'liveness'):
+        assert streamed[name] == pytest.approx(full[name], abs=0.25), name
@@ -0,0 +1,77 @@
+import pytest
+from types import SimpleNamespace
+from app.api.analysis.features import FEATURE_NAMES
+from app.api.analysis.services import analysis_service
+from app.api.analysis.services.analysis_service import AudioAnalysisService, TOP_UP_STEP
+from app.celery import celery_tasks
+
+
+def _subset_analysis(features=('tempo', 'key')):
+    """Completed analysis that was run for a subset of the features"""
+    technical_features = {name: 1.0 for name in features}
+    return SimpleNamespace(
+        id=5,
+        status='completed',
+        task_id=None,
+        current_step='Analysis completed',
+        raw_analysis_data={'raw_analysis_data': {'analysis': {
+            'available_features': list(features),
+            'technical_features': technical_features
+        }}}
+    )
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    analysis = _subset_analysis()
+    query = SimpleNamespace(filter_by=lambda id: SimpleNamespace(
+        with_for_update=lambda: SimpleNamespace(first=lambda: analysis)
+    ))
+    monkeypatch.setattr(analysis_service, 'AudioAnalysis', SimpleNamespace(query=query))
+    return analysis
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    queued = []
+
+    def delay(*args):
+        queued.append(args)
+        return SimpleNamespace(id=f"task-{len(queued)}")
+
+    monkeypatch.setattr(celery_tasks.analyze_audio, 'delay', delay, raising=False)
+    return queued
+
+
+def test_missing_features_lists_what_a_subset_analysis_lacks(analysis):
+    assert AudioAnalysisService.missing_features(analysis, ['tempo']) == []
+    assert AudioAnalysisService.missing_features(analysis, ['tempo', 'energy', 'energy']) == ['energy']
+    assert AudioAnalysisService.missing_features(analysis, FEATURE_NAMES) == [
+        name for name in FEATURE_NAMES if name not in ('tempo', 'key')
+    ]
+
+    analysis.status = 'processing'
+    assert AudioAnalysisService.missing_features(analysis, ['energy']) == []
+
+
+def test_missing_features_of_analyses_stored_before_feature_selection(analysis):
+    del analysis.raw_analysis_data['raw_analysis_data']['analysis']['available_features']
+    assert AudioAnalysisService.missing_features(analysis, ['energy']) == []
+
+
+def test_request_missing_features_enqueues_a_single_top_up(monkeypatch, session, analysis, queued):
+    running = SimpleNamespace(ready=lambda: False)
+    monkeypatch.setattr(analysis_service, 'AsyncResult', lambda task_id: running)
+
+    AudioAnalysisService.request_missing_features(analysis, ['energy'])
+    AudioAnalysisService.request_missing_features(analysis, ['energy'])
+
+    assert queued == [(5, None, ['energy'])]
+    assert analysis.task_id == 'task-1'
+    assert analysis.current_step == TOP_UP_STEP
+    assert analysis.status == 'completed'
+
+    # Once the top-up has finished, the next request may enqueue another
+    running.ready = lambda: True
+    AudioAnalysisService.request_missing_features(analysis, ['energy'])
+    assert len(queued) == 2
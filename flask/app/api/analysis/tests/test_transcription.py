@@ -0,0 +1,109 @@
+import pytest
+from types import SimpleNamespace
+from app.api.analysis import MoodAnalyzer
+from app.api.analysis.services import analysis_service
+from app.api.analysis.services.analysis_service import AudioAnalysisService
+from app.celery import celery_tasks
+
+
+class _Analyzer:
+    """Stand-in for the worker's analyzer, returning canned speech features"""
+
+    def __init__(self, speech_features):
+        self.speech_features = speech_features
+        self.calls = []
+
+    def transcribe_track(self, track_id, bucket_name, regions):
+        self.calls.append((track_id, bucket_name, regions))
+        return self.speech_features
+
+
+def _pending_analysis():
+    """Stored analysis whose voice analysis left two vocal regions to transcribe"""
+    voice_features = {
+        'has_voice': True,
+        'speech_regions': [[0.0, 1.5], [3.0, 4.0]],
+        'transcribed_text': None,
+        'transcription': 'pending'
+    }
+    results = {'analysis': {'technical_features': {'tempo': 120.0}, 'voice_features': dict(voice_features)}}
+    return SimpleNamespace(
+        id=7,
+        status='completed',
+        raw_analysis_data={
+            'tempo': 120.0,
+            'voice_characteristics': voice_features,
+            'raw_analysis_data': results
+        }
+    )
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    analysis = _pending_analysis()
+    monkeypatch.setattr(AudioAnalysisService, 'get', staticmethod(lambda id: analysis))
+    return analysis
+
+
+def test_voice_features_pending_only_for_deferred_transcriptions():
+    assert celery_tasks.voice_features_pending(
+        {'analysis': {'voice_features': {'transcription': 'pending'}}}
+    )
+    assert not celery_tasks.voice_features_pending(
+        {'analysis': {'voice_features': {'transcription': 'skipped'}}}
+    )
+    assert not celery_tasks.voice_features_pending({'analysis': {'voice_features': {'transcribed_text': 'hi'}}})
+    assert not celery_tasks.voice_features_pending({'analysis': {'voice_features': None}})
+    assert not celery_tasks.voice_features_pending({'error': 'Analysis failed'})
+
+
+def test_transcribe_audio_merges_the_transcript_into_the_stored_analysis(monkeypatch, session, analysis):
+    analyzer = _Analyzer({'transcribed_text': 'hello there', 'speech_rate': 2.5, 'transcription': 'completed'})
+    monkeypatch.setattr(celery_tasks, 'get_analyzer', lambda: analyzer)
+
+    assert celery_tasks.transcribe_audio.run(7) == {'status': 'completed', 'analysis_id': 7}
+
+    assert analyzer.calls == [(7, 'bucket', [[0.0, 1.5], [3.0, 4.0]])]
+    for voice_features in (analysis.raw_analysis_data['voice_characteristics'],
+                           analysis.raw_analysis_data['raw_analysis_data']['analysis']['voice_features']):
+        assert voice_features['transcribed_text'] == 'hello there'
+        assert voice_features['transcription'] == 'completed'
+        assert voice_features['speech_regions'] == [[0.0, 1.5], [3.0, 4.0]]
+    assert session.added == [analysis]
+    assert session.commits == 1
+
+
+def test_transcribe_audio_marks_failed_transcriptions(monkeypatch, session, analysis):
+    monkeypatch.setattr(celery_tasks, 'get_analyzer', lambda: _Analyzer({'error': 'Audio file not found'}))
+
+    with pytest.raises(Exception, match='Audio file not found'):
+        celery_tasks.transcribe_audio.run(7)
+
+    assert analysis.raw_analysis_data['voice_characteristics']['transcription'] == 'failed'
+    assert analysis.raw_analysis_data['voice_characteristics']['transcribed_text'] is None
+    assert session.rollbacks == 1
+    assert session.commits == 1
+
+
+def test_rescore_moods_matches_scoring_each_analysis_on_its_own(monkeypatch, session):
+    rows = [
+        {'energy': 0.9, 'valence': 0.8, 'tempo': 140.0, 'loudness': -5.0, 'speechiness': 0.1},
+        {'energy': 0.2, 'valence': 0.3, 'tempo': 70.0, 'loudness': -20.0, 'speechiness': 0.05},
+    ]
+    analyses = [
+        SimpleNamespace(status='completed', raw_analysis_data={**row, 'raw_analysis_data': {'analysis': {}}})
+        for row in rows
+    ]
+    incomplete = SimpleNamespace(status='completed', raw_analysis_data={'energy': 0.5})
+    query = SimpleNamespace(filter_by=lambda status: SimpleNamespace(all=lambda: analyses + [incomplete]))
+    monkeypatch.setattr(analysis_service, 'AudioAnalysis', SimpleNamespace(query=query))
+
+    assert AudioAnalysisService.rescore_moods() == analyses
+
+    for row, analysis in zip(rows, analyses):
+        expected = MoodAnalyzer().analyze(row)
+        assert analysis.raw_analysis_data['mood'] == expected['primary_mood']
+        assert analysis.raw_analysis_data['mood_confidence'] == pytest.approx(expected['confidence'])
+        assert analysis.raw_analysis_data['raw_analysis_data']['analysis']['mood_scores'] == expected
+    assert incomplete.raw_analysis_data == {'energy': 0.5}
+    assert session.added == analyses
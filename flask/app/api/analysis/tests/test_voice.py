@@ -0,0 +1,152 @@
+import threading
+import time
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+from app.api.analysis.speech import OfflineSpeechRecognizer
+from app.api.analysis.voice import VoiceAnalyzer
+
+
+def _tone(frequency, seconds=2.0, sr=22050):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+class _Recognizer(OfflineSpeechRecognizer):
+    """Offline recognizer that records its calls and can hold them until released"""
+
+    def __init__(self, transcript=None, block=False):
+        super().__init__(transcript)
+        self.calls = []
+        self.released = threading.Event()
+        if not block:
+            self.released.set()
+
+    def recognize(self, pcm, sample_rate, timeout):
+        self.calls.append((pcm, sample_rate, timeout))
+        self.released.wait(5.0)
+        return super().recognize(pcm, sample_rate, timeout)
+
+
+def _f0_per_frame(analyzer, y, sr, frames):
+    """Pitch of each frame computed one frame at a time, as the per-frame loop did"""
+    factor = 1
+    while factor < 8 and sr / (4 * factor) >= 2 * analyzer.fmax:
+        factor *= 2
+    if factor > 1:
+        y = resample_poly(y, 1, factor).astype(np.float32)
+    sr_low = sr / factor
+    hop_length = analyzer.hop_length // factor
+    win_length = analyzer.n_fft // factor
+    padded = np.pad(y, win_length // 2)
+    min_lag = max(1, int(sr_low / analyzer.fmax))
+    max_lag = min(win_length - 2, int(sr_low / analyzer.fmin))
+
+    f0 = []
+    for frame in frames:
+        window = padded[frame * hop_length:frame * hop_length + win_length]
+        if len(window) < win_length:
+            break
+        window = window - window.mean()
+        autocorr = np.correlate(window, window, mode='full')[win_length - 1:]
+        if autocorr[0] > 0:
+            autocorr = autocorr / autocorr[0]
+        # Interpolated lag and height of every local maximum
+        peaks = []
+        for lag in range(min_lag, max_lag + 1):
+            left, center, right = autocorr[lag - 1], autocorr[lag], autocorr[lag + 1]
+            if center >= left and center > right:
+                curvature = left - 2 * center + right
+                offset = 0.5 * (left - right) / curvature if curvature < 0 else 0.0
+                peaks.append((lag + offset, center - 0.25 * (left - right) * offset))
+        if not peaks:
+            f0.append(0.0)
+            continue
+        highest = max(height for _, height in peaks)
+        lag, height = next(peak for peak in peaks if peak[1] >= 0.9 * highest)
+        f0.append(sr_low / lag if height >= 0.5 else 0.0)
+    return np.array(f0, dtype=np.float32)
+
+
+@pytest.fixture
+def analyzer():
+    return VoiceAnalyzer(recognizer=OfflineSpeechRecognizer())
+
+
+def test_f0_track_matches_the_per_frame_loop(analyzer):
+    rng = np.random.default_rng(0)
+    sr = 22050
+    # Voiced, noisy and silent stretches, so some frames are not periodic
+    y = np.concatenate([_tone(180.0, 1.0), 0.3 * rng.standard_normal(sr).astype(np.float32),
+                        np.zeros(sr // 2, dtype=np.float32), _tone(440.0, 1.0)])
+    frames = np.arange(0, 1 + len(y) // analyzer.hop_length, 3)
+
+    vectorized = analyzer._f0_track(y, sr, frames)
+    expected = _f0_per_frame(analyzer, y, sr, frames)
+
+    assert len(vectorized) == len(expected)
+    np.testing.assert_allclose(vectorized, expected, rtol=1e-3, atol=1e-3)
+    assert (vectorized == 0).any() and (vectorized > 0).any()
+
+
+@pytest.mark.parametrize('frequency', [80.0, 110.0, 220.0, 440.0, 523.25, 1000.0])
+def test_f0_track_finds_the_pitch_of_a_tone(analyzer, frequency):
+    f0 = analyzer._f0_track(_tone(frequency), 22050, np.arange(4, 60))
+    assert np.median(f0) == pytest.approx(frequency, rel=0.01)
+
+
+def test_f0_track_without_frames_is_empty(analyzer):
+    assert len(analyzer._f0_track(_tone(220.0), 22050, np.array([], dtype=int))) == 0
+
+
+def test_vocal_regions_are_capped_to_the_speech_seconds():
+    analyzer = VoiceAnalyzer(recognizer=OfflineSpeechRecognizer(), max_speech_seconds=1.5)
+    sr = 22050
+    frames_per_second = sr // analyzer.hop_length
+    # Two voiced runs of about two seconds, a second apart
+    voiced = np.r_[np.arange(0, 2 * frames_per_second), np.arange(3 * frames_per_second, 5 * frames_per_second)]
+
+    regions = analyzer._vocal_regions(voiced, sr, 6 * sr)
+
+    assert regions == [(0, int(1.5 * sr))]
+    analyzer.max_speech_seconds = 3.0
+    regions = analyzer._vocal_regions(voiced, sr, 6 * sr)
+    assert len(regions) == 2
+    assert sum(end - start for start, end in regions) == 3 * sr
+
+
+def test_transcribe_sends_the_segments_as_in_memory_pcm():
+    recognizer = _Recognizer('this is a short sentence in plain english')
+    analyzer = VoiceAnalyzer(recognizer=recognizer)
+    segments = [_tone(220.0, 1.0), _tone(330.0, 0.5)]
+
+    speech = analyzer.transcribe(segments, 22050, timeout=3.0)
+
+    [(pcm, sample_rate, timeout)] = recognizer.calls
+    assert isinstance(pcm, bytes)
+    assert sample_rate == analyzer.speech_sample_rate
+    assert timeout == 3.0
+    # 16-bit samples of both segments and the pause between them, at 16 kHz
+    assert len(pcm) == 2 * round(1.7 * analyzer.speech_sample_rate)
+    assert speech['transcribed_text'] == 'this is a short sentence in plain english'
+    assert speech['detected_language'] == 'en'
+
+
+def test_offline_recognizer_transcribes_nothing_by_default(analyzer):
+    assert analyzer.transcribe([_tone(220.0, 1.0)], 22050) == {'detected_language': None, 'transcribed_text': None}
+    assert OfflineSpeechRecognizer().recognize(b'\x00\x00', 16000, 1.0) is None
+
+
+def test_transcribe_gives_up_when_the_recognizer_overruns_its_timeout():
+    recognizer = _Recognizer('too late', block=True)
+    analyzer = VoiceAnalyzer(recognizer=recognizer)
+    try:
+        started = time.monotonic()
+        speech = analyzer.transcribe([_tone(220.0, 1.0)], 22050, timeout=0.1)
+        elapsed = time.monotonic() - started
+    finally:
+        recognizer.released.set()
+
+    assert speech == {'detected_language': None, 'transcribed_text': None}
+    assert recognizer.calls[0][2] == 0.1
+    assert elapsed < 2.0
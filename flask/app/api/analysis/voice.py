@@ -1,21 +1,58 @@
-import os
+import math
 import numpy as np
 import librosa
-import speech_recognition as sr
 from langdetect import detect
-import soundfile as sf
-import tempfile
-from typing import Dict, Any
+import scipy.fft
+from scipy.signal import resample_poly
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, List, Optional, Tuple
+from .budget import AnalysisBudget
+from .context import AnalysisContext
+from .speech import SpeechRecognizer, GoogleSpeechRecognizer
 
 class VoiceAnalyzer:
     """Component for analyzing voice characteristics in audio using librosa"""
     
-    def __init__(self):
-        """Initialize voice analyzer with speech recognizer"""
-        self.recognizer = sr.Recognizer()
+    # Frame grid shared with the feature backends
+    n_fft = 2048
+    hop_length = 512
+    # Fundamental frequency range of the singing/speaking voice
+    fmin = 65.0
+    fmax = 1100.0
 
-    def analyze(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
-        """Analyze voice characteristics"""
+    # Rate and region shaping of the audio sent to the speech recognizer
+    speech_sample_rate = 16000
+    region_gap = 0.3
+    min_region = 0.5
+    # Shortest recognizer timeout worth waiting for under a compute budget
+    min_speech_timeout = 1.0
+
+    def __init__(self, recognizer: Optional[SpeechRecognizer] = None,
+                 max_speech_seconds: float = 30.0, speech_timeout: float = 10.0,
+                 defer_transcription: bool = False):
+        """Initialize voice analyzer with speech recognizer, audio cap and time budget
+
+        With defer_transcription, analyze only records the vocal regions and
+        leaves transcription to a follow-up stage.
+        """
+        self.recognizer = recognizer or GoogleSpeechRecognizer()
+        self.max_speech_seconds = max_speech_seconds
+        self.speech_timeout = speech_timeout
+        self.defer_transcription = defer_transcription
+
+    def requirements(self) -> Tuple[str, ...]:
+        """Intermediates read from a shared analysis context"""
+        return ('stft', 'rms')
+
+    def analyze(self, y: np.ndarray, sr: int, context: Optional[AnalysisContext] = None,
+                budget: Optional[AnalysisBudget] = None) -> Dict[str, Any]:
+        """Analyze voice characteristics
+
+        Spectral frames and RMS are taken from the analysis context when one
+        is given, so voice analysis does not repeat the feature STFT. Under a
+        budget (given, or carried by the context) transcription gets at most
+        the time left and is skipped when too little remains.
+        """
         try:
             voice_features = {}
             
@@ -23,16 +60,21 @@ class VoiceAnalyzer:
             if len(y.shape) > 1:
                 y = librosa.to_mono(y)
             
-            # Analyze pitch using librosa
-            pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+            if budget is None and context is not None:
+                budget = context.budget
+            if context is not None:
+                S, rms = context['stft'], context['rms']
+            else:
+                S = np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length))
+                rms = librosa.feature.rms(y=y)[0]
+            spec_flat = librosa.feature.spectral_flatness(S=S)[0]
             
-            # Get pitch statistics where magnitude is strongest
-            pitch_values = []
-            for time_idx in range(pitches.shape[1]):
-                max_mag_idx = magnitudes[:, time_idx].argmax()
-                pitch = pitches[max_mag_idx, time_idx]
-                if pitch > 0:  # Filter out zero pitches
-                    pitch_values.append(pitch)
+            # Track pitch only in frames where a voice is plausible
+            candidates = self._voice_candidates(S, rms, spec_flat, sr)
+            frames = np.flatnonzero(candidates)
+            f0 = self._f0_track(y, sr, frames)
+            pitch_values = f0[f0 > 0]  # Filter out unvoiced frames
+            voiced_frames = frames[:len(f0)][f0 > 0]
                     
             if len(pitch_values) > 0:
                 pitch_stats = {
@@ -48,7 +90,6 @@ class VoiceAnalyzer:
                 voice_features['pitch_stats'] = pitch_stats
                 
                 # Analyze intensity using RMS energy
-                rms = librosa.feature.rms(y=y)[0]
                 voice_features['intensity'] = {
                     'mean': float(np.mean(rms)),
                     'min': float(np.min(rms)),
@@ -56,7 +97,6 @@ class VoiceAnalyzer:
                 }
                 
                 # Analyze harmonicity using spectral flatness
-                spec_flat = librosa.feature.spectral_flatness(y=y)[0]
                 voice_features['harmonicity'] = {
                     'mean': float(np.mean(spec_flat)),
                     'min': float(np.min(spec_flat)),
@@ -64,8 +104,28 @@ class VoiceAnalyzer:
                 }
                 
                 # Try speech recognition
-                speech_features = self._analyze_speech(y, sr)
-                voice_features.update(speech_features)
+                regions = self._vocal_regions(voiced_frames, sr, len(y))
+                voice_features['speech_regions'] = [
+                    [round(start / sr, 3), round(end / sr, 3)] for start, end in regions
+                ]
+                if self.defer_transcription:
+                    # A follow-up stage transcribes the regions and patches these fields
+                    voice_features.update({
+                        'detected_language': None,
+                        'transcribed_text': None,
+                        'transcription': 'pending' if regions else 'skipped'
+                    })
+                else:
+                    timeout = self._speech_budget(budget)
+                    if timeout is None:
+                        voice_features.update({
+                            'detected_language': None,
+                            'transcribed_text': None,
+                            'transcription': 'skipped'
+                        })
+                    else:
+                        speech_features = self._analyze_speech(y, sr, regions, timeout)
+                        voice_features.update(speech_features)
             else:
                 voice_features = self._get_default_features()
                 voice_features['has_voice'] = False
@@ -77,6 +137,73 @@ class VoiceAnalyzer:
             print(f"Error analyzing voice: {str(e)}")
             return self._get_default_features()
 
+    def _voice_candidates(self, S: np.ndarray, rms: np.ndarray, spec_flat: np.ndarray, sr: int) -> np.ndarray:
+        """Frames with audible, tonal energy concentrated in the vocal band"""
+        frequencies = np.fft.rfftfreq(self.n_fft, d=1.0 / sr)
+        vocal_band = (frequencies >= self.fmin) & (frequencies <= 4 * self.fmax)
+        power = np.square(S)
+        total = power.sum(axis=0)
+        band_ratio = power[vocal_band].sum(axis=0) / np.where(total > 0, total, 1)
+        
+        num_frames = min(len(rms), len(spec_flat), len(band_ratio))
+        return (
+            (band_ratio[:num_frames] >= 0.5)
+            & (spec_flat[:num_frames] <= 0.3)
+            & (rms[:num_frames] >= 0.05 * np.max(rms))
+        )
+
+    def _f0_track(self, y: np.ndarray, sr: int, frames: np.ndarray) -> np.ndarray:
+        """Autocorrelation F0 of selected frames on a band-limited, decimated signal
+
+        Returns one value per selected frame, 0 where the frame is not periodic.
+        """
+        if len(frames) == 0:
+            return np.zeros(0, dtype=np.float32)
+        
+        # Decimate by a power of two that keeps the frame grid aligned while
+        # the Nyquist frequency stays at least twice the highest fundamental
+        factor = 1
+        while factor < 8 and sr / (4 * factor) >= 2 * self.fmax:
+            factor *= 2
+        if factor > 1:
+            y = resample_poly(y, 1, factor).astype(np.float32)
+        sr_low = sr / factor
+        hop_length = self.hop_length // factor
+        win_length = self.n_fft // factor
+        
+        padded = np.pad(y, win_length // 2)
+        windows = np.lib.stride_tricks.sliding_window_view(padded, win_length)[::hop_length]
+        frames = frames[frames < len(windows)]
+        selected = windows[frames]
+        selected = selected - selected.mean(axis=1, keepdims=True)
+        
+        # Normalized autocorrelation of every selected frame at once
+        size = scipy.fft.next_fast_len(2 * win_length)
+        autocorr = scipy.fft.irfft(np.abs(scipy.fft.rfft(selected, size, axis=1)) ** 2, size, axis=1)[:, :win_length]
+        energy = autocorr[:, :1]
+        autocorr = autocorr / np.where(energy > 0, energy, 1)
+        
+        min_lag = max(1, int(sr_low / self.fmax))
+        max_lag = min(win_length - 2, int(sr_low / self.fmin))
+        left = autocorr[:, min_lag - 1:max_lag]
+        center = autocorr[:, min_lag:max_lag + 1]
+        right = autocorr[:, min_lag + 1:max_lag + 2]
+        # Only local maxima are candidate periods; a slope at the edge of the range is not
+        peaks = (center >= left) & (center > right)
+        
+        # Parabolic interpolation of every candidate's lag and height
+        curvature = left - 2 * center + right
+        offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0)
+        heights = np.where(peaks, center - 0.25 * (left - right) * offset, -np.inf)
+        
+        # Multiples of the period peak nearly as high, so take the first peak close to the highest
+        first = np.argmax(heights >= 0.9 * heights.max(axis=1, keepdims=True), axis=1)[:, np.newaxis]
+        peak = np.take_along_axis(heights, first, axis=1)[:, 0]
+        lag = min_lag + first[:, 0] + np.take_along_axis(offset, first, axis=1)[:, 0]
+        
+        f0 = sr_low / lag
+        return np.where(peak >= 0.5, f0, 0).astype(np.float32)
+
     def _determine_voice_type(self, mean_pitch: float) -> str:
         """Determine voice type based on mean pitch"""
         if mean_pitch < 165:
@@ -86,52 +213,96 @@ class VoiceAnalyzer:
         else:
             return 'ambiguous'
 
-    def _analyze_speech(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
-        """Analyze speech characteristics"""
+    def _speech_budget(self, budget: Optional[AnalysisBudget]) -> Optional[float]:
+        """Recognizer timeout the remaining budget allows, or None to skip transcription"""
+        if budget is None or budget.remaining() >= self.speech_timeout:
+            return self.speech_timeout
+        if budget.remaining() < self.min_speech_timeout:
+            budget.degrade('transcription', 'skipped')
+            return None
+        budget.degrade('transcription', 'shortened')
+        return budget.remaining()
+
+    def _analyze_speech(self, y: np.ndarray, sr: int, regions: Optional[List[Tuple[int, int]]] = None,
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Analyze speech characteristics of the given sample ranges"""
+        if regions is None:
+            regions = [(0, min(len(y), int(self.max_speech_seconds * sr)))]
+        return self.transcribe([y[start:end] for start, end in regions], sr, timeout)
+
+    def transcribe(self, segments: List[np.ndarray], sr: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Transcribe vocal segments and detect their language
+
+        Segments are sent as in-memory 16-bit PCM. The recognizer gets at most
+        timeout (by default speech_timeout) seconds; past that the stage gives
+        up and reports no transcription.
+        """
+        timeout = self.speech_timeout if timeout is None else timeout
+        no_speech = {
+            'detected_language': None,
+            'transcribed_text': None
+        }
         try:
-            # Create a temporary WAV file
-            temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            temp_path = temp_wav.name
-            temp_wav.close()
+            segments = [segment for segment in segments if len(segment) > 0]
+            if not segments:
+                return no_speech
+            
+            # Join the segments with short pauses and convert to 16 kHz PCM
+            gap = np.zeros(int(0.2 * sr), dtype=np.float32)
+            parts = []
+            for segment in segments:
+                parts.extend((segment, gap))
+            speech = np.concatenate(parts[:-1])
+            divisor = math.gcd(int(sr), self.speech_sample_rate)
+            speech = resample_poly(speech, self.speech_sample_rate // divisor, int(sr) // divisor)
+            pcm = (np.clip(speech, -1.0, 1.0) * 32767).astype('<i2').tobytes()
             
+            # Enforce the time budget even if the recognizer ignores its timeout
+            executor = ThreadPoolExecutor(max_workers=1)
             try:
-                # Ensure the audio is in the correct format for speech recognition
-                # Convert to 16-bit PCM WAV
-                y_scaled = np.int16(y * 32767)
-                sf.write(temp_path, y_scaled, sr, format='WAV', subtype='PCM_16')
-                
-                # Perform speech recognition
-                with sr.AudioFile(temp_path) as source:
-                    audio = self.recognizer.record(source)
-                    try:
-                        text = self.recognizer.recognize_google(audio)
-                        return {
-                            'detected_language': detect(text),
-                            'transcribed_text': text[:100]  # Limit text length
-                        }
-                    except sr.UnknownValueError:
-                        print("Speech recognition could not understand the audio")
-                        return {
-                            'detected_language': None,
-                            'transcribed_text': None
-                        }
-                    except sr.RequestError as e:
-                        print(f"Could not request results from speech recognition service: {e}")
-                        return {
-                            'detected_language': None,
-                            'transcribed_text': None
-                        }
+                future = executor.submit(self.recognizer.recognize, pcm, self.speech_sample_rate, timeout)
+                text = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                print(f"Speech recognition exceeded its {timeout:.1f}s budget")
+                return no_speech
             finally:
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
+                executor.shutdown(wait=False)
+            
+            if not text:
+                return no_speech
+            return {
+                'detected_language': detect(text),
+                'transcribed_text': text[:100]  # Limit text length
+            }
                     
         except Exception as e:
             print(f"Speech recognition error: {str(e)}")
-            return {
-                'detected_language': None,
-                'transcribed_text': None
-            }
+            return no_speech
+
+    def _vocal_regions(self, voiced_frames: np.ndarray, sr: int, num_samples: int) -> List[Tuple[int, int]]:
+        """Sample ranges of runs of voiced frames, in order, capped to max_speech_seconds"""
+        if len(voiced_frames) == 0:
+            return []
+        
+        # Voiced frames closer than the allowed gap belong to the same region
+        max_gap = max(1, int(self.region_gap * sr / self.hop_length))
+        breaks = np.flatnonzero(np.diff(voiced_frames) > max_gap)
+        first = voiced_frames[np.r_[0, breaks + 1]]
+        last = voiced_frames[np.r_[breaks, len(voiced_frames) - 1]]
+        starts = np.clip(first * self.hop_length - self.n_fft // 2, 0, num_samples)
+        ends = np.clip(last * self.hop_length + self.n_fft // 2, 0, num_samples)
+        
+        regions = []
+        budget = int(self.max_speech_seconds * sr)
+        for start, end in zip(starts, ends):
+            if end - start < self.min_region * sr:
+                continue
+            end = min(end, start + budget)
+            regions.append((int(start), int(end)))
+            budget -= end - start
+            if budget <= 0:
+                break
+        return regions
 
     def _get_default_features(self) -> Dict[str, Any]:
         """Get default features for non-voice audio"""
@@ -62,3 +62,64 @@ def reset_api_key_count(key):
     else:
         click.echo("API key not found.", err=True)
 
+@commands_bp.cli.command("analyze-tracks")
+@click.argument("analysis_ids", nargs=-1, type=int)
+@click.option("--status", default=None, help="Analyze every analysis with this status (e.g. pending)")
+@click.option("--processes", default=None, type=int, help="Worker processes (defaults to CPU count)")
+def analyze_tracks(analysis_ids, status, processes):
+    """Batch-analyze tracks over a process pool and bulk-write the results"""
+    from flask import current_app
+    from app.api.analysis import AudioAnalyzer
+    from app.api.analysis.database.models import AudioAnalysis
+    from app.api.analysis.services.analysis_service import AudioAnalysisService
+
+    ids = list(analysis_ids)
+    if status:
+        ids += [analysis.id for analysis in AudioAnalysis.query.filter_by(status=status).all()]
+    if not ids:
+        click.echo("No analyses to process.")
+        return
+
+    analyzer = AudioAnalyzer(
+        downloads_dir=current_app.config['UPLOAD_FOLDER'],
+        analysis_dir=current_app.config['ANALYSIS_FOLDER'],
+        backend=current_app.config.get('ANALYSIS_BACKEND', 'librosa'),
+        sample_rate=current_app.config.get('ANALYSIS_SAMPLE_RATE'),
+        analysis_threads=current_app.config.get('ANALYSIS_THREADS', 1),
+        speech_recognizer=current_app.config.get('ANALYSIS_SPEECH_RECOGNIZER', 'google'),
+        max_speech_seconds=current_app.config.get('ANALYSIS_SPEECH_MAX_SECONDS', 30.0),
+        speech_timeout=current_app.config.get('ANALYSIS_SPEECH_TIMEOUT', 10.0),
+        defer_transcription=current_app.config.get('ANALYSIS_DEFERRED_TRANSCRIPTION', False),
+        offline_transcript=current_app.config.get('ANALYSIS_OFFLINE_TRANSCRIPT'),
+        time_budget=current_app.config.get('ANALYSIS_TIME_BUDGET'),
+        spool_max_bytes=current_app.config.get('ANALYSIS_SPOOL_MAX_BYTES', 64 * 1024 * 1024),
+        overlap_download=current_app.config.get('ANALYSIS_OVERLAP_DOWNLOAD', False),
+        decoder=current_app.config.get('ANALYSIS_DECODER', 'soundfile'),
+        cache_max_bytes=current_app.config.get('ANALYSIS_CACHE_MAX_BYTES'),
+        pcm_cache_max_bytes=current_app.config.get('ANALYSIS_PCM_CACHE_MAX_BYTES')
+    )
+    results = analyzer.analyze_tracks(
+        ids,
+        bucket_name=current_app.config['AWS_S3_BUCKET_NAME'],
+        processes=processes
+    )
+
+    AudioAnalysisService.bulk_update_analysis_results(results)
+    db.session.commit()
+
+    from app.celery.celery_tasks import transcribe_audio, voice_features_pending
+    for analysis_id, result in results.items():
+        if voice_features_pending(result):
+            transcribe_audio.delay(analysis_id)
+
+    failed = sum(1 for result in results.values() if 'error' in result)
+    click.echo(f"Analyzed {len(results) - failed} tracks, {failed} failed.")
+
+@commands_bp.cli.command("rescore-moods")
+def rescore_moods():
+    """Re-score the mood of all completed analyses, e.g. after tuning the mood weights"""
+    from app.api.analysis.services.analysis_service import AudioAnalysisService
+
+    analyses = AudioAnalysisService.rescore_moods()
+    db.session.commit()
+    click.echo(f"Re-scored {len(analyses)} analyses.")
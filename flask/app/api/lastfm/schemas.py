@@ -180,21 +180,22 @@ class CategoriesResponseSchema(ma.Schema):
 
 class AudioFeaturesSchema(ma.Schema):
     """Schema for audio features response"""
-    acousticness = ma.Float(required=True)
+    acousticness = ma.Float(required=True, allow_none=True)
     analysis_url = ma.String(allow_none=True)
-    danceability = ma.Float(required=True)
+    danceability = ma.Float(required=True, allow_none=True)
     duration_ms = ma.Integer(required=True)
-    energy = ma.Float(required=True)
+    energy = ma.Float(required=True, allow_none=True)
     id = ma.String(required=True)
-    instrumentalness = ma.Float(required=True)
-    key = ma.Integer(required=True)
-    liveness = ma.Float(required=True)
-    loudness = ma.Float(required=True)
-    mode = ma.Integer(required=True)
-    speechiness = ma.Float(required=True)
-    tempo = ma.Float(required=True)
-    time_signature = ma.Integer(required=True)
+    instrumentalness = ma.Float(required=True, allow_none=True)
+    key = ma.Integer(required=True, allow_none=True)
+    liveness = ma.Float(required=True, allow_none=True)
+    loudness = ma.Float(required=True, allow_none=True)
+    mode = ma.Integer(required=True, allow_none=True)
+    speechiness = ma.Float(required=True, allow_none=True)
+    tempo = ma.Float(required=True, allow_none=True)
+    time_signature = ma.Integer(required=True, allow_none=True)
     track_href = ma.String(allow_none=True)
     type = ma.String(required=True)
     uri = ma.String(required=True)
-    valence = ma.Float(required=True) 
\ No newline at end of file
+    valence = ma.Float(required=True, allow_none=True)
+    provisional = ma.Boolean()
\ No newline at end of file
@@ -152,9 +152,12 @@ def get_audio_features_status(track_id):
             'current_step': analysis.current_step
         }
 
-        # If analysis is complete, include the features
-        if analysis.status == 'completed' and analysis.raw_analysis_data:
-            spotify_features = analysis.raw_analysis_data.get('analysis', {}).get('spotify_audio_features', {})
+        # If analysis is complete, or still running with a provisional preview, include the features
+        provisional = bool((analysis.raw_analysis_data or {}).get('provisional'))
+        if analysis.raw_analysis_data and (analysis.status == 'completed' or
+                                           (provisional and analysis.status == 'processing')):
+            response['provisional'] = provisional
+            spotify_features = analysis.raw_analysis_data.get('raw_analysis_data', {}).get('analysis', {}).get('technical_features', {})
             if spotify_features:
                 # Update the URLs to point to our endpoints
                 spotify_features['analysis_url'] = url_for('api.spotify_replacement.get_audio_features_status', 
@@ -5,6 +5,7 @@ from app.api.lastfm.services import LastFmService
 from app.exceptions import BusinessLogicException
 from flask_babel import _
 from app.api.analysis.analyzer import AudioAnalyzer
+from app.api.analysis.features import FEATURE_NAMES
 from app.api.analysis.services.analysis_service import AudioAnalysisService
 from app.api.analysis.database.models import AudioAnalysis
 from sqlalchemy import and_
@@ -104,10 +105,27 @@ class SpotifyReplacementService:
                 )
             ).first()
 
+            if not existing_analysis:
+                # Serve the provisional preview while the full analysis is running
+                in_progress = AudioAnalysis.query.filter(
+                    and_(
+                        AudioAnalysis.spotify_id == track_id,
+                        AudioAnalysis.status == 'processing'
+                    )
+                ).first()
+                if in_progress and (in_progress.raw_analysis_data or {}).get('provisional'):
+                    existing_analysis = in_progress
+
             print("********************", flush=True)
             print(existing_analysis, flush=True)
             print("********************", flush=True)
 
+            if existing_analysis and existing_analysis.status == 'completed':
+                # Analyses run for a subset of features get the others added
+                missing = AudioAnalysisService.missing_features(existing_analysis, FEATURE_NAMES)
+                if missing:
+                    existing_analysis = AudioAnalysisService.request_missing_features(existing_analysis, missing)
+
             if existing_analysis and existing_analysis.raw_analysis_data:
                 # Get technical features directly from raw_analysis_data
                 features = existing_analysis.raw_analysis_data.get('raw_analysis_data', {}).get('analysis', {}).get('technical_features', {})
@@ -122,21 +140,22 @@ class SpotifyReplacementService:
                                                      track_id=track_id, 
                                                      _external=True)
                     
-                    # Ensure all required Spotify fields are present
+                    # Ensure all required Spotify fields are present; features not
+                    # computed yet are None rather than made-up defaults
                     spotify_format = {
-                        'acousticness': features.get('acousticness', 0.0),
-                        'danceability': features.get('danceability', 0.0),
+                        'acousticness': features.get('acousticness'),
+                        'danceability': features.get('danceability'),
                         'duration_ms': features.get('duration_ms', 0),
-                        'energy': features.get('energy', 0.0),
-                        'instrumentalness': features.get('instrumentalness', 0.0),
-                        'key': features.get('key', 0),
-                        'liveness': features.get('liveness', 0.0),
-                        'loudness': features.get('loudness', 0.0),
-                        'mode': features.get('mode', 0),
-                        'speechiness': features.get('speechiness', 0.0),
-                        'tempo': features.get('tempo', 0.0),
-                        'time_signature': features.get('time_signature', 4),
-                        'valence': features.get('valence', 0.0),
+                        'energy': features.get('energy'),
+                        'instrumentalness': features.get('instrumentalness'),
+                        'key': features.get('key'),
+                        'liveness': features.get('liveness'),
+                        'loudness': features.get('loudness'),
+                        'mode': features.get('mode'),
+                        'speechiness': features.get('speechiness'),
+                        'tempo': features.get('tempo'),
+                        'time_signature': features.get('time_signature'),
+                        'valence': features.get('valence'),
                         'id': track_id,
                         'uri': f"spotify:track:{track_id}",
                         'track_href': url_for('api.spotify_replacement.get_audio_features', 
@@ -145,7 +164,8 @@ class SpotifyReplacementService:
                         'analysis_url': url_for('api.spotify_replacement.get_audio_features_status', 
                                               track_id=track_id, 
                                               _external=True),
-                        'type': 'audio_features'
+                        'type': 'audio_features',
+                        'provisional': bool(existing_analysis.raw_analysis_data.get('provisional'))
                     }
                     return spotify_format
             
@@ -10,8 +10,50 @@ from app.main import celery, db
 from app.api.analysis import AudioAnalyzer
 from app.api.analysis.services.analysis_service import AudioAnalysisService
 from flask import current_app
+import threading
 import time
 
+# Analyzers reused by every task a worker runs, one per worker thread so
+# concurrent tasks (thread or gevent pools) never share per-task state
+_analyzers = threading.local()
+
+
+def get_analyzer() -> AudioAnalyzer:
+    """This worker thread's audio analyzer, created from the app config on first use"""
+    analyzer = getattr(_analyzers, 'analyzer', None)
+    if analyzer is None:
+        analyzer = AudioAnalyzer(
+            downloads_dir=current_app.config['UPLOAD_FOLDER'],
+            analysis_dir=current_app.config['ANALYSIS_FOLDER'],
+            backend=current_app.config.get('ANALYSIS_BACKEND', 'librosa'),
+            sample_rate=current_app.config.get('ANALYSIS_SAMPLE_RATE'),
+            streaming_min_duration=current_app.config.get('ANALYSIS_STREAMING_MIN_DURATION'),
+            analysis_threads=current_app.config.get('ANALYSIS_THREADS', 1),
+            speech_recognizer=current_app.config.get('ANALYSIS_SPEECH_RECOGNIZER', 'google'),
+            max_speech_seconds=current_app.config.get('ANALYSIS_SPEECH_MAX_SECONDS', 30.0),
+            speech_timeout=current_app.config.get('ANALYSIS_SPEECH_TIMEOUT', 10.0),
+            defer_transcription=current_app.config.get('ANALYSIS_DEFERRED_TRANSCRIPTION', False),
+            offline_transcript=current_app.config.get('ANALYSIS_OFFLINE_TRANSCRIPT'),
+            time_budget=current_app.config.get('ANALYSIS_TIME_BUDGET'),
+            spool_max_bytes=current_app.config.get('ANALYSIS_SPOOL_MAX_BYTES', 64 * 1024 * 1024),
+            overlap_download=current_app.config.get('ANALYSIS_OVERLAP_DOWNLOAD', False),
+            decoder=current_app.config.get('ANALYSIS_DECODER', 'soundfile'),
+            cache_max_bytes=current_app.config.get('ANALYSIS_CACHE_MAX_BYTES'),
+            pcm_cache_max_bytes=current_app.config.get('ANALYSIS_PCM_CACHE_MAX_BYTES')
+        )
+        _analyzers.analyzer = analyzer
+    return analyzer
+
+
+def warm_analyzer():
+    """Create the worker's analyzer before its first task, so no task pays for the setup"""
+    try:
+        get_analyzer()
+    except Exception as e:
+        # The first task retries the construction and reports the error
+        print(f"Error creating audio analyzer: {str(e)}", flush=True)
+
+
 @celery.task(
     name="generic_service_task",
     bind=True,
@@ -99,24 +141,27 @@ def check_task_notifications_task(self):
 
 
 @celery.task(name="analyze_audio", bind=True)
-def analyze_audio(self, analysis_id: int, file_id: int):
-    """Celery task to analyze audio file"""
+def analyze_audio(self, analysis_id: int, file_id: int, features: list = None):
+    """Celery task to analyze audio file, limited to the given features if any
+
+    Adding features to a completed analysis leaves it completed, so its
+    results stay available while the missing features are computed.
+    """
+    top_up = False
     try:
-        # Update status to processing
-        analysis = AudioAnalysisService.update_analysis_status(
-            analysis_id, 
-            'processing',
-            progress=0,
-            current_step='Waiting for audio file'
-        )
-        db.session.commit()
+        top_up = features is not None and AudioAnalysisService.get(analysis_id).status == 'completed'
+        if not top_up:
+            # Update status to processing
+            analysis = AudioAnalysisService.update_analysis_status(
+                analysis_id, 
+                'processing',
+                progress=0,
+                current_step='Waiting for audio file'
+            )
+            db.session.commit()
 
-        # Initialize analyzer
-        analyzer = AudioAnalyzer(
-            downloads_dir=current_app.config['UPLOAD_FOLDER'],
-            analysis_dir=current_app.config['ANALYSIS_FOLDER'],
-            backend=current_app.config.get('ANALYSIS_BACKEND', 'librosa')
-        )
+        # Reuse this worker's analyzer
+        analyzer = get_analyzer()
 
         # Wait for audio file to be available in S3
         max_retries = 30  # Try for 5 minutes (10 second intervals)
@@ -149,8 +194,19 @@ def analyze_audio(self, analysis_id: int, file_id: int):
             print(f"Updated analysis status to {progress}% for analysis {analysis_id}", flush=True)
             db.session.commit()
 
-        # Set progress callback
-        analyzer.feature_extractor.set_progress_callback(update_progress)
+        # Set progress callback; a top-up does not report progress on a completed analysis
+        analyzer.feature_extractor.set_progress_callback(None if top_up else update_progress)
+
+        # Publish a provisional analysis of an excerpt before the full run
+        on_preview = None
+        if current_app.config.get('ANALYSIS_PREVIEW', False):
+            def on_preview(preview: dict):
+                AudioAnalysisService.publish_provisional_results(
+                    analysis_id,
+                    AudioAnalysisService.build_analysis_results(preview)
+                )
+                print(f"Published provisional results for analysis {analysis_id}", flush=True)
+                db.session.commit()
         
         print(f"Starting audio analysis for analysis {analysis_id}", flush=True)
         # Update status to show we're starting analysis
@@ -160,7 +216,10 @@ def analyze_audio(self, analysis_id: int, file_id: int):
         # Perform analysis
         results = analyzer.analyze_track(
             track_id=analysis_id,
-            bucket_name=current_app.config['AWS_S3_BUCKET_NAME']
+            bucket_name=current_app.config['AWS_S3_BUCKET_NAME'],
+            on_preview=on_preview,
+            features=features,
+            find_duplicate=lambda sample_md5: AudioAnalysisService.find_duplicate_results(sample_md5, analysis_id)
         )
 
         print(f"Audio analysis completed for analysis {analysis_id}", flush=True)
@@ -168,31 +227,8 @@ def analyze_audio(self, analysis_id: int, file_id: int):
         if 'error' in results:
             raise Exception(results['error'])
         
-        # Extract results
-        features = results.get('analysis', {}).get('technical_features', {})
-        voice_features = results.get('analysis', {}).get('voice_features', {})
-        mood_scores = results.get('analysis', {}).get('mood_scores', {})
-
         # Update analysis with results
-        analysis_data = {
-            'tempo': features.get('tempo'),
-            'key': features.get('key'),
-            'mode': features.get('mode'),
-            'time_signature': features.get('time_signature'),
-            'danceability': features.get('danceability'),
-            'energy': features.get('energy'),
-            'loudness': features.get('loudness'),
-            'speechiness': features.get('speechiness'),
-            'acousticness': features.get('acousticness'),
-            'instrumentalness': features.get('instrumentalness'),
-            'liveness': features.get('spotify_audio_features', {}).get('liveness'),
-            'valence': features.get('valence'),
-            'mood': mood_scores.get('primary_mood'),
-            'mood_confidence': mood_scores.get('confidence'),
-            'voice_characteristics': voice_features,
-            'segments': results.get('analysis', {}).get('segments', []),
-            'raw_analysis_data': results
-        }
+        analysis_data = AudioAnalysisService.build_analysis_results(results)
         print(f"Updating analysis results for analysis {analysis_id}", flush=True)
 
         AudioAnalysisService.update_analysis_results(analysis_id, analysis_data)
@@ -206,16 +242,75 @@ def analyze_audio(self, analysis_id: int, file_id: int):
         )
         db.session.commit()
 
+        # Transcription runs as a follow-up task on its own queue
+        if voice_features_pending(results):
+            transcribe_audio.delay(analysis_id)
+
         return {'status': 'completed', 'analysis_id': analysis_id}
 
     except Exception as e:
-        # Update status to failed
-        AudioAnalysisService.update_analysis_status(
-            analysis_id, 
-            'failed', 
-            error_message=str(e),
-            progress=0,
-            current_step='Analysis failed'
+        if top_up:
+            # The stored analysis is still valid without the missing features
+            AudioAnalysisService.update_analysis_status(
+                analysis_id,
+                'completed',
+                error_message=str(e),
+                current_step='Adding features failed'
+            )
+        else:
+            # Update status to failed
+            AudioAnalysisService.update_analysis_status(
+                analysis_id, 
+                'failed', 
+                error_message=str(e),
+                progress=0,
+                current_step='Analysis failed'
+            )
+            # A preview of a failed analysis must not be served as its results
+            AudioAnalysisService.discard_provisional_results(analysis_id)
+        db.session.commit()
+        raise e 
+
+    finally:
+        # The analyzer outlives the task; drop the task's progress callback
+        analyzer = getattr(_analyzers, 'analyzer', None)
+        if analyzer is not None:
+            analyzer.reset()
+
+
+def voice_features_pending(results: dict) -> bool:
+    """Check whether an analysis left its transcription to the follow-up stage"""
+    voice_features = results.get('analysis', {}).get('voice_features') or {}
+    return voice_features.get('transcription') == 'pending'
+
+
+@celery.task(name="transcribe_audio", bind=True)
+def transcribe_audio(self, analysis_id: int):
+    """Celery task to transcribe the vocal regions of an analyzed track"""
+    try:
+        analysis = AudioAnalysisService.get(analysis_id)
+        voice_features = (analysis.raw_analysis_data or {}).get('voice_characteristics') or {}
+        regions = voice_features.get('speech_regions') or []
+
+        analyzer = get_analyzer()
+
+        print(f"Transcribing {len(regions)} vocal regions for analysis {analysis_id}", flush=True)
+        speech_features = analyzer.transcribe_track(
+            track_id=analysis_id,
+            bucket_name=current_app.config['AWS_S3_BUCKET_NAME'],
+            regions=regions
         )
+
+        if 'error' in speech_features:
+            raise Exception(speech_features['error'])
+
+        AudioAnalysisService.update_voice_features(analysis_id, speech_features)
+        db.session.commit()
+
+        return {'status': 'completed', 'analysis_id': analysis_id}
+
+    except Exception as e:
+        db.session.rollback()
+        AudioAnalysisService.update_voice_features(analysis_id, {'transcription': 'failed'})
         db.session.commit()
-        raise e 
\ No newline at end of file
+        raise e
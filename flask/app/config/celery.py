@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init
 from app.config.flask import Config
 
 config = Config()
@@ -12,6 +13,9 @@ celery = Celery(
     result_serializer='json',
     task_serializer="json",
     enable_utc=True,
+    task_routes={
+        "transcribe_audio": {"queue": config.ANALYSIS_TRANSCRIPTION_QUEUE},
+    },
 )
 
 
@@ -23,3 +27,11 @@ def configure_celery(app):
                 return self.run(*args, **kwargs)
 
     celery.Task = ContextTask
+
+    @worker_process_init.connect(weak=False)
+    def init_worker_process(**kwargs):
+        # Build reusable per-process resources (S3 client, analyzers) after
+        # the fork, once per worker process rather than once per task
+        with app.app_context():
+            from app.celery.celery_tasks import warm_analyzer
+            warm_analyzer()
@@ -96,8 +96,26 @@ class Config:
 
     # print("AA " * 100 ,flush=True)
     # print(TWILIO_WORKSPACE_INFO, flush=True)
-    ANALYSIS_BACKEND = os.environ.get("ANALYSIS_BACKEND")
+    # "librosa", or "fast" for cheaper approximate features that differ from librosa's
+    ANALYSIS_BACKEND = os.environ.get("ANALYSIS_BACKEND", "librosa")
     ANALYSIS_FOLDER = os.environ.get("ANALYSIS_FOLDER")
+    ANALYSIS_SAMPLE_RATE = int(os.environ.get("ANALYSIS_SAMPLE_RATE", 0))
+    ANALYSIS_STREAMING_MIN_DURATION = float(os.environ.get("ANALYSIS_STREAMING_MIN_DURATION", 0))
+    ANALYSIS_THREADS = int(os.environ.get("ANALYSIS_THREADS", 1))
+    ANALYSIS_SPEECH_RECOGNIZER = os.environ.get("ANALYSIS_SPEECH_RECOGNIZER", "google")
+    ANALYSIS_SPEECH_MAX_SECONDS = float(os.environ.get("ANALYSIS_SPEECH_MAX_SECONDS", 30))
+    ANALYSIS_SPEECH_TIMEOUT = float(os.environ.get("ANALYSIS_SPEECH_TIMEOUT", 10))
+    ANALYSIS_OFFLINE_TRANSCRIPT = os.environ.get("ANALYSIS_OFFLINE_TRANSCRIPT")
+    ANALYSIS_DEFERRED_TRANSCRIPTION = as_bool(os.environ.get("ANALYSIS_DEFERRED_TRANSCRIPTION") or "no")
+    # Consumed by the celery-transcription program in supervisord.conf; keep the two in sync
+    ANALYSIS_TRANSCRIPTION_QUEUE = os.environ.get("ANALYSIS_TRANSCRIPTION_QUEUE", "transcription")
+    ANALYSIS_PREVIEW = as_bool(os.environ.get("ANALYSIS_PREVIEW") or "no")
+    ANALYSIS_TIME_BUDGET = float(os.environ.get("ANALYSIS_TIME_BUDGET", 0))
+    ANALYSIS_SPOOL_MAX_BYTES = int(os.environ.get("ANALYSIS_SPOOL_MAX_BYTES", 64 * 1024 * 1024))
+    ANALYSIS_OVERLAP_DOWNLOAD = as_bool(os.environ.get("ANALYSIS_OVERLAP_DOWNLOAD") or "no")
+    ANALYSIS_DECODER = os.environ.get("ANALYSIS_DECODER", "soundfile")
+    ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get("ANALYSIS_CACHE_MAX_BYTES", 0))
+    ANALYSIS_PCM_CACHE_MAX_BYTES = int(os.environ.get("ANALYSIS_PCM_CACHE_MAX_BYTES", 0))
     UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER")
 
 